@@ -1,16 +1,20 @@
 # app.py
-import os, pathlib, sys
+import os, pathlib, sys, time
 import streamlit as st
-import plotly.graph_objects as go
 import pandas as pd
 
 # --- локальные модули ---
 BASE = pathlib.Path(__file__).resolve().parent
 sys.path.append(str(BASE))  # чтобы видеть пакет core/
 
+from core.cache import BarCache
 from core.data_loader import DataLoader
-from core.strategy import compute_signal
-from core.llm import build_rationale  # офлайн NLG (без GPT)
+from core.memo import SignalMemo
+from core.llm import build_rationale, signal_rng  # офлайн NLG (без GPT)
+from core import telemetry
+from core.screener import screen, screen_frame
+from core.chart import ChartCache
+from core.montecarlo import simulate_signal
 
 # ---------- утилиты ----------
 def _fmt_val(x: float) -> str:
@@ -18,6 +22,12 @@ def _fmt_val(x: float) -> str:
     s = f"{float(x):.2f}"
     return s.rstrip("0").rstrip(".") if "." in s else s
 
+def _fmt_pct(p: float) -> str:
+    return "—" if p != p else f"{p*100:.0f}%"
+
+def _fmt_bars(b: float) -> str:
+    return "—" if b != b else f"{b:.1f}"
+
 def _fmt_range(lo: float, hi: float) -> str:
     lo_s, hi_s = _fmt_val(lo), _fmt_val(hi)
     return f"{lo_s}–{hi_s}"
@@ -79,11 +89,34 @@ def _infer_zones_for_text(sig: dict) -> tuple[str, str]:
 
     return _fmt_range(wait_lo, wait_hi), _fmt_range(short_lo, short_hi)
 
+def _diagnostics_panel() -> None:
+    """Таблица задержек по стадиям и выгрузка JSON/Prometheus (если включена диагностика)."""
+    if not telemetry.enabled():
+        return
+    with st.expander("Диагностика: задержки по стадиям"):
+        rows = telemetry.snapshot()
+        if rows:
+            st.dataframe(pd.DataFrame([
+                {"stage": r["stage"], **r["labels"], "count": r["count"], "errors": r["errors"],
+                 "p50, ms": round(r["p50_ms"], 2), "p95, ms": round(r["p95_ms"], 2),
+                 "max, ms": round(r["max_ms"], 2), "total, ms": round(r["sum_ms"], 1)} for r in rows
+            ]), use_container_width=True)
+        else:
+            st.caption("Пока пусто — сгенерируйте сигнал.")
+        c1, c2, c3 = st.columns(3)
+        c1.download_button("JSON", telemetry.to_json(), file_name="telemetry.json", mime="application/json")
+        c2.download_button("Prometheus", telemetry.to_prometheus(), file_name="telemetry.prom", mime="text/plain")
+        if c3.button("Сбросить"):
+            telemetry.reset()
+
 # --- UI ---
 st.set_page_config(page_title="AI Trading — Final App", layout="wide")
 st.title("AI Trading — Final App")
 st.caption("Данные: Polygon → Yahoo → CSV. Стратегия: кастом. Текст — офлайн, без раскрытия методики.")
 
+# Замеры стадий (загрузка, индикаторы, график) — выключены по умолчанию, почти без накладных расходов
+telemetry.enable(st.sidebar.checkbox("Диагностика", value=telemetry.enabled()))
+
 # Настройки тикеров и горизонта
 default_tickers = os.getenv("DEFAULT_TICKERS", "QQQ,AAPL,MSFT,NVDA")
 tickers = st.text_input("Tickers (через запятую)", value=default_tickers).upper()
@@ -93,6 +126,11 @@ h_map = {"Краткосрок":"short","Среднесрок":"swing","Долг
 horizon_ui = st.selectbox("Горизонт", list(h_map.keys()), index=1)
 horizon = h_map[horizon_ui]
 
+# Интервал баров: внутридневные тянутся из Polygon постранично, 10m/2h/4h собираются из базового
+i_map = {"1d": "6mo", "1h": "3mo", "30m": "1mo", "15m": "1mo", "5m": "5d", "1m": "5d", "4h": "6mo", "2h": "3mo"}
+interval = st.selectbox("Интервал", list(i_map.keys()), index=0)
+period = i_map[interval]
+
 # Степень детализации описания
 detail = st.selectbox(
     "Степень детализации описания",
@@ -108,38 +146,82 @@ except ValueError:
 symbol = st.selectbox("Тикер", symbols if symbols else ["QQQ"], index=idx)
 
 # --- Данные и расчёт ---
-loader = DataLoader()
+# дисковый кэш баров: повторные клики догружают только последний бар
+# один загрузчик и один кэш результатов на процесс: переживают перезапуски скрипта Streamlit
+@st.cache_resource
+def _loader() -> DataLoader:
+    return DataLoader(cache=BarCache(ttl=float(os.getenv("OHLCV_CACHE_TTL", "900"))))
+
+@st.cache_resource
+def _memo() -> SignalMemo:
+    # кадры, индикаторы, Signal и зоны по ключу (symbol, interval, последний бар, horizon)
+    return SignalMemo(max_bytes=int(os.getenv("APP_MEMO_MB", "256")) * 2**20,
+                      ttl=float(os.getenv("OHLCV_CACHE_TTL", "900")))
+
+loader, memo = _loader(), _memo()
+
+mode = st.radio("Режим", ["Один тикер", "Скринер"], horizontal=True)
+
+if mode == "Скринер":
+    # весь список: порции грузятся и оцениваются параллельно, таблица дополняется по мере готовности
+    if st.button("Запустить скринер"):
+        table, bar = st.empty(), st.progress(0.0)
+        rows: list[dict] = []
+        try:
+            for part in screen(symbols, horizon, loader, period=period, interval=interval, chunk_size=int(os.getenv("SCREENER_CHUNK", "200"))):
+                rows += part
+                bar.progress(min(len(rows) / max(len(symbols), 1), 1.0), text=f"{len(rows)} / {len(symbols)}")
+                table.dataframe(screen_frame(rows), use_container_width=True, hide_index=True)
+        except Exception as e:
+            st.error(str(e))
+        st.session_state["screener_rows"] = rows
+    elif st.session_state.get("screener_rows"):
+        st.dataframe(screen_frame(st.session_state["screener_rows"]), use_container_width=True, hide_index=True)
+    else:
+        st.info("Скринер оценит все тикеры из списка; столбцы таблицы сортируются кликом по заголовку.")
+    _diagnostics_panel()
+    st.stop()
 
 colA, colB = st.columns([1,2])
 with colA:
     if st.button("Сгенерировать сигнал"):
         try:
-            fetched = loader.history(symbol, period="6mo", interval="1d")
-            st.session_state["source"] = fetched.source
-            st.session_state["df"] = fetched.df
-
-            # расчёт сигнала
-            sig = compute_signal(fetched.df, symbol, horizon)
-
-            # добавим источник в сигнал — офлайн-описание использует его в тексте
-            sig["source"] = fetched.source
-
-            # заранее вычислим нейтральные зоны для краткого формата
-            wait_zone, short_zone = _infer_zones_for_text(sig)
-            sig["wait_zone"] = wait_zone
-            sig["short_zone"] = short_zone
-
-            st.session_state["signal"] = sig
+            # весь список тикеров — параллельно, с общим дедлайном на тикер (FETCH_DEADLINE) и подстраховкой
+            # Yahoo, если Polygon молчит (FETCH_HEDGE_MS); свежие кадры берутся из памяти, без повторной загрузки
+            frames = memo.history_many(loader.pipeline(), symbols or [symbol], period=period, interval=interval)
+            st.session_state["frames"], st.session_state["interval"] = frames, interval
+            if symbol not in frames:
+                raise RuntimeError(f"{symbol}: нет данных ни из Polygon, ни из Yahoo, ни из demo CSV.")
         except Exception as e:
             st.error(str(e))
 
+# сигнал пересчитывается на каждом перезапуске, но из кэша: смена горизонта/детализации/тикера
+# не трогает сеть и индикаторы, если кадр уже загружен
+sig, sigs, df, source = None, {}, None, "—"
+fetched = st.session_state.get("frames", {}).get(symbol)
+if fetched is not None and st.session_state.get("interval", "1d") == interval:
+    try:
+        df, source = fetched.df, fetched.source
+        # все горизонты одним расчётом индикаторов — для таблицы сравнения; текущий — из неё
+        sigs = memo.signals(symbol, interval, df, tuple(h_map.values()))
+        sig = sigs[horizon]
+        # добавим источник в сигнал — офлайн-описание использует его в тексте
+        sig["source"] = source
+        # нейтральные зоны для краткого формата
+        sig["wait_zone"], sig["short_zone"] = memo.derived("zones", symbol, interval, df, horizon, _infer_zones_for_text)
+        # вероятности касания TP/SL по симуляции путей (кэш — до нового бара)
+        sig["mc"] = memo.derived("mc", symbol, interval, df, horizon,
+                                 lambda s: simulate_signal(df, s, horizon, interval).as_dict())
+    except Exception as e:
+        sig = None
+        st.error(str(e))
+
 with colB:
-    sig = st.session_state.get("signal")
-    df: pd.DataFrame | None = st.session_state.get("df")
-    source = st.session_state.get("source", "—")
 
     if sig and df is not None:
         st.subheader(f"{sig['symbol']} — {horizon_ui} | источник: {source}")
+        if fetched.report is not None:
+            st.caption(f"Загрузка: {fetched.report.reason}, {fetched.report.elapsed_ms:.0f} мс")
 
         # Бейдж действия
         color = "#16a34a" if sig["action"]=="BUY" else ("#dc2626" if sig["action"]=="SHORT" else "#6b7280")
@@ -164,74 +246,44 @@ with colB:
 
         st.metric("Confidence", f"{sig['confidence']:.2f}")
 
+        # --- Вероятности по симуляции: что раньше — цель или стоп ---
+        mc = sig.get("mc")
+        if mc:
+            p1, p2, p3 = st.columns(3)
+            p1.metric("TP1 раньше SL", _fmt_pct(mc["first"]["tp1"]))
+            p2.metric("TP2 раньше SL", _fmt_pct(mc["first"]["tp2"]))
+            p3.metric("SL раньше TP1", _fmt_pct(mc["first"]["sl"]))
+            with st.expander("Монте-Карло: касания уровней", expanded=False):
+                st.dataframe(pd.DataFrame([
+                    {"Уровень": k.upper(), "Цена": _fmt_val(sig[k]), "Касание": _fmt_pct(mc["touch"][k]),
+                     "Баров до касания (ср.)": _fmt_bars(mc["bars_mean"][k]),
+                     "Медиана": _fmt_bars(mc["bars_median"][k])}
+                    for k in ("tp1", "tp2", "sl")
+                ]), use_container_width=True, hide_index=True)
+                st.caption(f"{mc['paths']:,} путей по {mc['steps']} баров из истории тикера "
+                           f"(волатильность — текущая), погрешность ≤ {mc['se']*100:.1f} п.п.; "
+                           f"касание цели и стопа на одном баре считается в пользу стопа.")
+
+        # --- Сравнение горизонтов (тот же расчёт индикаторов, отличаются только правила) ---
+        with st.expander("Сравнение горизонтов", expanded=False):
+            st.dataframe(pd.DataFrame([
+                {"Горизонт": ui, "Действие": s["action"], "Confidence": s["confidence"],
+                 "Entry": s["entry"], "TP1": s["tp1"], "TP2": s["tp2"], "SL": s["sl"]}
+                for ui, s in ((ui, sigs[h]) for ui, h in h_map.items())
+            ]), use_container_width=True, hide_index=True)
+
         # --- Нейтральные ориентиры вверх/вниз (без упоминания pivot/R/S) ---
         ups, dns = _neutral_orients(sig)
 
         # --- График ---
-        fig = go.Figure([
-            go.Candlestick(
-                x=df["Date"], open=df["Open"], high=df["High"],
-                low=df["Low"], close=df["Close"]
-            )
-        ])
-
-        # Обязательные линии (торговый план)
-        plan_lines = {
-            "Entry": sig["entry"], "TP1": sig["tp1"], "TP2": sig["tp2"], "SL": sig["sl"],
-            "Ключевая отметка": sig["key_mark"],
-            "Верхняя зона": sig["upper_zone"], "Нижняя зона": sig["lower_zone"],
-        }
-        colors = {
-            "Entry":"#2563eb","TP1":"#16a34a","TP2":"#16a34a","SL":"#dc2626",
-            "Ключевая отметка":"#6b7280","Верхняя зона":"#f59e0b","Нижняя зона":"#10b981",
-            "Ориентир ↑1":"#a78bfa","Ориентир ↑2":"#a78bfa",
-            "Ориентир ↓1":"#f472b6","Ориентир ↓2":"#f472b6",
-        }
-
-        for label, y in plan_lines.items():
-            if y is None: 
-                continue
-            fig.add_hline(
-                y=y, line_width=1, line_dash="dot",
-                line_color=colors.get(label, "#999"),
-                annotation_text=label, annotation_position="top left"
-            )
-
-        # Нейтральные ориентиры вверх/вниз
-        if len(ups) >= 1:
-            fig.add_hline(y=ups[0], line_width=1, line_dash="dot",
-                          line_color=colors["Ориентир ↑1"], annotation_text="Ориентир ↑1",
-                          annotation_position="top left")
-        if len(ups) >= 2:
-            fig.add_hline(y=ups[1], line_width=1, line_dash="dot",
-                          line_color=colors["Ориентир ↑2"], annotation_text="Ориентир ↑2",
-                          annotation_position="top left")
-        if len(dns) >= 1:
-            fig.add_hline(y=dns[0], line_width=1, line_dash="dot",
-                          line_color=colors["Ориентир ↓1"], annotation_text="Ориентир ↓1",
-                          annotation_position="top left")
-        if len(dns) >= 2:
-            fig.add_hline(y=dns[1], line_width=1, line_dash="dot",
-                          line_color=colors["Ориентир ↓2"], annotation_text="Ориентир ↓2",
-                          annotation_position="top left")
-
-        # Подсветка TP / SL зон
-        try:
-            x0 = df["Date"].iloc[-min(len(df), 40)]
-            x1 = df["Date"].iloc[-1]
-            fig.add_shape(
-                type="rect", x0=x0, x1=x1, y0=min(sig["entry"], sig["tp2"]), y1=max(sig["entry"], sig["tp2"]),
-                fillcolor="rgba(34,197,94,0.08)", line=dict(width=0), layer="below"
-            )
-            fig.add_shape(
-                type="rect", x0=x0, x1=x1, y0=min(sig["sl"], sig["entry"]), y1=max(sig["sl"], sig["entry"]),
-                fillcolor="rgba(239,68,68,0.08)", line=dict(width=0), layer="below"
-            )
-        except Exception:
-            pass
-
-        fig.update_layout(margin=dict(l=10,r=10,t=30,b=10), height=460, showlegend=False)
+        # свечи прорежены до ~1500 (High/Low сохраняются), все линии — одним набором shapes;
+        # фигура живёт в сессии: смена горизонта/детализации правит только уровни
+        t_plot = time.perf_counter()
+        charts = st.session_state.setdefault("chart_cache", ChartCache())
+        fig = charts.figure(symbol, interval, df, sig, ups, dns)
         st.plotly_chart(fig, use_container_width=True)
+        if telemetry.enabled():
+            telemetry.observe("app.plotly_render", (time.perf_counter() - t_plot) * 1000)
 
         # --- Текстовая аналитика ---
         if detail == "Коротко":
@@ -247,10 +299,14 @@ with colB:
             st.markdown(text)
         else:
             # стандарт / подробно — офлайн-описание
-            text = build_rationale(sig["symbol"], horizon_ui, sig, detail=detail)
+            # формулировки зависят от тикера, горизонта и даты последнего бара — текст не «прыгает» при перезапусках
+            rng = signal_rng(sig["symbol"], pd.Timestamp(df["Date"].iloc[-1]).date(), horizon)
+            text = build_rationale(sig["symbol"], horizon_ui, sig, detail=detail, rng=rng)
             st.write(text)
 
         with st.expander("Последние строки данных"):
             st.dataframe(df.tail(12))
     else:
         st.info("Нажмите «Сгенерировать сигнал». Если Polygon/Yahoo недоступны — возьмём demo CSV.")
+
+_diagnostics_panel()
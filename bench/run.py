@@ -0,0 +1,203 @@
+# bench/run.py — повторяемые замеры времени и памяти по стадиям, результат — JSON
+#   python -m bench.run --bars 1000,100000 --symbols 1,100 --out bench/results/HEAD.json
+#   python -m bench.run --compare bench/results/old.json bench/results/new.json
+from __future__ import annotations
+from dataclasses import dataclass, field, asdict
+from typing import Callable
+import argparse, gc, json, os, pathlib, platform, subprocess, sys, tempfile, time, tracemalloc
+import numpy as np, pandas as pd
+
+BASE = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE))
+
+from bench import synthetic
+from bench.stubs import PolygonStub, fake_yfinance
+from core import strategy as st
+from core.batch import compute_signals_batch
+from core.backtest import backtest
+from core.cache import BarCache
+from core.data_loader import DataLoader
+from core.llm import build_rationale
+
+@dataclass
+class Result:
+    stage: str
+    params: dict
+    repeat: int
+    times_s: dict = field(default_factory=dict)   # min / median / mean / max
+    per_item_us: float = 0.0                       # median на бар или тикер
+    peak_mb: float = 0.0                           # пик аллокаций Python (tracemalloc)
+    rss_mb: float = 0.0                            # максимальный RSS процесса после стадии
+
+def _rss_mb() -> float:
+    try:
+        import resource
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return kb / 1024 if sys.platform != "darwin" else kb / 2**20
+    except ImportError:  # Windows
+        return 0.0
+
+def measure(stage: str, fn: Callable[[], object], params: dict, items: int = 1,
+            repeat: int = 5, warmup: int = 1, memory: bool = True) -> Result:
+    """Прогрев, затем repeat замеров perf_counter; пик памяти — отдельным прогоном под tracemalloc."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    peak = 0.0
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    t = np.asarray(times)
+    return Result(stage, params, repeat,
+                  {"min": float(t.min()), "median": float(np.median(t)), "mean": float(t.mean()), "max": float(t.max())},
+                  float(np.median(t)) / max(items, 1) * 1e6, peak, _rss_mb())
+
+# ---------- стадии ----------
+def bench_indicators(n_bars: int, repeat: int) -> list[Result]:
+    df = synthetic.ohlcv_frame(n_bars, seed=1)
+    close = df["Close"]
+    p = {"bars": n_bars}
+    hist = st._macd_hist(close)
+    cases = {
+        "strategy._ema": lambda: st._ema(close, 50),
+        "strategy._rsi": lambda: st._rsi(close, 14),
+        "strategy._atr": lambda: st._atr(df, 14),
+        "strategy._macd_hist": lambda: st._macd_hist(close),
+        "strategy._consecutive_sign": lambda: st._consecutive_sign(hist),
+        "strategy._landmarks": lambda: st._landmarks(df),
+        "strategy._pivots_by_scope": lambda: st._pivots_by_scope(df, "weekly"),
+    }
+    return [measure(k, fn, p, n_bars, repeat) for k, fn in cases.items()]
+
+def bench_signal(n_bars: int, repeat: int) -> list[Result]:
+    df = synthetic.ohlcv_frame(n_bars, seed=2)
+    out = []
+    for hz in ("short", "swing", "position"):
+        out.append(measure("compute_signal", lambda: st.compute_signal(df, "SYN", hz),
+                           {"bars": n_bars, "horizon": hz}, n_bars, repeat))
+    sig = dict(st.compute_signal(df, "SYN", "swing"), source="bench")
+    for detail in ("Коротко", "Стандарт", "Подробно"):
+        out.append(measure("build_rationale", lambda: build_rationale("SYN", "Среднесрок", sig, detail),
+                           {"detail": detail}, 1, repeat, memory=False))
+    return out
+
+def bench_batch(n_symbols: int, n_bars: int, repeat: int) -> list[Result]:
+    long = synthetic.panel(n_symbols, n_bars, seed=3, long=True)
+    frames = synthetic.panel(n_symbols, n_bars, seed=3)
+    p = {"symbols": n_symbols, "bars": n_bars}
+    return [measure("compute_signals_batch[long]", lambda: compute_signals_batch(long, "swing"), p, n_symbols, repeat),
+            measure("compute_signals_batch[dict]", lambda: compute_signals_batch(frames, "swing"), p, n_symbols, repeat)]
+
+def bench_backtest(n_bars: int, repeat: int) -> list[Result]:
+    df = synthetic.ohlcv_frame(n_bars, seed=4)
+    return [measure("backtest", lambda: backtest(df, "SYN"), {"bars": n_bars}, n_bars, repeat)]
+
+def bench_loader(n_symbols: int, repeat: int, latency: float) -> list[Result]:
+    """DataLoader на заглушках: Polygon по HTTP, Yahoo через подменённый yfinance, тёплый кэш."""
+    syms = synthetic.symbols(n_symbols)
+    out = []
+    p = {"symbols": n_symbols, "latency_s": latency}
+    with PolygonStub(latency=latency) as stub, fake_yfinance(latency=latency), \
+            tempfile.TemporaryDirectory() as tmp:
+        poly = DataLoader(polygon_api_key="bench", polygon_url=stub.url)
+        out.append(measure("history[polygon]", lambda: poly.history(syms[0], "6mo"), p, 1, repeat))
+        out.append(measure("history_many[polygon]", lambda: poly.history_many(syms, "6mo"), p, n_symbols, repeat))
+        yahoo = DataLoader()
+        yahoo.polygon_api_key = None   # ключ из окружения не должен уводить запросы в сеть
+        out.append(measure("history[yahoo]", lambda: yahoo.history(syms[0], "6mo"), p, 1, repeat))
+        out.append(measure("history_many[yahoo]", lambda: yahoo.history_many(syms, "6mo"), p, n_symbols, repeat))
+        cached = DataLoader(polygon_api_key="bench", polygon_url=stub.url, cache=BarCache(root=tmp, ttl=3600))
+        cached.history_many(syms, "6mo")
+        out.append(measure("history[cache]", lambda: cached.history(syms[0], "6mo"), p, 1, repeat))
+        out.append(measure("history_many[cache]", lambda: cached.history_many(syms, "6mo"), p, n_symbols, repeat))
+    return out
+
+# ---------- отчёт ----------
+def _meta(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except Exception:
+        commit = ""
+    return {"commit": commit, "time": pd.Timestamp.now(tz="UTC").isoformat(), "python": platform.python_version(),
+            "numpy": np.__version__, "pandas": pd.__version__, "platform": platform.platform(),
+            "machine": platform.machine(), "cpus": os.cpu_count(), "args": vars(args)}
+
+def run(args) -> dict:
+    results: list[Result] = []
+    stages = set(args.stages.split(","))
+    for n in args.bars:
+        if "indicators" in stages:
+            results += bench_indicators(n, args.repeat)
+        if "signal" in stages:
+            results += bench_signal(n, args.repeat)
+        if "backtest" in stages:
+            results += bench_backtest(n, args.repeat)
+    for s in args.symbols:
+        if "batch" in stages:
+            results += bench_batch(s, args.panel_bars, args.repeat)
+        if "loader" in stages:
+            results += bench_loader(s, args.repeat, args.latency)
+    return {"meta": _meta(args), "results": [asdict(r) for r in results]}
+
+def _key(r: dict) -> str:
+    return r["stage"] + " " + json.dumps(r["params"], sort_keys=True, ensure_ascii=False)
+
+def compare(old_path: str, new_path: str) -> pd.DataFrame:
+    """Сравнение двух прогонов по медиане: ratio < 1 — стало быстрее."""
+    old, new = (json.loads(pathlib.Path(p).read_text()) for p in (old_path, new_path))
+    a = {_key(r): r for r in old["results"]}
+    rows = []
+    for r in new["results"]:
+        o = a.get(_key(r))
+        if o is None:
+            continue
+        rows.append({"stage": r["stage"], "params": json.dumps(r["params"], ensure_ascii=False),
+                     "old_ms": o["times_s"]["median"]*1e3, "new_ms": r["times_s"]["median"]*1e3,
+                     "ratio": r["times_s"]["median"] / max(o["times_s"]["median"], 1e-12),
+                     "old_peak_mb": o["peak_mb"], "new_peak_mb": r["peak_mb"]})
+    return pd.DataFrame(rows)
+
+def _ints(s: str) -> list[int]:
+    return [int(float(x)) for x in s.split(",") if x]
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Бенчмарки загрузки данных, индикаторов и сигналов")
+    ap.add_argument("--bars", type=_ints, default=[1_000, 10_000], help="длины рядов (до 10_000_000)")
+    ap.add_argument("--symbols", type=_ints, default=[1, 100], help="размеры вселенной (до 5000)")
+    ap.add_argument("--panel-bars", type=int, default=300, help="баров на тикер в пакетных стадиях")
+    ap.add_argument("--stages", default="indicators,signal,backtest,batch,loader")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--latency", type=float, default=0.0, help="задержка заглушек Polygon/Yahoo, с")
+    ap.add_argument("--out", default=None, help="куда записать JSON (по умолчанию — stdout)")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="сравнить два JSON и выйти")
+    args = ap.parse_args(argv)
+
+    if args.compare:
+        with pd.option_context("display.width", 200, "display.max_rows", None, "display.max_colwidth", 60):
+            print(compare(*args.compare).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+        return
+    report = run(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        out = pathlib.Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(text)
+        for r in report["results"]:
+            print(f"{r['stage']:<32} {json.dumps(r['params'], ensure_ascii=False):<40} "
+                  f"{r['times_s']['median']*1e3:10.3f} ms  {r['peak_mb']:8.1f} MB")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
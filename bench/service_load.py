@@ -0,0 +1,93 @@
+# bench/service_load.py — нагрузочный прогон core.service на заглушках Polygon/yfinance
+#   python -m bench.service_load --clients 64 --requests 5000 --universe 300
+#   python -m bench.service_load --window-ms 0 --max-batch 1     (без пакетов — для сравнения)
+# Клиенты — корутины с keep-alive соединениями; популярность тикеров — по Ципфу, чтобы запросы
+# пересекались, как у нескольких дашбордов. Итог — JSON: задержки клиентов и метрики сервиса.
+from __future__ import annotations
+import argparse, asyncio, json, pathlib, sys, time
+import numpy as np
+
+BASE = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE))
+
+from bench import synthetic
+from bench.stubs import PolygonStub, fake_yfinance
+from core.data_loader import DataLoader
+from core.memo import SignalMemo
+from core.service import SignalService
+
+HORIZONS = ("short", "swing", "position")
+
+async def _client(address: str, jobs: list[tuple[str, str]], lat: list[float], codes: dict) -> None:
+    if address.startswith("unix:"):
+        reader, writer = await asyncio.open_unix_connection(address[5:])
+    else:
+        host, port = address.rsplit("/", 1)[-1].split(":")
+        reader, writer = await asyncio.open_connection(host, int(port))
+    try:
+        for sym, hz in jobs:
+            t0 = time.perf_counter()
+            writer.write(f"GET /signal?symbol={sym}&horizon={hz} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            size = 0
+            while (h := await reader.readline()) not in (b"\r\n", b""):
+                if h.lower().startswith(b"content-length:"):
+                    size = int(h.split(b":")[1])
+            await reader.readexactly(size)
+            lat.append((time.perf_counter() - t0) * 1000)
+            codes[status] = codes.get(status, 0) + 1
+    finally:
+        writer.close()
+
+async def _load(address: str, clients: int, requests: int, universe: int, zipf: float, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    syms = synthetic.symbols(universe)
+    w = 1.0 / np.arange(1, universe + 1) ** zipf
+    picks = rng.choice(universe, size=requests, p=w / w.sum())
+    hzs = rng.choice(len(HORIZONS), size=requests)
+    jobs = [(syms[i], HORIZONS[h]) for i, h in zip(picks, hzs)]
+    lat, codes = [], {}
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(address, jobs[c::clients], lat, codes) for c in range(clients)))
+    wall = time.perf_counter() - t0
+    a = np.asarray(lat)
+    return {"requests": len(a), "wall_s": wall, "rps": len(a) / wall, "status": codes,
+            "p50_ms": float(np.percentile(a, 50)), "p95_ms": float(np.percentile(a, 95)),
+            "p99_ms": float(np.percentile(a, 99)), "max_ms": float(a.max())}
+
+def run(clients: int = 64, requests: int = 5000, universe: int = 300, zipf: float = 1.1,
+        latency: float = 0.05, window_ms: float = 5.0, max_batch: int = 256, ttl: float = 60.0,
+        unix: str | None = None, seed: int = 0) -> dict:
+    with PolygonStub(latency=latency) as stub, fake_yfinance(latency=latency):
+        loader = DataLoader(polygon_api_key="bench", polygon_url=stub.url, max_workers=16)
+        svc = SignalService(loader, SignalMemo(ttl=ttl), batch_window=window_ms / 1000, max_batch=max_batch)
+        with svc.start(unix=unix):
+            client = asyncio.run(_load(svc.address, clients, requests, universe, zipf, seed))
+        m = svc.metrics()
+        return {"params": {"clients": clients, "requests": requests, "universe": universe, "zipf": zipf,
+                           "source_latency_s": latency, "window_ms": window_ms, "max_batch": max_batch},
+                "client": client, "service": m, "source_requests": stub.requests}
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Нагрузочный прогон сервиса сигналов на заглушках")
+    ap.add_argument("--clients", type=int, default=64)
+    ap.add_argument("--requests", type=int, default=5000)
+    ap.add_argument("--universe", type=int, default=300, help="тикеров в выборке")
+    ap.add_argument("--zipf", type=float, default=1.1, help="перекос популярности тикеров")
+    ap.add_argument("--latency", type=float, default=0.05, help="задержка заглушки источника, с")
+    ap.add_argument("--window-ms", type=float, default=5.0)
+    ap.add_argument("--max-batch", type=int, default=256)
+    ap.add_argument("--ttl", type=float, default=60.0, help="сколько держать кадры в памяти сервиса, с")
+    ap.add_argument("--unix", default=None, help="Unix-сокет вместо TCP")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None)
+    a = ap.parse_args(argv)
+    res = run(a.clients, a.requests, a.universe, a.zipf, a.latency, a.window_ms, a.max_batch, a.ttl, a.unix, a.seed)
+    text = json.dumps(res, indent=2, ensure_ascii=False)
+    if a.out:
+        pathlib.Path(a.out).write_text(text)
+    print(text)
+
+if __name__ == "__main__":
+    main()
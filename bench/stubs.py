@@ -0,0 +1,152 @@
+# bench/stubs.py — локальные заменители Polygon (HTTP) и yfinance (модуль) для бенчмарков
+from __future__ import annotations
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import json, re, sys, threading, time, types
+import numpy as np, pandas as pd
+
+from bench.synthetic import polygon_results
+
+_AGGS = re.compile(r"^/v2/aggs/ticker/([^/]+)/range/(\d+)/(\w+)/([\d-]+)/([\d-]+)")
+_LIMIT = 50_000
+
+class PolygonStub:
+    """
+    HTTP-сервер на 127.0.0.1 с ответами в формате /v2/aggs Polygon.
+    latency — задержка ответа (с), error_rate — доля ответов 429 (проверка повторов),
+    page_limit — размер страницы (дальше — next_url, как у настоящего API).
+    Использование: with PolygonStub() as stub: DataLoader(polygon_api_key="x", polygon_url=stub.url)
+    """
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0, page_limit: int = _LIMIT):
+        self.latency, self.error_rate, self.seed = float(latency), float(error_rate), seed
+        self.page_limit = int(page_limit)   # меньше 50 000 — чтобы проверить постраничную загрузку
+        self.requests = 0
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive, как у настоящего API
+
+            def log_message(self, *args):   # без вывода в консоль
+                pass
+
+            def _send(self, code: int, body: dict, headers: dict | None = None):
+                data = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    throttled = stub.error_rate > 0 and stub._rng.random() < stub.error_rate
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if throttled:
+                    return self._send(429, {"status": "ERROR"}, {"Retry-After": "0"})
+                m = _AGGS.match(self.path)
+                if not m:
+                    return self._send(404, {"status": "NOT_FOUND"})
+                sym, mult, span, start, end = m.groups()
+                q = parse_qs(urlsplit(self.path).query)
+                limit = min(int(q.get("limit", [_LIMIT])[0]), stub.page_limit)
+                cursor = int(q.get("cursor", ["0"])[0])
+                res = polygon_results(sym, start, end, stub.seed, int(mult), span)
+                page = res[cursor:cursor + limit]
+                body = {"ticker": sym, "status": "OK", "resultsCount": len(page), "results": page}
+                if cursor + limit < len(res):   # как у Polygon: ссылка на следующую страницу без apiKey
+                    body["next_url"] = (f"{stub.url}/v2/aggs/ticker/{sym}/range/{mult}/{span}/{start}/{end}"
+                                        f"?cursor={cursor + limit}&limit={limit}")
+                self._send(200, body)
+
+        return Handler
+
+    def start(self) -> "PolygonStub":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "PolygonStub":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+# ---------- yfinance ----------
+def _yf_frame(symbol: str, period: str | None, start, seed: int) -> pd.DataFrame:
+    """
+    Дневные бары с start (или сегодня минус период) по сегодня — как у Yahoo. Ряд — от той же
+    точки, что у polygon_results: догрузка хвоста совпадает с полной загрузкой и с заглушкой Polygon.
+    """
+    from core.data_loader import _period_days
+    end = pd.Timestamp.now().normalize()
+    first = pd.Timestamp(start) if start is not None else end - pd.Timedelta(days=_period_days(period or "6mo"))
+    res = polygon_results(symbol, first.date(), end.date(), seed)
+    dates = pd.to_datetime([r["t"] for r in res], unit="ms").tz_localize("America/New_York")
+    df = pd.DataFrame({f: [r[k] for r in res] for f, k in
+                       (("Open","o"), ("High","h"), ("Low","l"), ("Close","c"), ("Volume","v"))},
+                      index=pd.DatetimeIndex(dates, name="Date"))
+    df["Adj Close"] = df["Close"]
+    return df
+
+def make_yfinance(latency: float = 0.0, seed: int = 0) -> types.ModuleType:
+    """Модуль с Ticker(...).history и download(...) в форме, которую разбирает DataLoader."""
+    mod = types.ModuleType("yfinance")
+
+    class Ticker:
+        def __init__(self, symbol: str):
+            self.symbol = symbol
+
+        def history(self, period: str | None = None, interval: str = "1d", start=None, **kw) -> pd.DataFrame:
+            if latency:
+                time.sleep(latency)
+            return _yf_frame(self.symbol, period, start, seed)
+
+    def download(tickers, period: str | None = "6mo", interval: str = "1d", start=None,
+                 group_by: str = "column", **kw) -> pd.DataFrame:
+        if latency:
+            time.sleep(latency)
+        syms = tickers.split() if isinstance(tickers, str) else list(tickers)
+        frames = {s: _yf_frame(s, period, start, seed) for s in syms}
+        if len(syms) == 1:
+            return frames[syms[0]]
+        return pd.concat(frames, axis=1)   # колонки (тикер, поле), как при group_by="ticker"
+
+    mod.Ticker, mod.download = Ticker, download
+    return mod
+
+@contextmanager
+def fake_yfinance(latency: float = 0.0, seed: int = 0):
+    """Подменяет yfinance в sys.modules на время блока (DataLoader импортирует его лениво)."""
+    prev = sys.modules.get("yfinance")
+    sys.modules["yfinance"] = make_yfinance(latency, seed)
+    try:
+        yield sys.modules["yfinance"]
+    finally:
+        if prev is None:
+            sys.modules.pop("yfinance", None)
+        else:
+            sys.modules["yfinance"] = prev
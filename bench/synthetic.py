@@ -0,0 +1,89 @@
+# bench/synthetic.py — синтетические OHLCV для бенчмарков (детерминированы по seed)
+from __future__ import annotations
+import zlib
+import numpy as np, pandas as pd
+
+def symbol_seed(symbol: str, seed: int = 0) -> int:
+    """Стабильный seed тикера (не зависит от PYTHONHASHSEED)."""
+    return zlib.crc32(symbol.upper().encode()) ^ (seed * 0x9E3779B1 & 0xFFFFFFFF)
+
+def _freq(n_bars: int, freq: str) -> str:
+    # рабочие дни после ~20k баров упираются в предел datetime64[ns] (2262 г.) — переходим на минуты
+    if freq != "auto":
+        return freq
+    return "B" if n_bars <= 20_000 else "min"
+
+def ohlcv_arrays(n_bars: int, seed: int = 0, price: float = 100.0, vol: float = 0.015,
+                 drift: float = 0.0002) -> dict[str, np.ndarray]:
+    """Геометрическое блуждание + правдоподобные High/Low/Open; без pandas, чтобы 10M баров умещались быстро."""
+    rng = np.random.default_rng(seed)
+    ret = rng.normal(drift, vol, n_bars)
+    close = price * np.exp(np.cumsum(ret))
+    gap = rng.normal(0.0, vol / 3, n_bars)
+    open_ = np.empty(n_bars)
+    open_[0] = price
+    open_[1:] = close[:-1] * np.exp(gap[1:])
+    span = np.abs(rng.normal(0.0, vol, n_bars)) * close
+    high = np.maximum(open_, close) + span * rng.random(n_bars)
+    low = np.minimum(open_, close) - span * rng.random(n_bars)
+    volume = rng.lognormal(14.0, 0.5, n_bars).round()
+    return {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume}
+
+def ohlcv_frame(n_bars: int, seed: int = 0, start: str = "2000-01-03", freq: str = "auto",
+                tz: str | None = None, **kw) -> pd.DataFrame:
+    """Кадр в формате DataLoader: Date, Open, High, Low, Close, Volume."""
+    freq = _freq(n_bars, freq)
+    if freq == "min":   # дневные параметры -> минутные (390 минут в сессии), иначе цена уходит в inf
+        kw.setdefault("vol", 0.015 / np.sqrt(390))
+        kw.setdefault("drift", 0.0002 / 390)
+    a = ohlcv_arrays(n_bars, seed, **kw)
+    if freq == "B":   # date_range(freq="B") на 10k баров ~0.2 с, busday_offset — микросекунды
+        dates = pd.DatetimeIndex(np.busday_offset(np.datetime64(pd.Timestamp(start).date()),
+                                                  np.arange(n_bars), roll="forward").astype("datetime64[ns]"))
+        dates = dates.tz_localize(tz) if tz else dates
+    else:
+        dates = pd.date_range(start, periods=n_bars, freq=freq, tz=tz)
+    return pd.DataFrame({"Date": dates, **a})   # columns=... на 10M строк в сотни раз медленнее
+
+def symbols(n: int) -> list[str]:
+    """SYM0000, SYM0001, ... — фиксированная вселенная тикеров."""
+    return [f"SYM{i:04d}" for i in range(n)]
+
+def panel(n_symbols: int, n_bars: int, seed: int = 0, long: bool = False, **kw):
+    """{symbol: DataFrame} или длинный кадр с колонкой Symbol (как у compute_signals_batch)."""
+    frames = {s: ohlcv_frame(n_bars, symbol_seed(s, seed), **kw) for s in symbols(n_symbols)}
+    if not long:
+        return frames
+    return pd.concat([df.assign(Symbol=s) for s, df in frames.items()], ignore_index=True)
+
+_SESSION_UTC = (14 * 60 + 30, 21 * 60)   # 9:30–16:00 ET без учёта перехода на летнее время, минуты
+
+def polygon_results(symbol: str, start, end, seed: int = 0, multiplier: int = 1,
+                    timespan: str = "day") -> list[dict]:
+    """Бары между датами в формате results Polygon aggs (t — мс UTC); minute/hour — в часы сессии."""
+    if timespan in ("minute", "hour"):
+        return _intraday_results(symbol, start, end, seed, multiplier * (60 if timespan == "hour" else 1))
+    dates = pd.bdate_range(start, end)
+    if not len(dates):
+        return []
+    # ряд строим от фиксированной точки, чтобы догрузка хвоста совпадала с полной загрузкой
+    origin = pd.Timestamp("2000-01-03")
+    offset = int(np.busday_count(origin.date(), dates[0].date()))
+    a = ohlcv_arrays(offset + len(dates), symbol_seed(symbol, seed))
+    t = dates.asi8 // 10**6
+    sl = slice(offset, offset + len(dates))
+    o, h, l, c, v = (a[k][sl] for k in ("Open","High","Low","Close","Volume"))
+    return [{"t": int(t[i]), "o": float(o[i]), "h": float(h[i]), "l": float(l[i]),
+             "c": float(c[i]), "v": float(v[i])} for i in range(len(t))]
+
+def _intraday_results(symbol: str, start, end, seed: int, minutes: int) -> list[dict]:
+    days = pd.bdate_range(start, end)
+    offs = np.arange(_SESSION_UTC[0], _SESSION_UTC[1], minutes)
+    if not len(days):
+        return []
+    t = (days.asi8[:, None] // 10**6 + offs[None, :] * 60_000).ravel()
+    a = ohlcv_arrays(len(t), symbol_seed(symbol, seed) ^ minutes, vol=0.015 / np.sqrt(390 / minutes),
+                     drift=0.0002 * minutes / 390)
+    o, h, l, c, v = (a[k] for k in ("Open","High","Low","Close","Volume"))
+    return [{"t": int(t[i]), "o": float(o[i]), "h": float(h[i]), "l": float(l[i]),
+             "c": float(c[i]), "v": float(v[i])} for i in range(len(t))]
@@ -0,0 +1,184 @@
+# core/backtest.py — проигрывание правил compute_signal по всей истории + симуляция TP/SL
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np, pandas as pd
+
+from core.strategy import HORIZON_PROFILES, Horizon, _ema, _rsi, _macd_hist
+from core.batch import action_names, _wall_ns
+from core.kernels import evaluate_rules, sign_runs
+from core.pivots import PivotIndex
+
+# сколько баров держим позицию, если ни цель, ни стоп не задеты (по описанию горизонтов)
+HOLD_BARS = {"short": 3, "swing": 15, "position": 63}
+
+# ---------- индикаторы по каждому бару ----------
+def _atr_growing(h: np.ndarray, l: np.ndarray, c: np.ndarray, period: int = 14) -> np.ndarray:
+    """
+    ATR так, как его видит compute_signal на срезе df[:t+1]: окно зависит от длины среза
+    (min(period, max(5, n//2))), поэтому для первых 2*period баров окна разные.
+    """
+    h_, l_, c_ = pd.Series(h), pd.Series(l), pd.Series(c)
+    pc = c_.shift(1)
+    tr = np.maximum(h_-l_, np.maximum((h_-pc).abs(), (l_-pc).abs()))
+    n = np.arange(1, len(c) + 1)
+    wins = np.minimum(period, np.maximum(5, n // 2))
+    out = np.empty(len(c))
+    for w in np.unique(wins):
+        idx = np.flatnonzero(wins == w)
+        part = tr.iloc[:idx[-1] + 1]  # короткие окна нужны только в начале ряда
+        full = part.rolling(int(w)).mean().fillna(part.ewm(span=int(w), adjust=False).mean()).to_numpy()
+        out[idx] = full[idx]
+    return out
+
+def indicator_arrays(df: pd.DataFrame) -> dict:
+    """Индикаторы, не зависящие от горизонта, — один раз на ряд."""
+    close = df["Close"].astype(float).reset_index(drop=True)
+    o, h, l, c = (df[f].to_numpy(dtype="f8") for f in ("Open","High","Low","Close"))
+    ema_m = _ema(close, 50).to_numpy()
+    lag = np.full(len(c), np.nan)
+    lag[4:] = ema_m[:-4]
+    h1, l1, c1 = (np.r_[np.nan, x[:-1]] for x in (h, l, c))
+    km = (h1 + l1 + c1)/3.0
+    t = _wall_ns(df["Date"].reset_index(drop=True))
+    return {
+        "t": t, "Open": o, "High": h, "Low": l, "Close": c,
+        # пивоты всех масштабов для каждого бара — одним проходом
+        "pivots": PivotIndex(t, h, l, c),
+        "ema_f": _ema(close, 20).to_numpy(), "ema_m": ema_m, "ema_s": _ema(close, 200).to_numpy(),
+        "ema_m_lag": lag, "rsi": _rsi(close, 14).to_numpy(), "atr": _atr_growing(h, l, c),
+        "hist_run": sign_runs(_macd_hist(close).to_numpy()),
+        "key_mark": km, "upper_zone": 2*km - l1, "lower_zone": 2*km - h1,
+    }
+
+def signal_arrays(ind: dict, horizon: Horizon, profile: dict | None = None) -> dict:
+    """Решение compute_signal на каждом баре: action (-1/0/1), confidence, entry, tp1, tp2, sl."""
+    prof = profile or HORIZON_PROFILES.get(horizon, HORIZON_PROFILES["swing"])
+    piv = ind["pivots"].arrays(prof["pivot_scope"])
+    with np.errstate(invalid="ignore"):
+        r = evaluate_rules(ind["Close"], ind["atr"], ind["key_mark"], ind["ema_f"], ind["ema_m"],
+                           ind["ema_s"], ind["ema_m_lag"], ind["hist_run"], ind["rsi"], piv, prof)
+    # уровни сигнала округлены до центов — торгуем ими же
+    for k in ("entry","tp1","tp2","sl"):
+        r[k] = np.round(r[k], 2)
+    r["confidence"] = np.round(r["confidence"], 2)
+    return r
+
+# ---------- симуляция ----------
+def _first_touch(hit: np.ndarray) -> np.ndarray:
+    """Номер первого бара окна, где условие выполнено; ширина окна, если не было."""
+    return np.where(hit.any(axis=1), hit.argmax(axis=1), hit.shape[1])
+
+def simulate_trades(ind: dict, sig: dict, max_hold: int) -> pd.DataFrame:
+    """
+    Вход по закрытию сигнального бара, одна позиция за раз. Выход — по первому касанию TP1 или SL
+    (High/Low следующих баров; если в одном баре задеты оба — считаем, что первым был стоп;
+    гэп за уровень исполняется по Open), иначе — по закрытию через max_hold баров.
+    Дополнительно отмечаем, была ли TP2 достигнута раньше стопа в том же окне.
+    """
+    o, h, l, c = ind["Open"], ind["High"], ind["Low"], ind["Close"]
+    n = len(c)
+    act = sig["action"]
+    cand = np.flatnonzero((act != 0) & (np.arange(n) < n - 1))
+    cols = ["entry_i","exit_i","side","entry","tp1","tp2","sl","exit","outcome","tp2_hit","ret","r_mult","bars"]
+    if len(cand) == 0 or max_hold < 1:
+        return pd.DataFrame(columns=cols)
+
+    # окна (кандидат, бар после входа): все кандидаты считаются разом
+    win = cand[:, None] + 1 + np.arange(max_hold)[None, :]
+    inside = win < n
+    win = np.minimum(win, n - 1)
+    side = act[cand].astype(np.int64)
+    entry, tp1, tp2, sl = (sig[k][cand] for k in ("entry","tp1","tp2","sl"))
+    hw, lw, ow = h[win], l[win], o[win]
+    long_ = (side > 0)[:, None]
+    hit_sl  = inside & np.where(long_, lw <= sl[:, None],  hw >= sl[:, None])
+    hit_tp1 = inside & np.where(long_, hw >= tp1[:, None], lw <= tp1[:, None])
+    hit_tp2 = inside & np.where(long_, hw >= tp2[:, None], lw <= tp2[:, None])
+    f_sl, f_tp1, f_tp2 = _first_touch(hit_sl), _first_touch(hit_tp1), _first_touch(hit_tp2)
+    last = np.maximum(inside.sum(axis=1) - 1, 0)
+
+    rows = np.arange(len(cand))
+    stop = (f_sl <= f_tp1) & (f_sl < max_hold)
+    take = ~stop & (f_tp1 < max_hold)
+    k = np.where(stop, f_sl, np.where(take, f_tp1, last))
+    open_k = ow[rows, k]
+    sgn = side.astype(float)
+    px_stop = np.where(sgn * (open_k - sl) < 0, open_k, sl)      # гэп через стоп
+    px_take = np.where(sgn * (open_k - tp1) > 0, open_k, tp1)    # гэп через цель
+    exit_px = np.where(stop, px_stop, np.where(take, px_take, c[win[rows, k]]))
+    exit_i = win[rows, k]
+
+    # одна позиция за раз: следующий вход — первый сигнал после выхода
+    chosen, i = [], 0
+    while i < len(cand):
+        chosen.append(i)
+        i = int(np.searchsorted(cand, exit_i[i], side="right"))
+    sel = np.asarray(chosen)
+    risk = np.abs(entry - sl)
+    ret = sgn * (exit_px - entry) / entry
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r_mult = np.where(risk > 0, sgn * (exit_px - entry) / risk, np.nan)
+    outcome = np.where(stop, "sl", np.where(take, "tp1", "timeout"))
+    return pd.DataFrame({
+        "entry_i": cand[sel], "exit_i": exit_i[sel], "side": action_names(side[sel]),
+        "entry": entry[sel], "tp1": tp1[sel], "tp2": tp2[sel], "sl": sl[sel], "exit": exit_px[sel],
+        "outcome": outcome[sel], "tp2_hit": (f_tp2 < f_sl)[sel] & (f_tp2 < max_hold)[sel],
+        "ret": ret[sel], "r_mult": r_mult[sel], "bars": (exit_i - cand)[sel],
+    }, columns=cols)
+
+def summarize(trades: pd.DataFrame, n_signals: int = 0) -> dict:
+    n = len(trades)
+    if n == 0:
+        return {"signals": int(n_signals), "trades": 0, "hit_tp1": 0.0, "hit_tp2": 0.0, "hit_sl": 0.0,
+                "timeout": 0.0, "expectancy": 0.0, "expectancy_r": 0.0, "avg_win": 0.0, "avg_loss": 0.0,
+                "max_drawdown": 0.0, "avg_bars": 0.0}
+    ret = trades["ret"].to_numpy(dtype=float)
+    equity = np.cumprod(1.0 + ret)
+    peak = np.maximum.accumulate(np.r_[1.0, equity])[1:]
+    wins, losses = ret[ret > 0], ret[ret <= 0]
+    out = trades["outcome"]
+    return {
+        "signals": int(n_signals), "trades": n,
+        "hit_tp1": float((out == "tp1").mean()), "hit_tp2": float(trades["tp2_hit"].mean()),
+        "hit_sl": float((out == "sl").mean()), "timeout": float((out == "timeout").mean()),
+        "expectancy": float(ret.mean()), "expectancy_r": float(np.nanmean(trades["r_mult"].to_numpy(dtype=float))),
+        "avg_win": float(wins.mean()) if len(wins) else 0.0,
+        "avg_loss": float(losses.mean()) if len(losses) else 0.0,
+        "max_drawdown": float((1.0 - equity/peak).max()),
+        "avg_bars": float(trades["bars"].mean()),
+    }
+
+# ---------- main ----------
+def backtest(df: pd.DataFrame, symbol: str = "", horizons: tuple[Horizon, ...] = ("short","swing","position"),
+             max_hold: dict[str, int] | None = None) -> dict:
+    """
+    Прогон по всей истории одного тикера: индикаторы считаются один раз, решение принимается
+    на каждом баре (без повторного compute_signal на растущих срезах), сделки — по TP/SL.
+    """
+    if df is None or df.empty:
+        raise ValueError("empty dataframe")
+    ind = indicator_arrays(df)
+    hold = {**HOLD_BARS, **(max_hold or {})}
+    res = {"symbol": symbol, "trades": {}, "stats": {}}
+    for hz in horizons:
+        sig = signal_arrays(ind, hz)
+        trades = simulate_trades(ind, sig, hold.get(hz, HOLD_BARS["swing"]))
+        res["trades"][hz] = trades
+        res["stats"][hz] = summarize(trades, int((sig["action"] != 0).sum()))
+    return res
+
+def _stats_rows(item: tuple[str, pd.DataFrame, tuple, dict | None]) -> list[dict]:
+    symbol, df, horizons, max_hold = item
+    res = backtest(df, symbol, horizons, max_hold)
+    return [{"symbol": symbol, "horizon": hz, **st} for hz, st in res["stats"].items()]
+
+def backtest_many(frames: dict[str, pd.DataFrame], horizons: tuple[Horizon, ...] = ("short","swing","position"),
+                  max_hold: dict[str, int] | None = None, max_workers: int | None = None) -> pd.DataFrame:
+    """Статистика по тикерам × горизонтам; max_workers > 1 — параллельно в процессах."""
+    items = [(s, df, tuple(horizons), max_hold) for s, df in frames.items() if df is not None and len(df)]
+    if max_workers and max_workers > 1 and len(items) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            chunks = list(pool.map(_stats_rows, items, chunksize=max(1, len(items) // (4*max_workers))))
+    else:
+        chunks = [_stats_rows(it) for it in items]
+    return pd.DataFrame([row for rows in chunks for row in rows])
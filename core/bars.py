@@ -0,0 +1,110 @@
+# core/bars.py — компактный ряд OHLCV: int64-время + непрерывные float-массивы вместо DataFrame
+from __future__ import annotations
+import numpy as np, pandas as pd
+
+_FIELDS = ("open","high","low","close","volume")
+_PD = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+
+class Bars:
+    """
+    t — время бара в нс от эпохи (int64); без tz — «настенное» время, с tz — UTC.
+    open/high/low/close/volume — непрерывные массивы одного dtype (float64 по умолчанию;
+    float32 вдвое экономнее, но цены округляются до ~7 значащих цифр).
+    """
+    __slots__ = ("t", "open", "high", "low", "close", "volume", "tz")
+
+    def __init__(self, t, open, high, low, close, volume=None, tz: str | None = None, dtype=np.float64):
+        self.t = np.ascontiguousarray(t, dtype=np.int64)
+        n = len(self.t)
+        self.open, self.high, self.low, self.close = (np.ascontiguousarray(x, dtype=dtype)
+                                                      for x in (open, high, low, close))
+        self.volume = np.zeros(n, dtype=dtype) if volume is None else np.ascontiguousarray(volume, dtype=dtype)
+        self.tz = tz
+        if any(len(getattr(self, f)) != n for f in _FIELDS):
+            raise ValueError("Bars: columns of different length")
+
+    # ---------- построение ----------
+    @classmethod
+    def from_polygon(cls, results: list[dict], dtype=np.float64) -> "Bars":
+        """results из /v2/aggs: колонки собираются напрямую, без словаря и Timestamp на бар."""
+        n = len(results)
+        col = lambda k, dt, d=None: np.fromiter((r.get(k, d) for r in results), dtype=dt, count=n)
+        t = col("t", np.int64) * 1_000_000   # мс UTC -> нс (наивное UTC, как раньше)
+        return cls(t, col("o", dtype), col("h", dtype), col("l", dtype), col("c", dtype),
+                   col("v", dtype, 0.0), dtype=dtype)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dtype=np.float64) -> "Bars":
+        dates = pd.to_datetime(df["Date"])
+        tz = str(dates.dt.tz) if dates.dt.tz is not None else None
+        t = dates.dt.tz_convert("UTC").dt.tz_localize(None) if tz else dates
+        return cls(t.to_numpy(dtype="datetime64[ns]").view("i8"),
+                   *(pd.to_numeric(df[_PD[f]], errors="coerce").to_numpy(dtype=dtype) for f in _FIELDS),
+                   tz=tz, dtype=dtype)
+
+    @classmethod
+    def from_records(cls, rec: np.ndarray, tz: str | None = None) -> "Bars":
+        """Записи BarCache (BAR_DTYPE): время там «настенное»."""
+        bars = cls(rec["t"], rec["o"], rec["h"], rec["l"], rec["c"], rec["v"])
+        if tz:
+            bars.t = pd.DatetimeIndex(bars.t).tz_localize(tz).tz_convert("UTC").tz_localize(None).asi8
+            bars.tz = tz
+        return bars
+
+    @classmethod
+    def concat(cls, parts: list["Bars"]) -> "Bars":
+        """Склейка страниц/кусков одного ряда (в порядке времени)."""
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls(np.empty(0, np.int64), *(np.empty(0) for _ in range(5)))
+        if len(parts) == 1:
+            return parts[0]
+        out = object.__new__(cls)
+        for f in ("t", *_FIELDS):
+            setattr(out, f, np.concatenate([getattr(p, f) for p in parts]))
+        out.tz = parts[0].tz
+        return out
+
+    # ---------- доступ ----------
+    def __len__(self) -> int:
+        return len(self.t)
+
+    def __getitem__(self, sl: slice) -> "Bars":
+        """Срез без копии данных (views)."""
+        if not isinstance(sl, slice):
+            raise TypeError("Bars supports slicing only")
+        out = object.__new__(Bars)
+        for f in ("t", *_FIELDS):
+            setattr(out, f, getattr(self, f)[sl])
+        out.tz = self.tz
+        return out
+
+    def tail(self, n: int) -> "Bars":
+        return self[max(len(self) - n, 0):]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, f).nbytes for f in ("t", *_FIELDS))
+
+    def column(self, name: str) -> np.ndarray:
+        """Колонка по имени DataFrame ("Close") или атрибута ("close")."""
+        return getattr(self, name.lower())
+
+    def wall_ns(self) -> np.ndarray:
+        """Время в нс по локальным часам биржи (для периодов пивотов)."""
+        if not self.tz:
+            return self.t
+        return pd.DatetimeIndex(self.t).tz_localize("UTC").tz_convert(self.tz).tz_localize(None).asi8
+
+    def dates(self) -> pd.DatetimeIndex:
+        idx = pd.DatetimeIndex(self.t)
+        return idx.tz_localize("UTC").tz_convert(self.tz) if self.tz else idx
+
+    def to_pandas(self) -> pd.DataFrame:
+        """Кадр в формате DataLoader (Date, Open, High, Low, Close, Volume; float64)."""
+        return pd.DataFrame({"Date": self.dates(),
+                             **{_PD[f]: getattr(self, f).astype(np.float64, copy=False) for f in _FIELDS}})
+
+    def __repr__(self) -> str:
+        span = f"{self.dates()[0]} .. {self.dates()[-1]}" if len(self) else "empty"
+        return f"Bars(n={len(self)}, {span}, dtype={self.close.dtype}, tz={self.tz})"
@@ -0,0 +1,261 @@
+# core/batch.py — векторный расчёт сигналов сразу по многим тикерам
+from __future__ import annotations
+import numpy as np, pandas as pd
+
+from core.strategy import HORIZON_PROFILES, Horizon
+from core.pivots import period_keys, floor_pivots
+from core.kernels import evaluate_rules, last_sign_run
+from core.bars import Bars
+
+_FIELDS = ("Open","High","Low","Close")
+_ACTIONS = np.array(["SHORT","WAIT","BUY"], dtype=object)  # индекс = код + 1
+_OUT_COLS = ("entry","tp1","tp2","sl","key_mark","upper_zone","lower_zone",
+             "pivot_P","R1","R2","R3","S1","S2","S3")
+
+# ---------- панель ----------
+def _wall_ns(dates) -> np.ndarray:
+    """Даты -> int64 нс «настенного» времени (tz отбрасываем, как делает resample по локальным датам)."""
+    if isinstance(dates, pd.Series) and isinstance(dates.dtype, pd.DatetimeTZDtype):
+        dates = dates.dt.tz_localize(None)
+    elif not (isinstance(dates, pd.Series) and pd.api.types.is_datetime64_dtype(dates.dtype)):
+        try:
+            return _wall_ns(pd.Series(pd.to_datetime(dates)))
+        except ValueError:  # смесь tz-aware и naive — по одному значению
+            return np.array([pd.Timestamp(x).replace(tzinfo=None).value for x in dates], dtype=np.int64)
+    return dates.to_numpy(dtype="datetime64[ns]").view("i8")
+
+def _split_panel(panel) -> dict[str, pd.DataFrame]:
+    """dict {symbol: df | Bars} | длинная таблица с колонкой Symbol | широкая с MultiIndex (symbol, поле)."""
+    if isinstance(panel, dict):
+        return {str(k): v for k, v in panel.items() if v is not None and len(v)}
+    if not isinstance(panel, pd.DataFrame):
+        raise TypeError("panel: ожидается dict[str, DataFrame] или DataFrame")
+    if isinstance(panel.columns, pd.MultiIndex):
+        out = {}
+        for sym in dict.fromkeys(panel.columns.get_level_values(0)):
+            part = panel[sym].dropna(subset=["Close"])
+            if part.empty:
+                continue
+            if "Date" not in part.columns:
+                part = part.rename_axis("Date").reset_index()
+            out[str(sym)] = part
+        return out
+    raise ValueError("panel: нет колонки Symbol и колонок вида (symbol, поле)")
+
+def panel_arrays(panel, with_dates: bool = True) -> dict:
+    """
+    Выравнивает ряды по правому краю (последний бар каждого тикера — последняя строка)
+    в матрицы (T, N); слева — NaN. Так индикаторы по столбцу совпадают с расчётом по одному ряду.
+    """
+    if isinstance(panel, pd.DataFrame) and "Symbol" in panel.columns:
+        return _long_panel_arrays(panel, with_dates)
+    frames = _split_panel(panel)
+    symbols = list(frames)
+    lens = np.array([len(frames[s]) for s in symbols], dtype=np.int64)
+    T, N = (int(lens.max()) if len(lens) else 0), len(symbols)
+    ohlc = np.full((len(_FIELDS), T, N), np.nan)
+    t = np.full((T, N), np.iinfo(np.int64).min, dtype=np.int64) if with_dates else None
+    pdf = []
+    for j, s in enumerate(symbols):
+        df, n = frames[s], lens[j]
+        if not isinstance(df, Bars):
+            pdf.append(j)
+            continue
+        for i, f in enumerate(_FIELDS):   # массивы уже готовы — без pandas
+            ohlc[i, T-n:, j] = df.column(f)
+        if with_dates:
+            t[T-n:, j] = df.wall_ns()
+    if pdf:
+        # кадры — одной склейкой: первый df[col] у каждого кадра создаёт Series (~40 мкс), и на
+        # тысячах тикеров доступ по колонкам обходился дороже всех индикаторов вместе
+        pdf = np.asarray(pdf)
+        big = pd.concat([frames[symbols[j]] for j in pdf], ignore_index=True, copy=False)
+        n = lens[pdf]
+        cols = np.repeat(pdf, n)
+        rows = np.arange(len(big)) + np.repeat(T - n - (np.cumsum(n) - n), n)   # выравнивание вправо
+        for i, f in enumerate(_FIELDS):
+            ohlc[i, rows, cols] = big[f].to_numpy(dtype="f8")
+        if with_dates:
+            if big["Date"].dtype == object:   # разные tz у тикеров — склейка теряет тип, переводим по кадрам
+                t[rows, cols] = np.concatenate([_wall_ns(frames[symbols[j]]["Date"]) for j in pdf])
+            else:
+                t[rows, cols] = _wall_ns(big["Date"])
+    out = {f: ohlc[i] for i, f in enumerate(_FIELDS)}
+    out["t"], out["symbols"], out["lengths"] = t, symbols, lens
+    return out
+
+def _long_panel_arrays(panel: pd.DataFrame, with_dates: bool) -> dict:
+    """Длинная таблица (Symbol, Date, OHLC...) раскладывается в матрицы без цикла по тикерам."""
+    codes, uniques = pd.factorize(panel["Symbol"], sort=False)
+    order = np.argsort(codes, kind="stable")  # внутри тикера сохраняем исходный порядок баров
+    lens = np.bincount(codes, minlength=len(uniques)).astype(np.int64)
+    T, N = (int(lens.max()) if len(lens) else 0), len(uniques)
+    sc = codes[order]
+    starts = np.concatenate([[0], np.cumsum(lens)[:-1]])
+    rows = T - lens[sc] + (np.arange(len(order)) - starts[sc])
+    out = {}
+    for f in _FIELDS:
+        m = np.full((T, N), np.nan)
+        m[rows, sc] = panel[f].to_numpy(dtype="f8")[order]
+        out[f] = m
+    t = None
+    if with_dates:
+        t = np.full((T, N), np.iinfo(np.int64).min, dtype=np.int64)
+        t[rows, sc] = _wall_ns(panel["Date"])[order]
+    out["t"], out["symbols"], out["lengths"] = t, [str(u) for u in uniques], lens
+    return out
+
+# ---------- индикаторы по матрицам (строка = бар, столбец = тикер) ----------
+# Рекурсии повторяют pandas (ewm adjust=False, rolling().mean()) операция в операцию,
+# но цикл идёт по времени над векторами тикеров, а не по столбцам.
+def _ewm2(x: np.ndarray, com: float) -> np.ndarray:
+    alpha = 1. / (1. + com)
+    old_wt_factor = 1. - alpha
+    out = np.empty_like(x)
+    weighted = x[0].copy()
+    old_wt = np.ones_like(weighted)
+    out[0] = weighted
+    for i in range(1, len(x)):
+        cur = x[i]
+        obs = cur == cur
+        live = weighted == weighted
+        old_wt = np.where(live, old_wt * old_wt_factor, old_wt)
+        upd = live & obs & (weighted != cur)
+        mixed = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+        weighted = np.where(upd, mixed, np.where(~live & obs, cur, weighted))
+        old_wt = np.where(live & obs, 1., old_wt)
+        out[i] = weighted
+    return out
+
+def _ema2(x: np.ndarray, span: int) -> np.ndarray:
+    return _ewm2(x, (span - 1) / 2.0)
+
+def _rolling_mean2(x: np.ndarray, w: int) -> np.ndarray:
+    """rolling(w).mean(): сумма Кэхэна с отдельными компенсациями на добавление/удаление."""
+    T, N = x.shape
+    out = np.full_like(x, np.nan)
+    nobs = np.zeros(N, dtype=np.int64); neg = np.zeros(N, dtype=np.int64)
+    sum_x = np.zeros(N); comp_add = np.zeros(N); comp_rm = np.zeros(N)
+    same = np.zeros(N, dtype=np.int64); prev = x[0].copy() if T else np.zeros(N)
+    for i in range(T):
+        if i >= w:
+            v = x[i - w]; ok = v == v
+            y = -v - comp_rm; t = sum_x + y
+            comp_rm = np.where(ok, t - sum_x - y, comp_rm); sum_x = np.where(ok, t, sum_x)
+            nobs -= ok; neg -= ok & np.signbit(v)
+        v = x[i]; ok = v == v
+        y = v - comp_add; t = sum_x + y
+        comp_add = np.where(ok, t - sum_x - y, comp_add); sum_x = np.where(ok, t, sum_x)
+        nobs += ok; neg += ok & np.signbit(v)
+        same = np.where(ok, np.where(v == prev, same + 1, 1), same)
+        prev = np.where(ok, v, prev)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            res = sum_x / nobs
+        res = np.where(same >= nobs, prev, res)
+        res = np.where((neg == 0) & (res < 0), 0.0, res)
+        res = np.where((neg == nobs) & (res > 0), 0.0, res)
+        out[i] = np.where((nobs >= w) & (nobs > 0), res, np.nan)
+    return out
+
+def _rsi2(close: np.ndarray, period: int = 14) -> np.ndarray:
+    d = np.full_like(close, np.nan)
+    d[1:] = close[1:] - close[:-1]
+    up, dn = np.where(d < 0, 0.0, d), np.where(-d < 0, 0.0, -d)
+    com = (1.0 - 1/period) / (1/period)
+    r_up, r_dn = _ewm2(up, com), _ewm2(dn, com)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rs = r_up / np.where(r_dn == 0, np.nan, r_dn)
+        rsi = 100 - 100/(1+rs)
+    return np.where(np.isnan(rsi), 50.0, rsi)
+
+def _atr2(h: np.ndarray, l: np.ndarray, c: np.ndarray, lengths: np.ndarray, period: int = 14) -> np.ndarray:
+    pc = np.full_like(c, np.nan)
+    pc[1:] = c[:-1]
+    tr = np.maximum(h-l, np.maximum(np.abs(h-pc), np.abs(l-pc)))
+    out = np.full_like(tr, np.nan)
+    # окно зависит от длины ряда (как в _atr) — считаем группами по окну
+    wins = np.minimum(period, np.maximum(5, lengths // 2))
+    for w in np.unique(wins):
+        cols = np.flatnonzero(wins == w)
+        sub = tr[:, cols]
+        roll = _rolling_mean2(sub, int(w))
+        out[:, cols] = np.where(np.isnan(roll), _ema2(sub, int(w)), roll)
+    return out
+
+def _macd_hist2(close: np.ndarray, fast=12, slow=26, sig=9) -> np.ndarray:
+    macd = _ema2(close, fast) - _ema2(close, slow)
+    return macd - _ema2(macd, sig)
+
+# ---------- пивоты ----------
+def last_pivots(arr: dict, scope: str) -> tuple[np.ndarray, ...]:
+    """Пивоты для последнего бара каждого тикера по предыдущему дню/неделе/месяцу."""
+    H, L, C, lens = arr["High"], arr["Low"], arr["Close"], arr["lengths"]
+    T, N = C.shape
+    cols = np.arange(N)
+    px = C[-1]
+    if scope == "daily":
+        ok = lens >= 2
+        hh, ll, cc = (H[-2], L[-2], C[-2]) if T >= 2 else (px, px, px)
+    else:
+        valid = np.arange(T)[:, None] >= (T - lens)[None, :]
+        keys = np.where(valid, period_keys(arr["t"], scope), np.iinfo(np.int64).min)
+        k_last = keys[-1]
+        prev_key = np.where(valid & (keys < k_last), keys, np.iinfo(np.int64).min).max(axis=0)
+        ok = valid.any(axis=0) & (prev_key > np.iinfo(np.int64).min)
+        in_prev = valid & (keys == prev_key)
+        hh = np.where(in_prev, H, -np.inf).max(axis=0)
+        ll = np.where(in_prev, L, np.inf).min(axis=0)
+        last_idx = T - 1 - (keys == k_last).sum(axis=0)  # последний бар предыдущего периода
+        cc = C[np.clip(last_idx, 0, T-1), cols]
+    # без предыдущего периода hh/ll = ∓inf: подставляем цену до сложения, иначе inf - inf -> предупреждение
+    hh, ll, cc = (np.where(ok, v, px) for v in (hh, ll, cc))
+    P, R1, R2, R3, S1, S2, S3 = floor_pivots(hh, ll, cc)
+    return tuple(np.where(ok, v, px) for v in (P, R1, R2, R3, S1, S2, S3))
+
+def action_names(codes: np.ndarray) -> np.ndarray:
+    return _ACTIONS[np.asarray(codes, dtype=np.int64) + 1]
+
+# ---------- main ----------
+def compute_signals_batch(panel, horizon: Horizon) -> pd.DataFrame:
+    """
+    Сигналы для многих тикеров за один проход: индикаторы считаются по матрицам (T, N),
+    правила — над массивами последнего бара. Строки совпадают с compute_signal(df, symbol, horizon).
+    """
+    prof = HORIZON_PROFILES.get(horizon, HORIZON_PROFILES["swing"])
+    arr = panel_arrays(panel, with_dates=prof["pivot_scope"] != "daily")
+    symbols, lens = arr["symbols"], arr["lengths"]
+    cols = ["symbol","horizon","action","confidence", *_OUT_COLS]
+    if not symbols:
+        return pd.DataFrame(columns=cols)
+    T = arr["Close"].shape[0]
+    H, L, C = arr["High"], arr["Low"], arr["Close"]
+
+    ema_m = _ema2(C, 50)
+    atr = _atr2(H, L, C, lens)[-1]
+    hist_run = last_sign_run(_macd_hist2(C))
+    # ключевая отметка / зоны — по предыдущему бару
+    h1, l1, c1 = (arr[f][-2] if T >= 2 else np.full(len(symbols), np.nan) for f in ("High","Low","Close"))
+    km = (h1 + l1 + c1)/3.0
+    uz, lz = 2*km - l1, 2*km - h1
+    px = arr["Close"][-1]
+    piv = last_pivots(arr, prof["pivot_scope"])
+    with np.errstate(invalid="ignore"):
+        r = evaluate_rules(
+            px, atr, km,
+            _ema2(C, 20)[-1], ema_m[-1], _ema2(C, 200)[-1],
+            ema_m[-5] if T >= 5 else np.full(len(symbols), np.nan),
+            hist_run, _rsi2(C, 14)[-1], piv, prof,
+        )
+    levels = {
+        "entry": r["entry"], "tp1": r["tp1"], "tp2": r["tp2"], "sl": r["sl"],
+        "key_mark": np.where(np.isnan(km), px, km),
+        "upper_zone": np.where(np.isnan(uz), px, uz), "lower_zone": np.where(np.isnan(lz), px, lz),
+        "pivot_P": piv[0], "R1": piv[1], "R2": piv[2], "R3": piv[3], "S1": piv[4], "S2": piv[5], "S3": piv[6],
+    }
+    # round() как в compute_signal (numpy.round на половинках может расходиться)
+    out = {"symbol": symbols, "horizon": [horizon]*len(symbols),
+           "action": action_names(r["action"]),
+           "confidence": [round(float(v), 2) for v in r["confidence"].tolist()]}
+    for k in _OUT_COLS:
+        out[k] = [round(float(v), 2) for v in levels[k].tolist()]
+    return pd.DataFrame(out, columns=cols)
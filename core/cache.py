@@ -0,0 +1,193 @@
+# core/cache.py — локальный дисковый кэш OHLCV (memory-mapped NumPy)
+from __future__ import annotations
+from dataclasses import dataclass, asdict
+import json, os, pathlib, re, time
+import numpy as np, pandas as pd
+
+# одна запись = один бар; время хранится как int64 (нс, «настенное» время без tz)
+BAR_DTYPE = np.dtype([("t","<i8"), ("o","<f8"), ("h","<f8"), ("l","<f8"), ("c","<f8"), ("v","<f8")])
+_COLS = (("o","Open"), ("h","High"), ("l","Low"), ("c","Close"), ("v","Volume"))
+
+@dataclass
+class CacheStats:
+    hits: int = 0       # отдали из кэша без обращения к сети
+    topups: int = 0     # догрузили только хвост
+    misses: int = 0     # полной загрузки (ключа нет или окно не покрыто)
+    evictions: int = 0  # удалено ключей по TTL/размеру
+
+def frame_to_records(df: pd.DataFrame) -> tuple[np.ndarray, str | None]:
+    dates = df["Date"]
+    if not pd.api.types.is_datetime64_any_dtype(dates):   # to_datetime на готовых датах тоже дорог
+        dates = pd.to_datetime(dates)
+    tz = str(dates.dt.tz) if dates.dt.tz is not None else None
+    if tz:
+        dates = dates.dt.tz_localize(None)
+    rec = np.empty(len(df), dtype=BAR_DTYPE)
+    rec["t"] = dates.to_numpy(dtype="datetime64[ns]").view("i8")
+    for f, col in _COLS:
+        rec[f] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="f8")
+    return rec, tz
+
+def records_to_frame(rec: np.ndarray, tz: str | None = None) -> pd.DataFrame:
+    dates = pd.to_datetime(np.asarray(rec["t"]), unit="ns")
+    if tz:
+        dates = dates.tz_localize(tz)
+    df = pd.DataFrame({"Date": dates})
+    for f, col in _COLS:
+        df[col] = np.asarray(rec[f])
+    return df
+
+class BarCache:
+    """
+    Кэш баров по ключу (symbol, interval): <root>/<SYMBOL>__<interval>.npy + .json (мета).
+    - ttl: сколько секунд после последней догрузки данные считаются свежими (без сети);
+    - max_age: ключи, к которым не обращались дольше, удаляются;
+    - max_bytes: лимит размера каталога, сверх него вытесняем давно не используемые ключи.
+    Размеры и отметки использования — в памяти (каталог сканируется один раз), вытеснение со сканом —
+    только при превышении max_bytes или раз в AGE_CHECK секунд для max_age.
+    """
+    AGE_CHECK = 3600.0
+    def __init__(self, root: str | os.PathLike | None = None, ttl: float = 900.0,
+                 max_age: float = 30*86400.0, max_bytes: int = 256 * 2**20):
+        default = pathlib.Path.home() / ".cache" / "ai_trading" / "ohlcv"
+        self.root = pathlib.Path(root or os.getenv("OHLCV_CACHE_DIR") or default)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ttl, self.max_age, self.max_bytes = float(ttl), float(max_age), int(max_bytes)
+        self._stats = CacheStats()
+        self._index: dict[str, list] | None = None   # имя .json -> [время использования, размер .npy]
+        self._total = 0
+        self._swept = time.time()
+
+    # ---------- пути / мета ----------
+    def _paths(self, symbol: str, interval: str) -> tuple[pathlib.Path, pathlib.Path]:
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", f"{symbol.upper()}__{interval}")
+        return self.root / f"{safe}.npy", self.root / f"{safe}.json"
+
+    def meta(self, symbol: str, interval: str) -> dict | None:
+        _, p = self._paths(symbol, interval)
+        try:
+            return json.loads(p.read_text())
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, meta: dict) -> bool:
+        return (time.time() - float(meta.get("fetched_at", 0))) < self.ttl
+
+    # ---------- чтение / запись ----------
+    def load(self, symbol: str, interval: str) -> tuple[pd.DataFrame, dict] | None:
+        npy, meta_p = self._paths(symbol, interval)
+        meta = self.meta(symbol, interval)
+        if meta is None:
+            return None
+        try:
+            rec = np.load(npy, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if rec.dtype != BAR_DTYPE or len(rec) == 0:
+            return None
+        os.utime(meta_p)  # отметка использования для LRU
+        if self._index is not None and meta_p.name in self._index:
+            self._index[meta_p.name][0] = time.time()
+        return records_to_frame(rec, meta.get("tz")), meta
+
+    def store(self, symbol: str, interval: str, df: pd.DataFrame, source: str,
+              window_days: int | None = None) -> None:
+        rec, tz = frame_to_records(df)
+        prev = self.meta(symbol, interval) or {}
+        meta = {
+            "symbol": symbol.upper(), "interval": interval, "source": source, "tz": tz,
+            "rows": int(len(rec)), "fetched_at": time.time(),
+            # глубина окна (дней), запрошенная у источника при полной загрузке
+            "window_days": int(window_days) if window_days else prev.get("window_days"),
+        }
+        npy, meta_p = self._paths(symbol, interval)
+        # пишем во временные файлы и подменяем атомарно — читатели не видят половину записи
+        tmp = npy.with_name(f"{npy.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as fh:
+            np.save(fh, rec)
+        os.replace(tmp, npy)
+        tmp = meta_p.with_name(f"{meta_p.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, meta_p)
+        self._account(meta_p.name, npy.stat().st_size)
+        if self._total > self.max_bytes or time.time() - self._swept > min(self.max_age, self.AGE_CHECK):
+            self.evict()
+
+    def _scan(self) -> list[tuple[float, int, pathlib.Path, pathlib.Path]]:
+        """Один проход по каталогу: (время использования, размер, .json, .npy); заново строит индекс."""
+        entries = []
+        for meta_p in self.root.glob("*.json"):
+            npy = meta_p.with_suffix(".npy")
+            try:
+                used = meta_p.stat().st_mtime
+                size = npy.stat().st_size if npy.exists() else 0
+            except OSError:
+                continue
+            entries.append((used, size, meta_p, npy))
+        self._index = {e[2].name: [e[0], e[1]] for e in entries}
+        self._total = sum(e[1] for e in entries)
+        return entries
+
+    def _account(self, name: str, size: int) -> None:
+        if self._index is None:
+            self._scan()   # файл уже записан — скан его учтёт
+            return
+        prev = self._index.get(name)
+        self._total += size - (prev[1] if prev else 0)
+        self._index[name] = [time.time(), size]
+
+    @staticmethod
+    def merge(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+        """Склеивает кэш и свежий хвост; последний бар из хвоста заменяет кэшированный."""
+        if new is None or new.empty:
+            return old
+        old_tz = pd.to_datetime(old["Date"]).dt.tz
+        new = new.copy()
+        new["Date"] = pd.to_datetime(new["Date"])
+        if old_tz is not None and new["Date"].dt.tz is None:
+            new["Date"] = new["Date"].dt.tz_localize(old_tz)
+        elif old_tz is not None:
+            new["Date"] = new["Date"].dt.tz_convert(old_tz)
+        elif new["Date"].dt.tz is not None:
+            new["Date"] = new["Date"].dt.tz_localize(None)
+        out = pd.concat([old, new[old.columns]], ignore_index=True)
+        out = out.drop_duplicates(subset="Date", keep="last").sort_values("Date")
+        return out.reset_index(drop=True)
+
+    # ---------- вытеснение / статистика ----------
+    def evict(self) -> int:
+        """Скан каталога (в нём могут писать и другие процессы) и удаление старых/лишних ключей."""
+        entries = self._scan()
+        now, removed = time.time(), 0
+        self._swept = now
+        total = self._total
+        # сверх лимита — ужимаем до 90%: следующие несколько store() обойдутся без скана
+        limit = self.max_bytes * 0.9 if total > self.max_bytes else self.max_bytes
+        for used, size, meta_p, npy in sorted(entries, key=lambda e: e[0]):
+            if now - used <= self.max_age and total <= limit:
+                break
+            for p in (npy, meta_p):
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+            self._index.pop(meta_p.name, None)
+        self._total = total
+        self._stats.evictions += removed
+        return removed
+
+    def clear(self) -> None:
+        for p in list(self.root.glob("*.npy")) + list(self.root.glob("*.json")):
+            try:
+                p.unlink()
+            except OSError:
+                pass
+        self._index, self._total = {}, 0
+
+    def count(self, kind: str) -> None:
+        setattr(self._stats, kind, getattr(self._stats, kind) + 1)
+
+    def stats(self) -> dict:
+        return asdict(self._stats)
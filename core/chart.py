@@ -0,0 +1,129 @@
+# core/chart.py — график сигнала: свечи, прореженные до разрешения экрана, и уровни одним набором shapes
+# Подготовка данных (прореживание, описания линий) — на numpy/словарях; plotly импортируется лениво.
+# ChartCache держит построенную фигуру и при смене горизонта/детализации меняет только уровни.
+from __future__ import annotations
+from typing import Any
+import numpy as np, pandas as pd
+
+from core.bars import Bars
+
+MAX_CANDLES = 1500   # больше свечей на ширине графика всё равно не различить
+HIGHLIGHT_BARS = 40  # ширина подсветки зон TP/SL справа
+
+PLAN_LABELS = {"entry": "Entry", "tp1": "TP1", "tp2": "TP2", "sl": "SL", "key_mark": "Ключевая отметка",
+               "upper_zone": "Верхняя зона", "lower_zone": "Нижняя зона"}
+COLORS = {
+    "Entry":"#2563eb","TP1":"#16a34a","TP2":"#16a34a","SL":"#dc2626",
+    "Ключевая отметка":"#6b7280","Верхняя зона":"#f59e0b","Нижняя зона":"#10b981",
+    "Ориентир ↑1":"#a78bfa","Ориентир ↑2":"#a78bfa",
+    "Ориентир ↓1":"#f472b6","Ориентир ↓2":"#f472b6",
+}
+
+# ---------- прореживание ----------
+def downsample_ohlc(df: pd.DataFrame | Bars, max_points: int = MAX_CANDLES) -> pd.DataFrame:
+    """
+    Не больше max_points свечей: подряд идущие бары сливаются по k штук (Open первого, High/Low —
+    экстремумы, Close последнего, объём — сумма), так что ни один максимум/минимум не теряется.
+    Корзины выровнены по концу ряда: последняя свеча — всегда последние k баров.
+    """
+    df = df.to_pandas() if isinstance(df, Bars) else df
+    n = len(df)
+    if n <= max_points or max_points < 1:
+        return df
+    k = -(-n // max_points)
+    r = n % k   # первая корзина может быть неполной
+    starts = np.arange(0, n, k) if r == 0 else np.r_[0, np.arange(r, n, k)]
+    last = np.r_[starts[1:], n] - 1
+    o, h, l, c = (df[f].to_numpy(dtype="f8") for f in ("Open", "High", "Low", "Close"))
+    out = {"Date": df["Date"].iloc[starts].to_numpy(), "Open": o[starts],
+           "High": np.fmax.reduceat(h, starts), "Low": np.fmin.reduceat(l, starts), "Close": c[last]}
+    if "Volume" in df:
+        out["Volume"] = np.add.reduceat(np.nan_to_num(df["Volume"].to_numpy(dtype="f8")), starts)
+    return pd.DataFrame(out)
+
+# ---------- уровни ----------
+def _hline(y: float, label: str) -> tuple[dict, dict]:
+    color = COLORS.get(label, "#999")
+    shape = {"type": "line", "xref": "paper", "x0": 0, "x1": 1, "yref": "y", "y0": y, "y1": y,
+             "line": {"color": color, "width": 1, "dash": "dot"}}
+    note = {"xref": "paper", "x": 0, "yref": "y", "y": y, "text": label, "showarrow": False,
+            "xanchor": "left", "yanchor": "bottom"}   # как annotation_position="top left" у add_hline
+    return shape, note
+
+def level_layout(sig: dict, ups: list[float], dns: list[float], x0=None, x1=None) -> tuple[list[dict], list[dict]]:
+    """
+    shapes и annotations для всех линий плана, нейтральных ориентиров и подсветки TP/SL —
+    для одного update_layout вместо отдельных add_hline/add_shape.
+    """
+    lines = [(sig.get(k), label) for k, label in PLAN_LABELS.items()]
+    lines += [(y, f"Ориентир ↑{i}") for i, y in enumerate(ups[:2], 1)]
+    lines += [(y, f"Ориентир ↓{i}") for i, y in enumerate(dns[:2], 1)]
+    shapes, notes = [], []
+    for y, label in lines:
+        if y is None:
+            continue
+        s, a = _hline(float(y), label)
+        shapes.append(s)
+        notes.append(a)
+    if x0 is not None and x1 is not None:
+        e = float(sig["entry"])
+        for y, fill in ((float(sig["tp2"]), "rgba(34,197,94,0.08)"), (float(sig["sl"]), "rgba(239,68,68,0.08)")):
+            shapes.append({"type": "rect", "xref": "x", "x0": x0, "x1": x1, "yref": "y",
+                           "y0": min(e, y), "y1": max(e, y), "fillcolor": fill, "line": {"width": 0},
+                           "layer": "below"})
+    return shapes, notes
+
+# ---------- фигура ----------
+def candles_figure(df: pd.DataFrame, max_points: int = MAX_CANDLES, height: int = 460):
+    """Фигура со свечами (прореженными) и без уровней."""
+    import plotly.graph_objects as go
+    d = downsample_ohlc(df, max_points)
+    fig = go.Figure([go.Candlestick(x=d["Date"].to_numpy(), open=d["Open"].to_numpy(), high=d["High"].to_numpy(),
+                                    low=d["Low"].to_numpy(), close=d["Close"].to_numpy())])
+    fig.update_layout(margin=dict(l=10,r=10,t=30,b=10), height=height, showlegend=False,
+                      xaxis_rangeslider_visible=False)
+    return fig
+
+def patch_levels(fig, shapes: list[dict], notes: list[dict], prev: tuple[list, list] | None = None) -> int:
+    """
+    Уровни на фигуре: без прошлых (или при другом их числе) — одной заменой layout.shapes/annotations,
+    иначе правятся только изменившиеся элементы. Возвращает число изменённых элементов.
+    """
+    if prev is None or len(prev[0]) != len(shapes) or len(prev[1]) != len(notes):
+        fig.update_layout(shapes=shapes, annotations=notes)
+        return len(shapes) + len(notes)
+    ds = [i for i, (a, b) in enumerate(zip(prev[0], shapes)) if a != b]
+    dn = [i for i, (a, b) in enumerate(zip(prev[1], notes)) if a != b]
+    if ds or dn:
+        with fig.batch_update():
+            for i in ds:
+                fig.layout.shapes[i].update(shapes[i])
+            for i in dn:
+                fig.layout.annotations[i].update(notes[i])
+    return len(ds) + len(dn)
+
+class ChartCache:
+    """
+    Последняя фигура на ключ (тикер, интервал, последний бар): свечи строятся один раз на кадр,
+    при смене горизонта/детализации меняются только уровни. Хранить на пользователя (session_state):
+    фигура изменяемая.
+    """
+    def __init__(self, max_points: int = MAX_CANDLES):
+        self.max_points = max_points
+        self._key: tuple | None = None
+        self._fig: Any = None
+        self._levels: tuple[list, list] | None = None
+        self.patched = 0   # элементов изменено последним вызовом (для диагностики)
+
+    def figure(self, symbol: str, interval: str, df: pd.DataFrame, sig: dict,
+               ups: list[float], dns: list[float]):
+        from core.memo import frame_fingerprint
+        key = (symbol.upper(), interval, frame_fingerprint(df), self.max_points)
+        if key != self._key:
+            self._key, self._fig, self._levels = key, candles_figure(df, self.max_points), None
+        dates = df["Date"]
+        x0, x1 = dates.iloc[-min(len(df), HIGHLIGHT_BARS)], dates.iloc[-1]
+        shapes, notes = level_layout(sig, ups, dns, str(pd.Timestamp(x0)), str(pd.Timestamp(x1)))
+        self.patched = patch_levels(self._fig, shapes, notes, self._levels)
+        self._levels = (shapes, notes)
+        return self._fig
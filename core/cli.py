@@ -0,0 +1,145 @@
+# core/cli.py — сигналы и тексты без интерфейса: для cron / ночных прогонов по списку тикеров
+# Пример: python -m core.cli --file tickers.txt --horizons short,swing --out signals.parquet --timings
+# На старте — только argparse: pandas и модули core грузятся после разбора аргументов (--help мгновенный),
+# requests — при первом сетевом запросе, yfinance — только на запасном пути, numba — только по --kernels numba.
+from __future__ import annotations
+import argparse, json, os, pathlib, sys, time
+
+_T0 = time.perf_counter()
+
+FORMATS = ("csv", "jsonl", "parquet")
+
+def _process_age_ms() -> float | None:
+    """Время с запуска процесса, включая старт интерпретатора (Linux /proc; точность ~10 мс)."""
+    try:
+        with open("/proc/self/stat") as f:
+            start = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return (uptime - start / os.sysconf("SC_CLK_TCK")) * 1000
+    except (OSError, ValueError, IndexError):
+        return None
+
+def read_symbols(args_symbols: list[str], files: list[str]) -> list[str]:
+    """Тикеры из аргументов и файлов (по одному в строке или через запятую; # — комментарий)."""
+    raw = list(args_symbols)
+    for p in files:
+        text = sys.stdin.read() if p == "-" else pathlib.Path(p).read_text()
+        for line in text.splitlines():
+            raw += line.split("#", 1)[0].replace(",", " ").split()
+    return list(dict.fromkeys(s.strip().upper() for s in raw if s.strip()))
+
+def _format(out: str, fmt: str | None) -> str:
+    if fmt:
+        return fmt
+    ext = pathlib.Path(out).suffix.lower().lstrip(".")
+    return {"json": "jsonl", "pq": "parquet"}.get(ext, ext) if ext in (*FORMATS, "json", "pq") else "csv"
+
+def write(df, out: str, fmt: str | None = None) -> None:
+    """CSV / JSONL / Parquet (нужен pyarrow или fastparquet); "-" — CSV/JSONL в stdout."""
+    fmt = _format(out, fmt)
+    if out == "-":
+        if fmt == "parquet":
+            raise SystemExit("parquet cannot be written to stdout")
+        sys.stdout.write(df.to_json(orient="records", lines=True, force_ascii=False) if fmt == "jsonl"
+                         else df.to_csv(index=False))
+        return
+    path = pathlib.Path(out)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    elif fmt == "jsonl":
+        df.to_json(path, orient="records", lines=True, force_ascii=False)
+    else:
+        df.to_csv(path, index=False)
+
+def run(symbols: list[str], horizons: tuple[str, ...] = ("short", "swing", "position"), period: str = "1y",
+        interval: str = "1d", detail: str | None = "Стандарт", engine: str = "batch",
+        offline: bool | None = None, max_workers: int | None = None, seed: int = 0):
+    """Загрузка -> сигналы по горизонтам -> тексты. Возвращает (DataFrame, тикеры без данных)."""
+    import pandas as pd
+    from core.data_loader import DataLoader
+    from core.telemetry import span
+
+    with span("cli.load"):
+        loader = DataLoader(offline=offline)
+        fetched = loader.history_many(symbols, period=period, interval=interval, max_workers=max_workers)
+    frames = {s: r.df for s, r in fetched.items()}
+    missing = [s for s in symbols if s not in frames]
+    if not frames:
+        return pd.DataFrame(), missing
+
+    with span("cli.signals", engine=engine):
+        if engine == "batch":   # по матрицам (T, N): один проход на горизонт для всех тикеров
+            from core.batch import compute_signals_batch
+            df = pd.concat([compute_signals_batch(frames, hz) for hz in horizons], ignore_index=True)
+        else:                   # по тикеру: индикаторы один раз на все горизонты
+            from core.strategy import compute_signals
+            df = pd.DataFrame([sig for s, f in frames.items() for sig in compute_signals(f, s, horizons).values()])
+        last = {s: str(pd.Timestamp(f["Date"].iloc[-1]).date()) for s, f in frames.items()}
+        df["date"] = df["symbol"].map(last)
+        df["source"] = df["symbol"].map({s: r.source for s, r in fetched.items()})
+
+    if detail:
+        from core.llm import build_rationales
+        with span("cli.rationale"):
+            df["text"] = build_rationales(df, detail, seed=seed)
+    return df, missing
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Сигналы и описания по списку тикеров без интерфейса")
+    ap.add_argument("symbols", nargs="*", help="тикеры")
+    ap.add_argument("-f", "--file", action="append", default=[], help="файл со списком тикеров ('-' — stdin)")
+    ap.add_argument("--horizons", default="short,swing,position")
+    ap.add_argument("--period", default="1y")
+    ap.add_argument("--interval", default="1d")
+    ap.add_argument("--detail", default="Стандарт", help="Коротко | Стандарт | Подробно | none — без текста")
+    ap.add_argument("--engine", choices=("batch", "single"), default="batch")
+    ap.add_argument("--kernels", default=os.getenv("SIGNAL_KERNELS", "numpy"),
+                    help="numpy | numba | auto (на последнем баре JIT не окупает импорт numba)")
+    ap.add_argument("--offline", action="store_true", help="без сети: кэш, локальное хранилище, demo CSV")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--seed", type=int, default=0, help="вариант формулировок текста")
+    ap.add_argument("-o", "--out", default="-", help="файл .csv/.jsonl/.parquet или '-' (stdout)")
+    ap.add_argument("--format", choices=FORMATS, default=None, help="иначе — по расширению --out")
+    ap.add_argument("--timings", action="store_true", help="замеры старта и стадий — JSON в stderr")
+    args = ap.parse_args(argv)
+
+    symbols = read_symbols(args.symbols, args.file)
+    if not symbols:
+        ap.error("no symbols (pass tickers or --file)")
+
+    t_imp = time.perf_counter()
+    import pandas  # noqa: F401 — основная часть старта; отдельно от расчёта
+    from core import telemetry, kernels, data_loader, strategy, batch  # noqa: F401
+    telemetry.enable(args.timings)
+    kernels.set_backend(args.kernels)
+    import_ms = (time.perf_counter() - t_imp) * 1000
+
+    t_run = time.perf_counter()
+    df, missing = run(symbols, tuple(h for h in args.horizons.split(",") if h), args.period, args.interval,
+                      None if args.detail.lower() == "none" else args.detail, args.engine,
+                      True if args.offline else None, args.workers, args.seed)
+    t_write = time.perf_counter()
+    if len(df):
+        with telemetry.span("cli.write", format=_format(args.out, args.format)):
+            write(df, args.out, args.format)
+    if missing:
+        print(f"no data: {len(missing)} of {len(symbols)} ({', '.join(missing[:10])}{' ...' if len(missing) > 10 else ''})",
+              file=sys.stderr)
+    if args.timings:
+        now = time.perf_counter()
+        report = {
+            "process_ms": _process_age_ms(),                # от запуска процесса, со стартом интерпретатора
+            "cli_import_ms": (t_imp - _T0) * 1000,          # от импорта core.cli до разбора аргументов
+            "core_import_ms": import_ms,                     # pandas, numpy, core — после разбора аргументов
+            "run_ms": (t_write - t_run) * 1000, "write_ms": (now - t_write) * 1000,
+            "symbols": len(symbols), "rows": int(len(df)),
+            "stages": {s["stage"] + "".join(f"[{k}={v}]" for k, v in sorted(s["labels"].items())):
+                       round(s["sum_ms"], 2) for s in telemetry.snapshot()},
+        }
+        print(json.dumps(report, ensure_ascii=False, indent=2), file=sys.stderr)
+    return 0 if len(df) else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
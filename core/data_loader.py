@@ -1,56 +1,373 @@
 from __future__ import annotations
 from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
 from datetime import datetime, timedelta, timezone
-import os, pathlib, requests, pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+import os, pathlib, threading, time, pandas as pd
+
+from core.bars import Bars
+from core.cache import BarCache
+from core.store import MarketStore
+from core.resample import DERIVED, resample_frame
+from core.telemetry import span
+
+if TYPE_CHECKING:
+    import requests
+    from core.fetch import FetchPipeline
 
 @dataclass
 class FetchResult:
     df: pd.DataFrame
     source: str
+    report: Any = None   # core.fetch.FetchReport — откуда и почему взяты данные (только FetchPipeline)
+
+# интервалы в терминах yfinance -> (multiplier, timespan) агрегатов Polygon
+POLYGON_SPANS = {
+    "1m": (1, "minute"), "2m": (2, "minute"), "5m": (5, "minute"), "15m": (15, "minute"),
+    "30m": (30, "minute"), "60m": (1, "hour"), "90m": (90, "minute"), "1h": (1, "hour"),
+    "1d": (1, "day"), "5d": (5, "day"), "1wk": (1, "week"), "1mo": (1, "month"),
+}
+
+def is_intraday(interval: str) -> bool:
+    return POLYGON_SPANS.get(interval, (1, "day"))[1] in ("minute", "hour")
+
+def _lookback_days(period: str, interval: str) -> int:
+    """Глубина запроса к Polygon: для дневных — с запасом под EMA200, внутри дня — ровно период."""
+    if is_intraday(interval):
+        return _period_days(period)
+    return 270 if period.endswith("mo") else 365
+
+def _period_days(period: str) -> int:
+    """'5d' / '2wk' / '6mo' / '1y' -> примерное число календарных дней."""
+    p = period.strip().lower()
+    for suffix, mult in (("mo", 31), ("wk", 7), ("y", 366), ("d", 1)):
+        if p.endswith(suffix) and p[:-len(suffix)].isdigit():
+            return int(p[:-len(suffix)]) * mult
+    return 365 * 30  # 'max' и прочее — «вся история»
+
+def _crop_window(df: pd.DataFrame, window_days: int) -> pd.DataFrame:
+    """Кадр из кэша -> окно, как при полной загрузке из того же источника (window_days от сегодня)."""
+    dates = pd.to_datetime(df["Date"])
+    cutoff = pd.Timestamp(datetime.now(timezone.utc).date() - timedelta(days=window_days))
+    if dates.dt.tz is not None:
+        cutoff = cutoff.tz_localize(dates.dt.tz)
+    df = df.loc[dates >= cutoff].reset_index(drop=True)
+    return df[["Date","Open","High","Low","Close","Volume"]]
 
 class DataLoader:
-    def __init__(self, polygon_api_key: str | None = None):
+    def __init__(self, polygon_api_key: str | None = None, cache: BarCache | None = None,
+                 max_workers: int = 8, max_retries: int = 3, polygon_url: str | None = None,
+                 store: MarketStore | None = None, offline: bool | None = None):
         self.polygon_api_key = polygon_api_key or os.getenv("POLYGON_API_KEY")
+        # локальное хранилище истории: запасной источник перед demo CSV, а в offline — единственный
+        self.store = store if store is not None else (MarketStore() if os.getenv("MARKET_STORE_DIR") else None)
+        self.offline = offline if offline is not None else os.getenv("AI_TRADING_OFFLINE", "") in ("1", "true", "yes")
+        # базовый адрес API (для локальной заглушки в бенчмарках)
+        self.polygon_url = (polygon_url or os.getenv("POLYGON_BASE_URL") or "https://api.polygon.io").rstrip("/")
+        self.cache = cache
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self._session: requests.Session | None = None
+        self._session_lock = threading.Lock()
+        self._pipeline: FetchPipeline | None = None
+
+    def session(self) -> requests.Session:
+        """Общая сессия с пулом keep-alive соединений (по соединению на поток)."""
+        with self._session_lock:
+            if self._session is None:
+                import requests   # ~0.1 с на импорт — только когда действительно идём в сеть
+                from requests.adapters import HTTPAdapter
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(self.max_workers, 4))
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                self._session = s
+            return self._session
+
+    def _get(self, url: str, timeout: float = 20) -> requests.Response:
+        """GET с учётом лимитов Polygon: на 429/5xx ждём Retry-After или экспоненциальную паузу."""
+        r = self.session().get(url, timeout=timeout)
+        for attempt in range(self.max_retries):
+            if r.status_code != 429 and r.status_code < 500:
+                break
+            try:
+                pause = float(r.headers.get("Retry-After", ""))
+            except ValueError:
+                pause = 1.0 * 2**attempt
+            time.sleep(min(pause, 60.0))
+            r = self.session().get(url, timeout=timeout)
+        return r
+
+    def pipeline(self) -> "FetchPipeline":
+        """Асинхронный конвейер загрузки (дедлайн, хеджирование, предохранители) поверх этого загрузчика."""
+        if self._pipeline is None:
+            from core.fetch import FetchPipeline
+            self._pipeline = FetchPipeline(self)
+        return self._pipeline
+
+    async def history_async(self, symbol: str, period: str = "6mo", interval: str = "1d",
+                            deadline: float | None = None) -> FetchResult:
+        """Как history, но не блокирует цикл событий и укладывается в deadline секунд (см. core.fetch)."""
+        return await self.pipeline().fetch(symbol, period, interval, deadline=deadline)
 
     def history(self, symbol: str, period: str = "6mo", interval: str = "1d") -> FetchResult:
+        with span("loader.history", interval=interval) as sp:
+            if interval in DERIVED:   # нет у источников — сворачиваем из базового интервала
+                res = self._history(symbol, period, DERIVED[interval])
+                res = FetchResult(df=resample_frame(res.df, interval), source=res.source)
+            else:
+                res = self._history(symbol, period, interval)
+            sp.set(source=res.source.split(":")[0].split("+")[0])
+            return res
+
+    def _history(self, symbol: str, period: str, interval: str) -> FetchResult:
+        if self.cache is not None:
+            res = self._cached_history(symbol, period, interval)
+            if res is not None:
+                return res
+        res = self._remote_history(symbol, period, interval)
+        if res is not None:
+            df, source, window = res
+            if self.cache is not None:
+                self.cache.count("misses")
+                self.cache.store(symbol, interval, df, source, window_days=window)
+            return FetchResult(df=df, source=source)
+        for res in (self._store_history(symbol, period, interval), self._demo_history(symbol)):
+            if res is not None:
+                return res
+        raise RuntimeError("No data from Polygon, Yahoo, local store, or demo CSV.")
+
+    def history_many(self, symbols: list[str], period: str = "6mo", interval: str = "1d",
+                     max_workers: int | None = None) -> dict[str, FetchResult]:
+        """
+        Пакетная загрузка: кэш/Polygon параллельно (пул потоков + общая сессия),
+        остаток — одним мульти-тикерным запросом yfinance, затем demo CSV.
+        Тикеры без данных в результат не попадают.
+        """
+        with span("loader.history_many", interval=interval):
+            if interval in DERIVED:
+                base = self._history_many(symbols, period, DERIVED[interval], max_workers)
+                return {s: FetchResult(df=resample_frame(r.df, interval), source=r.source) for s, r in base.items()}
+            return self._history_many(symbols, period, interval, max_workers)
+
+    def _history_many(self, symbols: list[str], period: str, interval: str,
+                      max_workers: int | None) -> dict[str, FetchResult]:
+        symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+        out: dict[str, FetchResult] = {}
+        workers = max(1, min(max_workers or self.max_workers, len(symbols) or 1))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for sym, res in zip(symbols, pool.map(lambda s: self._primary_history(s, period, interval), symbols)):
+                if res is not None:
+                    out[sym] = res
+        rest = [s for s in symbols if s not in out]
+        if rest and not self.offline:
+            with span("loader.source", source="yahoo_batch") as sp:
+                try:
+                    frames = self._yahoo_history_many(rest, period=period, interval=interval)
+                except Exception:
+                    frames = {}
+                    sp.set(outcome="error")
+                else:
+                    sp.set(outcome="ok" if frames else "empty")
+            for sym, df in frames.items():
+                if self.cache is not None:
+                    self.cache.count("misses")
+                    self.cache.store(sym, interval, df, "yahoo", window_days=_period_days(period))
+                out[sym] = FetchResult(df=df, source="yahoo")
+        for sym in [s for s in symbols if s not in out]:
+            res = self._store_history(sym, period, interval) or self._demo_history(sym)
+            if res is not None:
+                out[sym] = res
+        return {s: out[s] for s in symbols if s in out}
+
+    def _primary_history(self, symbol: str, period: str, interval: str) -> FetchResult | None:
+        """Кэш (с догрузкой хвоста) или полная загрузка из Polygon — то, что можно делать параллельно."""
+        if self.cache is not None:
+            try:
+                res = self._cached_history(symbol, period, interval)
+            except Exception:
+                res = None
+            if res is not None:
+                return res
+        if not self.polygon_api_key or self.offline:
+            return None
+        lookback = _lookback_days(period, interval)
+        with span("loader.source", source="polygon") as sp:
+            try:
+                df = self._polygon_history(symbol, interval=interval, lookback_days=lookback)
+            except Exception:
+                sp.set(outcome="error")
+                return None
+            if df is None or df.empty:
+                sp.set(outcome="empty")
+                return None
+            sp.set(outcome="ok")
+        if self.cache is not None:
+            self.cache.count("misses")
+            self.cache.store(symbol, interval, df, "polygon", window_days=lookback)
+        return FetchResult(df=df, source="polygon")
+
+    def _store_history(self, symbol: str, period: str, interval: str) -> FetchResult | None:
+        """Локальное хранилище: окно периода считается от последнего бара в нём (данные могут быть старыми)."""
+        if self.store is None:
+            return None
+        with span("loader.source", source="store") as sp:
+            try:
+                df = self.store.last_days(symbol, _period_days(period), interval)
+            except Exception:
+                sp.set(outcome="error")
+                return None
+            if df is None or df.empty:
+                sp.set(outcome="empty")
+                return None
+            sp.set(outcome="ok")
+            return FetchResult(df=df, source="store")
+
+    def _demo_history(self, symbol: str) -> FetchResult | None:
+        here = pathlib.Path(__file__).resolve().parent.parent
+        demo = here / "data" / f"{symbol.lower()}_demo.csv"
+        with span("loader.source", source="demo") as sp:
+            if demo.exists():
+                df = pd.read_csv(demo)
+                sp.set(outcome="ok")
+                return FetchResult(df=df[["Date","Open","High","Low","Close","Volume"]], source="demo-csv")
+            sp.set(outcome="empty")
+        return None
+
+    # ---------- сетевые источники ----------
+    def _remote_history(self, symbol: str, period: str, interval: str,
+                        start=None) -> tuple[pd.DataFrame, str, int] | None:
+        """Polygon -> Yahoo. start — догрузка хвоста с указанной даты (включительно)."""
+        if self.offline:
+            return None
+        lookback = _lookback_days(period, interval)
         if self.polygon_api_key:
+            with span("loader.source", source="polygon") as sp:
+                try:
+                    df = self._polygon_history(symbol, interval=interval, lookback_days=lookback, start=start)
+                    if df is not None and not df.empty:
+                        sp.set(outcome="ok")
+                        return df, "polygon", lookback
+                    sp.set(outcome="empty")
+                except Exception:
+                    sp.set(outcome="error")
+        with span("loader.source", source="yahoo") as sp:
             try:
-                df = self._polygon_history(symbol, interval=interval, lookback_days=270 if period.endswith("mo") else 365)
+                df = self._yahoo_history(symbol, period=period, interval=interval, start=start)
                 if df is not None and not df.empty:
-                    return FetchResult(df=df, source="polygon")
+                    sp.set(outcome="ok")
+                    return df, "yahoo", _period_days(period)
+                sp.set(outcome="empty")
             except Exception:
-                pass
-        try:
-            import yfinance as yf
-            df = yf.Ticker(symbol).history(period=period, interval=interval, auto_adjust=False)
-            if df is not None and not df.empty:
-                df = df.reset_index().rename(columns=str.title)
-                return FetchResult(df=df[["Date","Open","High","Low","Close","Volume"]], source="yahoo")
-        except Exception:
-            pass
-        here = pathlib.Path(__file__).resolve().parent.parent
-        demo = here / "data" / "demo" / f"{symbol.lower()}_demo.csv"
-        if demo.exists():
-            df = pd.read_csv(demo)
-            return FetchResult(df=df[["Date","Open","High","Low","Close","Volume"]], source="demo-csv")
-        raise RuntimeError("No data from Polygon, Yahoo, or demo CSV.")
-
-    def _polygon_history(self, symbol: str, interval: str = "1d", lookback_days: int = 270) -> pd.DataFrame | None:
-        if interval != "1d":
+                sp.set(outcome="error")
+        return None
+
+    def _cached_history(self, symbol: str, period: str, interval: str) -> FetchResult | None:
+        """Отдаёт кэш, если он свежий; иначе догружает только недостающий хвост."""
+        with span("loader.source", source="cache") as sp:
+            res = self._cached_history_inner(symbol, period, interval)
+            sp.set(outcome="miss" if res is None else ("topup" if "+cache" in res.source else "hit"))
+            return res
+
+    def _cached_history_inner(self, symbol: str, period: str, interval: str) -> FetchResult | None:
+        hit = self.cache.load(symbol, interval)
+        if hit is None:
             return None
-        end = datetime.now(timezone.utc).date()
-        start = end - timedelta(days=lookback_days)
-        url = f"https://api.polygon.io/v2/aggs/ticker/{symbol}/range/1/day/{start}/{end}?adjusted=true&sort=asc&limit=50000&apiKey={self.polygon_api_key}"
-        r = requests.get(url, timeout=20)
-        if r.status_code != 200:
+        df, meta = hit
+        window = int(meta.get("window_days") or 0)
+        if window < min(_period_days(period), _lookback_days(period, interval)):
+            return None  # в кэше более короткое окно, чем просят — полная загрузка
+        if not self.cache.is_fresh(meta):
+            last = pd.to_datetime(df["Date"].iloc[-1])
+            # последний бар мог быть незакрытым — перезапрашиваем начиная с него
+            tail = self._remote_history(symbol, period, interval, start=last.date())
+            if tail is None:
+                return None
+            tail_df, source, _ = tail
+            df = BarCache.merge(df, tail_df)
+            self.cache.store(symbol, interval, df, source)
+            self.cache.count("topups")
+            label = f"{source}+cache"
+        else:
+            self.cache.count("hits")
+            label = f"cache:{meta.get('source', '?')}"
+        return FetchResult(df=_crop_window(df, window), source=label)
+
+    def _yahoo_history(self, symbol: str, period: str = "6mo", interval: str = "1d",
+                       start=None, timeout: float | None = None) -> pd.DataFrame | None:
+        import yfinance as yf
+        t = yf.Ticker(symbol)
+        kw = {"timeout": timeout} if timeout is not None else {}
+        if start is not None:
+            df = t.history(start=str(start), interval=interval, auto_adjust=False, **kw)
+        else:
+            df = t.history(period=period, interval=interval, auto_adjust=False, **kw)
+        if df is None or df.empty:
             return None
-        js = r.json()
-        if not js or "results" not in js or not js["results"]:
+        # внутридневные бары yfinance отдаёт с индексом Datetime
+        df = df.reset_index().rename(columns=str.title).rename(columns={"Datetime": "Date"})
+        return df[["Date","Open","High","Low","Close","Volume"]]
+
+    def _yahoo_history_many(self, symbols: list[str], period: str = "6mo",
+                            interval: str = "1d") -> dict[str, pd.DataFrame]:
+        import yfinance as yf
+        raw = yf.download(symbols, period=period, interval=interval, group_by="ticker",
+                          auto_adjust=False, threads=True, progress=False)
+        if raw is None or raw.empty:
+            return {}
+        out = {}
+        for sym in symbols:
+            if isinstance(raw.columns, pd.MultiIndex):
+                if sym not in raw.columns.get_level_values(0):
+                    continue
+                part = raw[sym]
+            else:
+                part = raw  # один тикер — плоские колонки
+            part = part.dropna(how="all")
+            if part.empty:
+                continue
+            df = part.reset_index().rename(columns=str.title).rename(columns={"Datetime": "Date"})
+            out[sym] = df[["Date","Open","High","Low","Close","Volume"]]
+        return out
+
+    def _polygon_history(self, symbol: str, interval: str = "1d", lookback_days: int = 270,
+                         start=None, timeout: float = 20) -> pd.DataFrame | None:
+        bars = self._polygon_bars(symbol, interval, lookback_days, start, timeout=timeout)
+        return bars.to_pandas() if bars is not None else None
+
+    def _polygon_bars(self, symbol: str, interval: str = "1d", lookback_days: int = 270,
+                      start=None, max_pages: int = 200, timeout: float = 20) -> Bars | None:
+        """Агрегаты любого интервала из POLYGON_SPANS; больше 50 000 строк — по страницам next_url."""
+        if interval not in POLYGON_SPANS:
+            return None
+        mult, span_ = POLYGON_SPANS[interval]
+        end = datetime.now(timezone.utc).date()
+        if start is None:
+            start = end - timedelta(days=lookback_days)
+        url = (f"{self.polygon_url}/v2/aggs/ticker/{symbol}/range/{mult}/{span_}/{start}/{end}"
+               f"?adjusted=true&sort=asc&limit=50000&apiKey={self.polygon_api_key}")
+        pages: list[Bars] = []
+        for n in range(max_pages):
+            r = self._get(url, timeout=timeout)
+            if r.status_code != 200:
+                if n == 0:
+                    return None
+                # без хвоста кадр не покрывает окно: в кэш он лёг бы как полный и не догружался бы
+                raise RuntimeError(f"{symbol}: polygon page {n + 1} failed (HTTP {r.status_code}), "
+                                   f"{sum(len(p) for p in pages)} rows incomplete")
+            js = r.json() or {}
+            if js.get("results"):
+                pages.append(Bars.from_polygon(js["results"]))
+            nxt = js.get("next_url")
+            if not nxt:
+                break
+            # next_url приходит без ключа
+            url = f"{nxt}{'&' if '?' in nxt else '?'}apiKey={self.polygon_api_key}"
+        else:
+            raise RuntimeError(f"{symbol}: polygon returned more than {max_pages} pages")
+        if not pages:
             return None
-        rows = []
-        for it in js["results"]:
-            rows.append({
-                "Date": pd.to_datetime(it["t"], unit="ms").tz_localize("UTC").tz_convert(None),
-                "Open": it["o"], "High": it["h"], "Low": it["l"], "Close": it["c"], "Volume": it.get("v", 0)
-            })
-        return pd.DataFrame(rows)
+        bars = Bars.concat(pages)
+        if is_intraday(interval):
+            bars.tz = "America/New_York"   # t — UTC; дни для пивотов — по часам биржи
+        return bars
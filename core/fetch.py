@@ -0,0 +1,346 @@
+# core/fetch.py — асинхронная загрузка с общим дедлайном, хеджированием источников и предохранителями
+# Сетевые источники (Polygon, Yahoo) блокирующие — они идут в собственном пуле потоков, а цикл событий
+# только ждёт первого удачного ответа. Проигравший запрос не прерывается (поток так не остановить),
+# но его результат больше никого не задерживает. Свой пул, а не пул цикла по умолчанию:
+# asyncio.run при выходе ждёт потоки своего пула, и дедлайн терял бы смысл.
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+import asyncio, os, threading, time
+import pandas as pd
+
+from core.cache import BarCache
+from core.data_loader import DataLoader, FetchResult, _crop_window, _lookback_days, _period_days
+from core.resample import DERIVED, resample_frame
+from core.telemetry import span
+
+SOURCES = ("polygon", "yahoo")
+
+@dataclass
+class Attempt:
+    source: str
+    outcome: str            # ok / empty / error / timeout / skipped / abandoned
+    ms: float = 0.0         # от начала запроса до ответа источника
+    note: str = ""          # почему источник запускали / пропустили
+
+@dataclass
+class FetchReport:
+    """Откуда взяты данные и почему: победитель, причина, попытки по источникам."""
+    symbol: str
+    interval: str
+    winner: str | None = None
+    reason: str = ""
+    elapsed_ms: float = 0.0
+    attempts: list[Attempt] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+class CircuitBreaker:
+    """
+    Предохранитель источника: после threshold ошибок подряд источник пропускается cooldown секунд,
+    затем пропускается одна пробная попытка (half-open): удача — замыкает, ошибка — снова на cooldown.
+    """
+    def __init__(self, threshold: int = 3, cooldown: float = 30.0):
+        self.threshold, self.cooldown = int(threshold), float(cooldown)
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probe = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            st = self.state
+            if st == "closed":
+                return True
+            if st == "half-open" and not self._probe:
+                self._probe = True
+                return True
+            return False
+
+    def record(self, ok: bool | None) -> None:
+        """ok=None — ни удача, ни ошибка (попытку сняли): только освобождает пробу half-open."""
+        with self._lock:
+            self._probe = False
+            if ok is None:
+                return
+            if ok:
+                self.failures, self.opened_at = 0, None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+class FetchPipeline:
+    """
+    Загрузка одного тикера: свежий кэш -> сеть (Polygon, через hedge_after секунд без ответа —
+    параллельно Yahoo; race=True — сразу оба) -> к дедлайну или после отказа сети — устаревший кэш,
+    локальное хранилище, demo CSV. Ответ — FetchResult с report (FetchReport).
+    history()/history_many() — синхронные обёртки с сигнатурой DataLoader (подходят SignalMemo).
+    """
+    def __init__(self, loader: DataLoader, deadline: float | None = None, hedge_after: float | None = None,
+                 race: bool = False, breaker_threshold: int = 3, breaker_cooldown: float = 30.0,
+                 max_workers: int | None = None):
+        self.loader = loader
+        self.deadline = float(deadline if deadline is not None else os.getenv("FETCH_DEADLINE", "8"))
+        self.hedge_after = float(hedge_after if hedge_after is not None
+                                 else float(os.getenv("FETCH_HEDGE_MS", "1500")) / 1000)
+        self.race = race
+        self.breakers = {s: CircuitBreaker(breaker_threshold, breaker_cooldown) for s in SOURCES}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or 2 * max(loader.max_workers, 4),
+                                        thread_name_prefix="fetch")
+
+    # ---------- источники ----------
+    def _sources(self) -> list[str]:
+        if self.loader.offline:
+            return []
+        return [s for s in SOURCES if s != "polygon" or self.loader.polygon_api_key]
+
+    def _call(self, source: str, symbol: str, period: str, interval: str, timeout: float,
+              start=None) -> tuple[pd.DataFrame, int] | None:
+        """Блокирующий вызов источника (в потоке пула): (кадр, окно в днях) или None. start — только хвост."""
+        if source == "polygon":
+            lookback = _lookback_days(period, interval)
+            df = self.loader._polygon_history(symbol, interval=interval, lookback_days=lookback,
+                                              start=start, timeout=timeout)
+            return (df, lookback) if df is not None and not df.empty else None
+        df = self.loader._yahoo_history(symbol, period=period, interval=interval, start=start, timeout=timeout)
+        return (df, _period_days(period)) if df is not None and not df.empty else None
+
+    async def _attempt(self, source: str, symbol: str, period: str, interval: str,
+                       t0: float, timeout: float, att: Attempt, start=None):
+        loop = asyncio.get_running_loop()
+        with span("loader.source", source=source) as sp:
+            try:
+                res = await loop.run_in_executor(self._pool, self._call, source, symbol, period, interval,
+                                                 timeout, start)
+            except asyncio.CancelledError:
+                if att.outcome == "pending":   # сняли, потому что ответил другой; timeout ставит _fetch
+                    att.outcome = "abandoned"
+                    self.breakers[source].record(None)
+                att.ms = (time.monotonic() - t0) * 1000
+                sp.set(outcome=att.outcome)
+                raise
+            except Exception as e:
+                res, att.note = None, f"{att.note}; {type(e).__name__}".lstrip("; ")
+                att.outcome = "error"
+            else:
+                att.outcome = "ok" if res is not None else "empty"
+            att.ms = (time.monotonic() - t0) * 1000
+            sp.set(outcome=att.outcome)
+        # пустой ответ — источник жив, просто данных нет; ошибкой считаются только error и timeout
+        self.breakers[source].record(att.outcome != "error")
+        return res
+
+    # ---------- main ----------
+    async def fetch(self, symbol: str, period: str = "6mo", interval: str = "1d",
+                    deadline: float | None = None) -> FetchResult:
+        symbol = symbol.strip().upper()
+        if interval in DERIVED:   # как DataLoader.history: базовый интервал + свёртка
+            res = await self.fetch(symbol, period, DERIVED[interval], deadline)
+            return FetchResult(df=resample_frame(res.df, interval), source=res.source, report=res.report)
+        t0 = time.monotonic()
+        end = t0 + (self.deadline if deadline is None else float(deadline))
+        rep = FetchReport(symbol=symbol, interval=interval)
+        with span("loader.fetch", interval=interval) as sp:
+            res, stale = await self._fetch(symbol, period, interval, t0, end, rep)
+            if res is None:
+                res = await self._fallback(symbol, period, interval, rep, stale)
+            rep.elapsed_ms = (time.monotonic() - t0) * 1000
+            sp.set(source=rep.winner or "none")
+        if res is None:
+            raise RuntimeError(f"{symbol}: no data ({rep.reason})")
+        res.report = rep
+        return res
+
+    async def _fetch(self, symbol: str, period: str, interval: str, t0: float, end: float,
+                     rep: FetchReport, sources: tuple[str, ...] = SOURCES) -> tuple[FetchResult | None, tuple | None]:
+        """Свежий кэш или сеть: (результат, None) либо (None, устаревший кэш (df, meta) или None)."""
+        loop, ld = asyncio.get_running_loop(), self.loader
+        stale, start = None, None
+        if ld.cache is not None:
+            hit = await loop.run_in_executor(self._pool, ld.cache.load, symbol, interval)
+            if hit is not None:
+                df, meta = hit
+                window = int(meta.get("window_days") or 0)
+                if window >= min(_period_days(period), _lookback_days(period, interval)):
+                    if ld.cache.is_fresh(meta):   # свежий — без сети (кэш сам обрежет окно)
+                        res = await loop.run_in_executor(self._pool, ld._cached_history, symbol, period, interval)
+                        if res is not None:
+                            rep.winner, rep.reason = "cache", "fresh cache"
+                            return res, None
+                    # устаревший — как DataLoader: из сети только хвост с последнего (возможно, незакрытого) бара
+                    stale, start = (df, meta), pd.to_datetime(df["Date"].iloc[-1]).date()
+
+        queue, tasks, atts = [], {}, {}
+        for s in self._sources():
+            if s not in sources:
+                continue
+            if self.breakers[s].allow():
+                queue.append(s)
+            else:
+                rep.attempts.append(Attempt(s, "skipped", note=f"circuit {self.breakers[s].state}"))
+        launch, note = True, ("race" if self.race else "first")
+        while queue or tasks:
+            left = end - time.monotonic()
+            if left <= 0:
+                rep.reason = "deadline"
+                for s in tasks.values():   # не ответил к дедлайну — для предохранителя это ошибка
+                    atts[s].outcome = "timeout"
+                    self.breakers[s].record(False)
+                break
+            # следующий источник: первый, после отказа предыдущего, по таймеру хеджа; race — все сразу
+            while queue and (launch or self.race):
+                s = queue.pop(0)
+                atts[s] = Attempt(s, "pending", note=note if start is None else f"{note}, tail from {start}")
+                rep.attempts.append(atts[s])
+                tasks[asyncio.ensure_future(self._attempt(s, symbol, period, interval, t0, min(20.0, left),
+                                                          atts[s], start))] = s
+                launch = False
+            done, _ = await asyncio.wait(tasks, timeout=min(left, self.hedge_after) if queue else left,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if queue:
+                    launch, note = True, f"hedge: no answer in {self.hedge_after * 1000:.0f}ms"
+                continue
+            for t in done:
+                s = tasks.pop(t)
+                out = t.result()
+                if out is None:
+                    launch, note = True, f"fallback: {s} {atts[s].outcome}"
+                    continue
+                for other in tasks:
+                    other.cancel()
+                df, window = out
+                rep.winner, rep.reason = s, f"{s} ({atts[s].note})"
+                if stale is not None:
+                    old, meta = stale
+                    df = BarCache.merge(old, df)
+                    ld.cache.store(symbol, interval, df, s)
+                    ld.cache.count("topups")
+                    return FetchResult(df=_crop_window(df, int(meta.get("window_days") or 0)),
+                                       source=f"{s}+cache"), None
+                if ld.cache is not None:
+                    ld.cache.count("misses")
+                    ld.cache.store(symbol, interval, df, s, window_days=window)
+                return FetchResult(df=df, source=s), None
+        for t in tasks:
+            t.cancel()
+        if not rep.reason:
+            rep.reason = "network failed" if rep.attempts else "no network sources"
+        return None, stale
+
+    async def _fallback(self, symbol: str, period: str, interval: str, rep: FetchReport,
+                        stale: tuple | None) -> FetchResult | None:
+        """Запасные источники: устаревший кэш (окно — как у свежего) -> хранилище -> demo."""
+        if stale is not None:
+            df, meta = stale
+            rep.winner, rep.reason = "stale-cache", f"{rep.reason}; stale cache"
+            return FetchResult(df=_crop_window(df, int(meta.get("window_days") or 0)),
+                               source=f"cache:{meta.get('source', '?')}")
+        loop, ld = asyncio.get_running_loop(), self.loader
+        for name, fn, args in (("store", ld._store_history, (symbol, period, interval)),
+                               ("demo", ld._demo_history, (symbol,))):
+            res = await loop.run_in_executor(self._pool, fn, *args)
+            if res is not None:
+                rep.winner, rep.reason = name, f"{rep.reason}; {name}"
+                return res
+        return None
+
+    async def fetch_many(self, symbols: list[str], period: str = "6mo", interval: str = "1d",
+                         deadline: float | None = None, concurrency: int | None = None) -> dict[str, FetchResult]:
+        """
+        Как DataLoader.history_many: кэш/Polygon по тикерам параллельно (у каждого свой дедлайн),
+        остаток — одним мульти-тикерным запросом yfinance, затем устаревший кэш, хранилище, demo.
+        Тикеры без данных в результат не попадают.
+        """
+        symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+        if interval in DERIVED:
+            base = await self.fetch_many(symbols, period, DERIVED[interval], deadline, concurrency)
+            return {s: FetchResult(df=resample_frame(r.df, interval), source=r.source, report=r.report)
+                    for s, r in base.items()}
+        budget = self.deadline if deadline is None else float(deadline)
+        sem = asyncio.Semaphore(concurrency or self.loader.max_workers)
+        out, stale, reps, t0s = {}, {}, {}, {}
+
+        async def primary(s: str):
+            async with sem:
+                t0s[s] = t0 = time.monotonic()
+                reps[s] = FetchReport(symbol=s, interval=interval)
+                try:
+                    out[s], stale[s] = await self._fetch(s, period, interval, t0, t0 + budget, reps[s],
+                                                         sources=("polygon",))
+                except Exception as e:
+                    out[s], stale[s] = None, None
+                    reps[s].reason = f"{type(e).__name__}"
+        with span("loader.fetch_many", interval=interval):
+            await asyncio.gather(*(primary(s) for s in symbols))
+            rest = [s for s in symbols if out[s] is None]
+            if rest and "yahoo" in self._sources():
+                for s, df in (await self._yahoo_batch(rest, period, interval, budget, reps)).items():
+                    out[s] = FetchResult(df=df, source="yahoo")
+                    reps[s].winner, reps[s].reason = "yahoo", "yahoo (batch)"
+            for s in [s for s in symbols if out[s] is None]:
+                out[s] = await self._fallback(s, period, interval, reps[s], stale[s])
+        now = time.monotonic()
+        for s, res in out.items():
+            reps[s].elapsed_ms = (now - t0s[s]) * 1000
+            if res is not None:
+                res.report = reps[s]
+        return {s: out[s] for s in symbols if out[s] is not None}
+
+    async def _yahoo_batch(self, symbols: list[str], period: str, interval: str, budget: float,
+                           reps: dict[str, FetchReport]) -> dict[str, pd.DataFrame]:
+        """Один yf.download на все тикеры за budget секунд; полный период — в кэш с его окном."""
+        br, ld = self.breakers["yahoo"], self.loader
+        if not br.allow():
+            for s in symbols:
+                reps[s].attempts.append(Attempt("yahoo", "skipped", note=f"circuit {br.state}"))
+            return {}
+        loop, t0, frames = asyncio.get_running_loop(), time.monotonic(), {}
+        with span("loader.source", source="yahoo_batch") as sp:
+            try:
+                frames = await asyncio.wait_for(loop.run_in_executor(
+                    self._pool, ld._yahoo_history_many, symbols, period, interval), budget)
+                outcome = "ok" if frames else "empty"
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+            except Exception:
+                outcome = "error"
+            sp.set(outcome=outcome)
+        br.record(outcome not in ("error", "timeout"))
+        ms = (time.monotonic() - t0) * 1000
+        for s in symbols:
+            reps[s].attempts.append(Attempt("yahoo", outcome if outcome != "ok" or s in frames else "empty",
+                                            ms, note=f"batch of {len(symbols)}"))
+        for s, df in frames.items():
+            if ld.cache is not None:
+                ld.cache.count("misses")
+                ld.cache.store(s, interval, df, "yahoo", window_days=_period_days(period))
+        return frames
+
+    # ---------- синхронные обёртки ----------
+    def history(self, symbol: str, period: str = "6mo", interval: str = "1d") -> FetchResult:
+        return _run(self.fetch(symbol, period, interval))
+
+    def history_many(self, symbols: list[str], period: str = "6mo", interval: str = "1d",
+                     max_workers: int | None = None) -> dict[str, FetchResult]:
+        return _run(self.fetch_many(symbols, period, interval, concurrency=max_workers))
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+def _run(coro):
+    """asyncio.run, а внутри уже работающего цикла — в отдельном потоке."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        return ex.submit(asyncio.run, coro).result()
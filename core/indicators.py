@@ -0,0 +1,302 @@
+# core/indicators.py — потоковые индикаторы: O(1) на бар, состояние сериализуется
+from __future__ import annotations
+from collections import deque
+import math
+
+_NAN = float("nan")
+
+def _isnan(x: float) -> bool:
+    return x != x
+
+def _clone(obj):
+    """Копия состояния: вложенные состояния (с kind) и deque копируются, числа — общие."""
+    new = object.__new__(type(obj))
+    d = new.__dict__
+    for k, v in obj.__dict__.items():
+        if type(v) is deque:
+            d[k] = deque(v, v.maxlen)
+        elif hasattr(type(v), "kind"):
+            d[k] = _clone(v)
+        else:
+            d[k] = v
+    return new
+
+class Ewm:
+    """
+    ewm(com=..., adjust=False).mean() по одному значению. Повторяет рекурсию pandas
+    (включая деление на old_wt+alpha и пропуск обновления на равном значении),
+    поэтому результат совпадает с pandas бит в бит.
+    """
+    kind = "ewm"
+
+    def __init__(self, com: float):
+        self.com = float(com)
+        self.alpha = 1. / (1. + self.com)
+        self.weighted = _NAN
+        self.old_wt = 1.
+        self.n = 0
+
+    @classmethod
+    def span(cls, span: int) -> "Ewm":
+        return cls((span - 1) / 2.0)
+
+    @classmethod
+    def alpha_(cls, alpha: float) -> "Ewm":
+        return cls((1.0 - alpha) / alpha)
+
+    @property
+    def value(self) -> float:
+        return self.weighted
+
+    def update(self, x: float) -> float:
+        x = float(x)
+        if self.n == 0:
+            self.weighted, self.old_wt = x, 1.
+        elif self.weighted == self.weighted:
+            self.old_wt *= 1. - self.alpha
+            if x == x:
+                if self.weighted != x:
+                    self.weighted = (self.old_wt * self.weighted + self.alpha * x) / (self.old_wt + self.alpha)
+                self.old_wt = 1.
+        elif x == x:
+            self.weighted = x
+        self.n += 1
+        return self.weighted
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "com": self.com, "weighted": self.weighted, "old_wt": self.old_wt, "n": self.n}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Ewm":
+        obj = cls(d["com"])
+        obj.weighted, obj.old_wt, obj.n = float(d["weighted"]), float(d["old_wt"]), int(d["n"])
+        return obj
+
+class RollingMean:
+    """rolling(window).mean(): сумма Кэхэна с раздельной компенсацией добавления/удаления, как в pandas."""
+    kind = "rolling_mean"
+
+    def __init__(self, window: int):
+        self.window = int(window)
+        self.buf: deque[float] = deque()
+        self.nobs = self.neg = self.same = 0
+        self.sum_x = self.comp_add = self.comp_rm = 0.0
+        self.prev = _NAN
+        self.value: float | None = None
+
+    def update(self, x: float) -> float:
+        x = float(x)
+        if self.value is None:      # pandas начинает prev_value с первого значения ряда
+            self.prev = x
+        if len(self.buf) == self.window:
+            v = self.buf.popleft()
+            if v == v:
+                self.nobs -= 1
+                y = -v - self.comp_rm
+                t = self.sum_x + y
+                self.comp_rm = t - self.sum_x - y
+                self.sum_x = t
+                if math.copysign(1.0, v) < 0:
+                    self.neg -= 1
+        self.buf.append(x)
+        if x == x:
+            self.nobs += 1
+            y = x - self.comp_add
+            t = self.sum_x + y
+            self.comp_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, x) < 0:
+                self.neg += 1
+            self.same = self.same + 1 if x == self.prev else 1
+            self.prev = x
+        if self.nobs >= self.window and self.nobs > 0:
+            res = self.sum_x / self.nobs
+            if self.same >= self.nobs:
+                res = self.prev
+            elif self.neg == 0 and res < 0:
+                res = 0.0
+            elif self.neg == self.nobs and res > 0:
+                res = 0.0
+            self.value = res
+        else:
+            self.value = _NAN
+        return self.value
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "window": self.window, "buf": list(self.buf), "nobs": self.nobs,
+                "neg": self.neg, "same": self.same, "sum_x": self.sum_x, "comp_add": self.comp_add,
+                "comp_rm": self.comp_rm, "prev": self.prev, "value": self.value}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "RollingMean":
+        obj = cls(d["window"])
+        obj.buf = deque(float(v) for v in d["buf"])
+        obj.nobs, obj.neg, obj.same = int(d["nobs"]), int(d["neg"]), int(d["same"])
+        obj.sum_x, obj.comp_add, obj.comp_rm = float(d["sum_x"]), float(d["comp_add"]), float(d["comp_rm"])
+        obj.prev = float(d["prev"])
+        obj.value = None if d["value"] is None else float(d["value"])
+        return obj
+
+class RSI:
+    """_rsi(close, period): Уайлдер через ewm(alpha=1/period), пустые значения -> 50."""
+    kind = "rsi"
+
+    def __init__(self, period: int = 14):
+        self.period = int(period)
+        self.up, self.dn = Ewm.alpha_(1/self.period), Ewm.alpha_(1/self.period)
+        self.prev_close = _NAN
+        self.value = 50.0
+
+    def update(self, close: float) -> float:
+        close = float(close)
+        d = close - self.prev_close
+        self.prev_close = close
+        up = 0.0 if d < 0 else d
+        dn = 0.0 if -d < 0 else -d
+        r_up, r_dn = self.up.update(up), self.dn.update(dn)
+        rs = r_up / r_dn if (r_dn == r_dn and r_dn != 0) else _NAN
+        rsi = 100 - 100/(1+rs)
+        self.value = 50.0 if _isnan(rsi) else rsi
+        return self.value
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "period": self.period, "up": self.up.to_dict(), "dn": self.dn.to_dict(),
+                "prev_close": self.prev_close, "value": self.value}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "RSI":
+        obj = cls(d["period"])
+        obj.up, obj.dn = Ewm.from_dict(d["up"]), Ewm.from_dict(d["dn"])
+        obj.prev_close, obj.value = float(d["prev_close"]), float(d["value"])
+        return obj
+
+class ATR:
+    """
+    _atr(df, period) при длинной истории (>= 2*period баров): rolling(period).mean() от TR,
+    пока окно не заполнено — ewm(span=period). На коротких рядах _atr сужает окно до len//2,
+    потоковая версия держит фиксированное окно.
+    """
+    kind = "atr"
+
+    def __init__(self, period: int = 14):
+        self.period = int(period)
+        self.roll = RollingMean(self.period)
+        self.ewm = Ewm.span(self.period)
+        self.prev_close = _NAN
+        self.value = _NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        h, l, pc = float(high), float(low), self.prev_close
+        self.prev_close = float(close)
+        # np.maximum пропускает NaN дальше — первый TR пустой, как в pandas
+        a, b, c = h - l, abs(h - pc), abs(l - pc)
+        tr = _NAN if (_isnan(a) or _isnan(b) or _isnan(c)) else max(a, b, c)
+        r, e = self.roll.update(tr), self.ewm.update(tr)
+        self.value = e if _isnan(r) else r
+        return self.value
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "period": self.period, "roll": self.roll.to_dict(),
+                "ewm": self.ewm.to_dict(), "prev_close": self.prev_close, "value": self.value}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "ATR":
+        obj = cls(d["period"])
+        obj.roll, obj.ewm = RollingMean.from_dict(d["roll"]), Ewm.from_dict(d["ewm"])
+        obj.prev_close, obj.value = float(d["prev_close"]), float(d["value"])
+        return obj
+
+class MACDHist:
+    """_macd_hist: (EMA fast − EMA slow) − EMA signal от их разности."""
+    kind = "macd_hist"
+
+    def __init__(self, fast: int = 12, slow: int = 26, sig: int = 9):
+        self.params = (int(fast), int(slow), int(sig))
+        self.fast, self.slow, self.sig = Ewm.span(fast), Ewm.span(slow), Ewm.span(sig)
+        self.value = _NAN
+
+    def update(self, close: float) -> float:
+        macd = self.fast.update(close) - self.slow.update(close)
+        self.value = macd - self.sig.update(macd)
+        return self.value
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "params": list(self.params), "fast": self.fast.to_dict(),
+                "slow": self.slow.to_dict(), "sig": self.sig.to_dict(), "value": self.value}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "MACDHist":
+        obj = cls(*d["params"])
+        obj.fast, obj.slow, obj.sig = (Ewm.from_dict(d[k]) for k in ("fast","slow","sig"))
+        obj.value = float(d["value"])
+        return obj
+
+class IndicatorState:
+    """
+    Всё, что compute_signal берёт с последнего бара, кроме пивотов: EMA 20/50/200, RSI14, ATR14,
+    гистограмма MACD и длина её серии одного знака, ключевая отметка/зоны по предыдущему бару.
+    """
+    kind = "indicator_state"
+
+    def __init__(self):
+        self.ema_fast, self.ema_mid, self.ema_slow = Ewm.span(20), Ewm.span(50), Ewm.span(200)
+        self.rsi, self.atr, self.macd = RSI(14), ATR(14), MACDHist()
+        self.mid_hist: deque[float] = deque(maxlen=5)  # EMA_mid за последние 5 баров (для iloc[-5])
+        self.hist_seq = 0
+        self.prev_bar: tuple[float, float, float] | None = None
+        self.last_bar: tuple[float, float, float] | None = None
+        self.n = 0
+
+    def update(self, bar) -> dict:
+        """bar — dict/Series с High, Low, Close (Open/Volume не нужны)."""
+        h, l, c = float(bar["High"]), float(bar["Low"]), float(bar["Close"])
+        self.mid_hist.append(self.ema_mid.update(c))
+        self.ema_fast.update(c); self.ema_slow.update(c)
+        self.rsi.update(c); self.atr.update(h, l, c)
+        hval = self.macd.update(c)
+        if not _isnan(hval):   # NaN серию не обрывает (как dropna() в compute_signal)
+            sign = 0 if hval == 0 else (1 if hval > 0 else -1)
+            self.hist_seq = sign * (abs(self.hist_seq) + 1) if sign and self.hist_seq * sign > 0 else sign
+        self.prev_bar, self.last_bar = self.last_bar, (h, l, c)
+        self.n += 1
+        return self.snapshot()
+
+    def update_many(self, df) -> dict:
+        for h, l, c in zip(df["High"].to_numpy(), df["Low"].to_numpy(), df["Close"].to_numpy()):
+            self.update({"High": h, "Low": l, "Close": c})
+        return self.snapshot()
+
+    def snapshot(self) -> dict:
+        km = uz = lz = _NAN
+        if self.prev_bar is not None:
+            h1, l1, c1 = self.prev_bar
+            km = (h1 + l1 + c1)/3.0
+            uz, lz = 2*km - l1, 2*km - h1
+        return {
+            "Close": self.last_bar[2] if self.last_bar else _NAN,
+            "EMA_fast": self.ema_fast.value, "EMA_mid": self.ema_mid.value, "EMA_slow": self.ema_slow.value,
+            "EMA_mid_lag": self.mid_hist[0] if len(self.mid_hist) == 5 else _NAN,
+            "RSI14": self.rsi.value, "ATR14": self.atr.value, "MACD_H": self.macd.value,
+            "hist_seq": self.hist_seq, "key_mark": km, "upper_zone": uz, "lower_zone": lz,
+        }
+
+    def copy(self) -> "IndicatorState":
+        """Независимая копия (в разы дешевле to_dict/from_dict) — например, чтобы откатить последний бар."""
+        return _clone(self)
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "ema_fast": self.ema_fast.to_dict(), "ema_mid": self.ema_mid.to_dict(),
+                "ema_slow": self.ema_slow.to_dict(), "rsi": self.rsi.to_dict(), "atr": self.atr.to_dict(),
+                "macd": self.macd.to_dict(), "mid_hist": list(self.mid_hist), "hist_seq": self.hist_seq,
+                "prev_bar": self.prev_bar, "last_bar": self.last_bar, "n": self.n}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "IndicatorState":
+        obj = cls()
+        obj.ema_fast, obj.ema_mid, obj.ema_slow = (Ewm.from_dict(d[k]) for k in ("ema_fast","ema_mid","ema_slow"))
+        obj.rsi, obj.atr, obj.macd = RSI.from_dict(d["rsi"]), ATR.from_dict(d["atr"]), MACDHist.from_dict(d["macd"])
+        obj.mid_hist = deque((float(v) for v in d["mid_hist"]), maxlen=5)
+        obj.hist_seq, obj.n = int(d["hist_seq"]), int(d["n"])
+        obj.prev_bar = tuple(d["prev_bar"]) if d["prev_bar"] else None
+        obj.last_bar = tuple(d["last_bar"]) if d["last_bar"] else None
+        return obj
@@ -0,0 +1,203 @@
+# core/kernels.py — ядра для массового расчёта: серии знака MACD и правила сигнала
+# Два взаимозаменяемых бэкенда: "numpy" (векторно, всегда доступен) и "numba" (JIT-циклы,
+# если установлен numba). Выбор — set_backend() / переменная SIGNAL_KERNELS, по умолчанию auto.
+from __future__ import annotations
+import importlib.util, os
+import numpy as np
+
+# numba — необязательная зависимость; сам модуль грузится при первом вызове numba-ядра
+_HAS_NUMBA = importlib.util.find_spec("numba") is not None
+
+def _nb():
+    from core import kernels_numba
+    return kernels_numba
+
+BACKENDS = ("numpy", "numba")
+_backend = os.getenv("SIGNAL_KERNELS", "auto")
+
+def available_backends() -> tuple[str, ...]:
+    return BACKENDS if _HAS_NUMBA else ("numpy",)
+
+def set_backend(name: str) -> None:
+    """"numpy" | "numba" | "auto" (numba, если установлен)."""
+    global _backend
+    if name not in (*BACKENDS, "auto"):
+        raise ValueError(f"unknown kernel backend: {name}")
+    if name == "numba" and not _HAS_NUMBA:
+        raise RuntimeError("numba is not installed")
+    _backend = name
+
+def get_backend(name: str | None = None) -> str:
+    name = name or _backend
+    if name == "auto":
+        return "numba" if _HAS_NUMBA else "numpy"
+    if name == "numba" and not _HAS_NUMBA:
+        return "numpy"
+    return name
+
+# ---------- серии одного знака ----------
+def _ffill_sign(h: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(знак с переносом через NaN вдоль оси 0, маска не-NaN); NaN в начале — знак 0."""
+    valid = ~np.isnan(h)
+    n = h.shape[0]
+    idx = np.arange(n).reshape((n,) + (1,) * (h.ndim - 1))
+    last = np.maximum.accumulate(np.where(valid, idx, -1), axis=0)
+    s = np.sign(np.where(valid, h, 0.0)).astype(np.int64)
+    f = np.where(last >= 0, np.take_along_axis(s, np.maximum(last, 0), axis=0), 0)
+    return f, valid
+
+def _sign_runs_np(h: np.ndarray) -> np.ndarray:
+    n = h.shape[0]
+    if n == 0:
+        return np.zeros(h.shape, dtype=np.int64)
+    f, valid = _ffill_sign(h)
+    cnt = np.cumsum(valid, axis=0)
+    brk = np.ones(f.shape, dtype=bool)
+    brk[1:] = f[1:] != f[:-1]   # знак меняется только на не-NaN барах
+    idx = np.arange(n).reshape((n,) + (1,) * (h.ndim - 1))
+    start = np.maximum.accumulate(np.where(brk, idx, 0), axis=0)
+    before = np.take_along_axis(cnt - valid, start, axis=0)   # не-NaN баров до начала серии
+    return f * (cnt - before)
+
+def _last_sign_run_np(h: np.ndarray) -> np.ndarray:
+    f, valid = _ffill_sign(h)
+    last = f[-1]
+    rv, rs = valid[::-1], np.sign(np.where(valid, h, 0.0))[::-1]
+    other = np.cumsum(rv & (rs != last), axis=0) > 0   # от конца до первого бара другого знака
+    run = (rv & (rs == last) & ~other).sum(axis=0)
+    return (last * run).astype(np.int64)
+
+def sign_runs(h: np.ndarray, backend: str | None = None) -> np.ndarray:
+    """
+    Длина текущей серии одного знака на каждом баре (со знаком) вдоль оси 0. Ноль обрывает серию,
+    NaN пропускается (не обрывает и не считается), как dropna() в compute_signal; на NaN-баре —
+    значение предыдущего бара. Для 2-D — по столбцам.
+    """
+    h = np.asarray(h, dtype=np.float64)
+    if get_backend(backend) == "numba" and h.ndim in (1, 2):
+        out = _nb().sign_runs(np.ascontiguousarray(h.reshape(h.shape[0], -1)))
+        return out.reshape(h.shape)
+    return _sign_runs_np(h)
+
+def last_sign_run(h: np.ndarray, backend: str | None = None):
+    """Серия одного знака, заканчивающаяся последним баром: int для 1-D, массив по столбцам для 2-D."""
+    h = np.asarray(h, dtype=np.float64)
+    if h.shape[0] == 0:
+        return 0 if h.ndim == 1 else np.zeros(h.shape[1:], dtype=np.int64)
+    if get_backend(backend) == "numba" and h.ndim in (1, 2):
+        out = _nb().last_sign_run(np.ascontiguousarray(h.reshape(h.shape[0], -1)))
+    else:
+        out = _last_sign_run_np(h.reshape(h.shape[0], -1))
+    return int(out[0]) if h.ndim == 1 else out.reshape(h.shape[1:])
+
+# ---------- правила compute_signal ----------
+def _evaluate_rules_np(px, atr, km, ema_f, ema_m, ema_s, ema_m_lag, hist_run, rsi, piv, prof: dict) -> dict:
+    P, R1, R2, R3, S1, S2, S3 = piv
+    need, tw = prof["need_hist"], prof["trend_weight"]
+    k_tp1, k_tp2, k_sl = prof["k_tp1"], prof["k_tp2"], prof["k_sl"]
+    rsi_lo, rsi_hi = prof.get("rsi_lo", 32), prof.get("rsi_hi", 68)
+
+    atr = np.where(np.isnan(atr), 0.0, atr)
+    km = np.where(np.isnan(km), px, km)
+    rsi = np.where(np.isnan(rsi), 50.0, rsi)
+    trend_pos = (ema_f > ema_m) & (ema_m > ema_s) & (ema_m > ema_m_lag)
+    trend_neg = (ema_f < ema_m) & (ema_m < ema_s) & (ema_m < ema_m_lag)
+    pos = px - km
+    buy = trend_pos & (hist_run >= need) & (pos >= 0) & (rsi <= rsi_hi) & (atr > 0)
+    short = trend_neg & (hist_run <= -need) & (pos <= 0) & (rsi >= rsi_lo) & (atr > 0) & ~buy
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        def conf(sign, trend):
+            base = np.where(atr <= 0, 0.5, 0.5 + sign * (pos / (2.8*atr)))
+            base = np.clip(base, 0.0, 1.0)
+            return np.clip(0.5*base + 0.5*np.where(trend, tw, 0.0), 0.0, 1.0)
+        conf_wait = np.clip(0.5 + np.where(atr > 0, pos / (4.0*atr), 0.0), 0.0, 1.0)
+    px_ = px[..., None]
+
+    # BUY: ближайшие R выше цены (в порядке R1, R2, R3), стоп — самый дальний S ниже цены
+    ups = np.stack([R1, R2, R3], axis=-1)
+    m = ups > px_
+    cm = np.cumsum(m, axis=-1)
+    has_t, has_t2 = m.any(axis=-1), cm[..., -1] >= 2
+    t0 = np.where(m & (cm == 1), ups, 0.0).sum(axis=-1)
+    t1 = np.where(m & (cm == 2), ups, 0.0).sum(axis=-1)
+    b_tp1 = np.where(has_t, np.maximum(t0, px + 0.2*atr), px + k_tp1*atr)
+    b_tp2 = np.where(has_t, np.maximum(np.where(has_t2, t1, t0 + 0.6*atr), b_tp1 + 0.2*atr), px + k_tp2*atr)
+    dns = np.stack([S1, S2, S3], axis=-1)
+    below = dns < px_
+    b_sl = np.where(below.any(axis=-1), np.where(below, dns, np.inf).min(axis=-1), px - k_sl*atr)
+    b_tp1 = np.maximum(b_tp1, px); b_tp2 = np.maximum(b_tp2, b_tp1)
+    b_sl = np.minimum(b_sl, px - 0.01)
+
+    # SHORT: ближайшие S ниже цены (по убыванию), стоп — самый дальний R выше цены
+    dsort = -np.sort(-dns, axis=-1)
+    m = dsort < px_
+    cm = np.cumsum(m, axis=-1)
+    has_t, has_t2 = m.any(axis=-1), cm[..., -1] >= 2
+    t0 = np.where(m & (cm == 1), dsort, 0.0).sum(axis=-1)
+    t1 = np.where(m & (cm == 2), dsort, 0.0).sum(axis=-1)
+    s_tp1 = np.where(has_t, np.minimum(t0, px - 0.2*atr), px - k_tp1*atr)
+    s_tp2 = np.where(has_t, np.minimum(np.where(has_t2, t1, t0 - 0.6*atr), s_tp1 - 0.2*atr), px - k_tp2*atr)
+    above = ups > px_
+    s_sl = np.where(above.any(axis=-1), np.where(above, ups, -np.inf).max(axis=-1), px + k_sl*atr)
+    s_tp1 = np.minimum(s_tp1, px); s_tp2 = np.minimum(s_tp2, s_tp1)
+    s_sl = np.maximum(s_sl, px + 0.01)
+
+    action = np.where(buy, 1, np.where(short, -1, 0)).astype(np.int8)
+    return {
+        "action": action,
+        "confidence": np.where(buy, conf(+1, trend_pos), np.where(short, conf(-1, trend_neg), conf_wait)),
+        "entry": px,
+        "tp1": np.where(buy, b_tp1, np.where(short, s_tp1, px + 0.6*atr)),
+        "tp2": np.where(buy, b_tp2, np.where(short, s_tp2, px + 1.2*atr)),
+        "sl":  np.where(buy, b_sl,  np.where(short, s_sl,  px - 0.9*atr)),
+    }
+
+def evaluate_rules(px, atr, km, ema_f, ema_m, ema_s, ema_m_lag, hist_run, rsi, piv, prof: dict,
+                   backend: str | None = None) -> dict:
+    """
+    Правила compute_signal в виде операций над массивами любой формы
+    (тикеры на последнем баре или все бары ряда). piv = (P, R1, R2, R3, S1, S2, S3).
+    Возвращает action (-1/0/1), confidence, entry, tp1, tp2, sl — без округления.
+    """
+    if get_backend(backend) != "numba":
+        return _evaluate_rules_np(px, atr, km, ema_f, ema_m, ema_s, ema_m_lag, hist_run, rsi, piv, prof)
+    arrs = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64)
+                                 for x in (px, atr, km, ema_f, ema_m, ema_s, ema_m_lag, hist_run, rsi, *piv)))
+    shape = arrs[0].shape
+    flat = [np.ascontiguousarray(a).ravel() for a in arrs]
+    action, conf, tp1, tp2, sl = _nb().rules(*flat, float(prof["need_hist"]), float(prof["trend_weight"]),
+                                             float(prof["k_tp1"]), float(prof["k_tp2"]), float(prof["k_sl"]),
+                                             float(prof.get("rsi_lo", 32)), float(prof.get("rsi_hi", 68)))
+    return {"action": action.reshape(shape), "confidence": conf.reshape(shape), "entry": arrs[0].copy(),
+            "tp1": tp1.reshape(shape), "tp2": tp2.reshape(shape), "sl": sl.reshape(shape)}
+
+def cross_check(n: int = 20_000, seed: int = 0) -> dict:
+    """Сверка бэкендов на случайных данных: число расхождений по каждому выходу."""
+    rng = np.random.default_rng(seed)
+    h = rng.normal(size=(n // 50, 50)); h[rng.random(h.shape) < 0.05] = 0.0
+    h[rng.random(h.shape) < 0.05] = np.nan; h[:3, :5] = np.nan
+    px = 100 + rng.normal(0, 5, n)
+    lv = np.sort(px[:, None] + rng.normal(0, 4, (n, 7)), axis=1)
+    piv = (lv[:, 3], lv[:, 4], lv[:, 5], lv[:, 6], lv[:, 2], lv[:, 1], lv[:, 0])
+    ema = np.sort(px[:, None] + rng.normal(0, 2, (n, 3)), axis=1)
+    flip = rng.random(n) < 0.5
+    ef = np.where(flip, ema[:, 2], ema[:, 0]); es = np.where(flip, ema[:, 0], ema[:, 2])
+    args = (px, np.abs(rng.normal(1, 0.5, n)), px + rng.normal(0, 1, n), ef, ema[:, 1], es,
+            ema[:, 1] + rng.normal(0, 0.5, n), rng.integers(-6, 7, n), rng.uniform(10, 90, n), piv)
+    out = {"sign_runs": int((sign_runs(h, "numpy") != sign_runs(h, "numba")).sum()),
+           "last_sign_run": int((last_sign_run(h, "numpy") != last_sign_run(h, "numba")).sum())}
+    for prof in ({"need_hist": 2, "trend_weight": 0.6, "k_tp1": 0.6, "k_tp2": 1.2, "k_sl": 0.9},
+                 {"need_hist": 3, "trend_weight": 0.7, "k_tp1": 1.0, "k_tp2": 2.2, "k_sl": 1.4,
+                  "rsi_lo": 40, "rsi_hi": 60}):
+        a, b = evaluate_rules(*args, prof, backend="numpy"), evaluate_rules(*args, prof, backend="numba")
+        for k in a:
+            out[k] = out.get(k, 0) + int((a[k] != b[k]).sum())
+    return out
+
+if __name__ == "__main__":
+    if not _HAS_NUMBA:
+        raise SystemExit("numba is not installed — only the numpy backend is available")
+    diff = cross_check()
+    print(diff)
+    raise SystemExit(1 if any(diff.values()) else 0)
@@ -0,0 +1,137 @@
+# core/kernels_numba.py — JIT-версии ядер core/kernels (бэкенд "numba")
+# Отдельный модуль, чтобы импорт numba (~0.3 с) платили только те, кто этот бэкенд использует.
+from __future__ import annotations
+import numpy as np
+from numba import njit
+
+@njit(cache=True)
+def sign_runs(h):
+    n, m = h.shape
+    out = np.empty((n, m), dtype=np.int64)
+    for j in range(m):
+        prev, run = 0, 0
+        for i in range(n):
+            x = h[i, j]
+            if x == x:   # NaN пропускаем: серия и знак — как на предыдущем баре
+                s = 0 if x == 0 else (1 if x > 0 else -1)
+                if s == 0:
+                    run = 0
+                elif s == prev:
+                    run += 1
+                else:
+                    run = 1
+                prev = s
+            out[i, j] = prev * run
+    return out
+
+@njit(cache=True)
+def last_sign_run(h):
+    n, m = h.shape
+    out = np.zeros(m, dtype=np.int64)
+    for j in range(m):
+        s, run = 0, 0
+        for i in range(n-1, -1, -1):  # с конца до первого бара другого знака, NaN пропускаем
+            y = h[i, j]
+            if y != y:
+                continue
+            t = 0 if y == 0 else (1 if y > 0 else -1)
+            if s == 0 and run == 0:
+                if t == 0:
+                    break
+                s = t
+            if t != s:
+                break
+            run += 1
+        out[j] = s * run
+    return out
+
+@njit(cache=True)
+def _clip01(x):
+    if x != x:
+        return x
+    return 0.0 if x < 0.0 else (1.0 if x > 1.0 else x)
+
+@njit(cache=True)
+def _mx(a, b):  # как np.maximum: NaN распространяется
+    if a != a or b != b:
+        return np.nan
+    return a if a >= b else b
+
+@njit(cache=True)
+def _mn(a, b):
+    if a != a or b != b:
+        return np.nan
+    return a if a <= b else b
+
+@njit(cache=True)
+def rules(px, atr, km, ef, em, es, eml, hr, rsi, P, R1, R2, R3, S1, S2, S3,
+              need, tw, k_tp1, k_tp2, k_sl, rsi_lo, rsi_hi):
+    n = px.size
+    action = np.zeros(n, dtype=np.int8)
+    conf, tp1, tp2, sl = np.empty(n), np.empty(n), np.empty(n), np.empty(n)
+    ups, dns = np.empty(3), np.empty(3)
+    for i in range(n):
+        p = px[i]
+        a = atr[i] if atr[i] == atr[i] else 0.0
+        k = km[i] if km[i] == km[i] else p
+        r = rsi[i] if rsi[i] == rsi[i] else 50.0
+        tpos = (ef[i] > em[i]) and (em[i] > es[i]) and (em[i] > eml[i])
+        tneg = (ef[i] < em[i]) and (em[i] < es[i]) and (em[i] < eml[i])
+        pos = p - k
+        buy = tpos and (hr[i] >= need) and (pos >= 0) and (r <= rsi_hi) and (a > 0)
+        short = (not buy) and tneg and (hr[i] <= -need) and (pos <= 0) and (r >= rsi_lo) and (a > 0)
+        ups[0], ups[1], ups[2] = R1[i], R2[i], R3[i]
+        dns[0], dns[1], dns[2] = S1[i], S2[i], S3[i]
+        if buy:
+            action[i] = 1
+            base = 0.5 if a <= 0 else _clip01(0.5 + 1 * (pos / (2.8*a)))
+            conf[i] = _clip01(0.5*base + 0.5*tw)
+            cnt, t0, t1 = 0, 0.0, 0.0
+            for q in range(3):          # первые две R выше цены в порядке R1, R2, R3
+                if ups[q] > p:
+                    cnt += 1
+                    if cnt == 1: t0 = ups[q]
+                    elif cnt == 2: t1 = ups[q]
+            if cnt > 0:
+                b1 = _mx(t0, p + 0.2*a)
+                b2 = _mx(t1 if cnt >= 2 else t0 + 0.6*a, b1 + 0.2*a)
+            else:
+                b1, b2 = p + k_tp1*a, p + k_tp2*a
+            bs, found = np.inf, False
+            for q in range(3):
+                if dns[q] < p:
+                    found = True
+                    if dns[q] < bs: bs = dns[q]
+            if not found:
+                bs = p - k_sl*a
+            b1 = _mx(b1, p)
+            tp1[i], tp2[i], sl[i] = b1, _mx(b2, b1), _mn(bs, p - 0.01)
+        elif short:
+            action[i] = -1
+            base = 0.5 if a <= 0 else _clip01(0.5 + -1 * (pos / (2.8*a)))
+            conf[i] = _clip01(0.5*base + 0.5*tw)
+            srt = -np.sort(-dns)        # S по убыванию: ближайшие снизу — первыми
+            cnt, t0, t1 = 0, 0.0, 0.0
+            for q in range(3):
+                if srt[q] < p:
+                    cnt += 1
+                    if cnt == 1: t0 = srt[q]
+                    elif cnt == 2: t1 = srt[q]
+            if cnt > 0:
+                s1 = _mn(t0, p - 0.2*a)
+                s2 = _mn(t1 if cnt >= 2 else t0 - 0.6*a, s1 - 0.2*a)
+            else:
+                s1, s2 = p - k_tp1*a, p - k_tp2*a
+            ss, found = -np.inf, False
+            for q in range(3):
+                if ups[q] > p:
+                    found = True
+                    if ups[q] > ss: ss = ups[q]
+            if not found:
+                ss = p + k_sl*a
+            s1 = _mn(s1, p)
+            tp1[i], tp2[i], sl[i] = s1, _mn(s2, s1), _mx(ss, p + 0.01)
+        else:
+            conf[i] = _clip01(0.5 + (pos / (4.0*a) if a > 0 else 0.0))
+            tp1[i], tp2[i], sl[i] = p + 0.6*a, p + 1.2*a, p - 0.9*a
+    return action, conf, tp1, tp2, sl
@@ -0,0 +1,227 @@
+# core/levels.py — индекс уровней всех тикеров: кто сейчас в пределах X ATR от своего уровня
+# По тикеру — отсортированный список уровней (bisect: ближайший уровень за O(log k)), по вселенной —
+# корзины по расстоянию до ближайшего уровня в ATR (шаг STEP): запрос «все в пределах X ATR» обходит
+# только корзины до X, без скана всей вселенной. Тик переносит тикер между корзинами за O(1)
+# (отсортированный список на каждом тике сдвигал бы память — на 100 000 тикеров это десятки мкс).
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+import math, threading
+import numpy as np, pandas as pd
+
+from core.batch import compute_signals_batch, panel_arrays, _atr2
+from core.bars import Bars
+
+LEVEL_KEYS = ("entry","tp1","tp2","sl","key_mark","upper_zone","lower_zone",
+              "pivot_P","R1","R2","R3","S1","S2","S3")
+STEP, FAR = 0.05, 10.0   # ширина корзины и граница последней (дальше — одна общая корзина), в ATR
+
+@dataclass
+class LevelHit:
+    symbol: str
+    level: str
+    value: float
+    price: float
+    distance_atr: float   # (цена - уровень) / ATR: > 0 — цена выше уровня
+
+@dataclass
+class LevelEvent:
+    kind: str             # enter — цена вошла в полосу уровня, exit — вышла
+    hit: LevelHit
+
+def last_atr(frames: dict[str, pd.DataFrame | Bars], period: int = 14) -> dict[str, float]:
+    """ATR последнего бара по многим тикерам одним проходом по матрицам (как в compute_signal)."""
+    arr = panel_arrays(frames, with_dates=False)
+    if not arr["symbols"]:
+        return {}
+    atr = _atr2(arr["High"], arr["Low"], arr["Close"], arr["lengths"], period)[-1]
+    return dict(zip(arr["symbols"], atr.tolist()))
+
+class _Book:
+    """Уровни одного тикера: значения по возрастанию и имена в том же порядке."""
+    __slots__ = ("values", "names", "atr", "price", "near", "hot")
+
+    def __init__(self, levels: dict[str, float], atr: float, price: float):
+        pairs = sorted((float(v), k) for k, v in levels.items() if v is not None and not math.isnan(v))
+        self.values = [v for v, _ in pairs]
+        self.names = [k for _, k in pairs]
+        self.atr = float(atr) if atr and atr > 0 and not math.isnan(atr) else math.nan
+        self.price = float(price)
+        self.near = math.inf
+        self.hot = range(0)   # индексы уровней в полосе на последней цене
+
+    def nearest(self) -> float:
+        """Расстояние до ближайшего уровня в ATR (inf — нет уровней или ATR)."""
+        v, p = self.values, self.price
+        if not v or self.atr != self.atr:
+            return math.inf
+        i = bisect_left(v, p)
+        d = min(abs(v[i] - p) if i < len(v) else math.inf, abs(p - v[i-1]) if i else math.inf)
+        return d / self.atr
+
+    def within(self, band: float) -> range:
+        """Индексы уровней в пределах band ATR от цены (подряд идущие в отсортированном списке)."""
+        if self.atr != self.atr:
+            return range(0)
+        w = band * self.atr
+        return range(bisect_left(self.values, self.price - w), bisect_right(self.values, self.price + w))
+
+class LevelIndex:
+    """
+    Уровни Signal по всей вселенной. update() — после пересчёта сигнала (уровни + ATR),
+    tick() — новая цена; оба возвращают события входа/выхода из полосы band (в ATR).
+    near(x) — все (тикер, уровень) в пределах x ATR от последней цены: O(x / STEP + ответ).
+    """
+    def __init__(self, band: float = 0.25, keys: tuple[str, ...] = LEVEL_KEYS):
+        self.band = float(band)
+        self.keys = keys
+        self._books: dict[str, _Book] = {}
+        self._buckets: list[set[str]] = [set() for _ in range(int(FAR / STEP) + 1)]
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._books)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol.upper() in self._books
+
+    # ---------- обновления ----------
+    def update(self, symbol: str, sig: dict, atr: float, price: float | None = None) -> list[LevelEvent]:
+        """Новые уровни тикера; цена — переданная, иначе последняя известная, иначе entry сигнала."""
+        symbol = symbol.upper()
+        with self._lock:
+            old = self._books.get(symbol)
+            if price is None:
+                price = old.price if old is not None else float(sig["entry"])
+            book = _Book({k: sig.get(k) for k in self.keys}, atr, price)
+            prev = {old.names[i]: old.values[i] for i in old.hot} if old is not None else {}
+            self._books[symbol] = book
+            self._move(symbol, old.near if old is not None else None, book)
+            # по имени: уровень с тем же именем и значением, уже бывший в полосе, — не новое событие
+            return self._diff(symbol, book, prev)
+
+    def update_many(self, signals: dict[str, dict], atrs: dict[str, float],
+                    prices: dict[str, float] | None = None) -> list[LevelEvent]:
+        prices = prices or {}
+        out = []
+        with self._lock:
+            for s, sig in signals.items():
+                out += self.update(s, sig, atrs.get(s, math.nan), prices.get(s))
+        return out
+
+    def tick(self, symbol: str, price: float) -> list[LevelEvent]:
+        """Новая цена тикера: O(log k) на поиск уровней + перенос тикера между корзинами за O(1)."""
+        symbol = symbol.upper()
+        with self._lock:
+            book = self._books.get(symbol)
+            if book is None:
+                return []
+            old_near, old_hot = book.near, book.hot
+            book.price = float(price)
+            self._move(symbol, old_near, book)
+            book.hot = hot = book.within(self.band)
+            if hot == old_hot:   # самый частый случай: набор уровней в полосе не изменился
+                return []
+            # уровни те же — сравниваем по индексам; выходы раньше входов, как в _diff
+            return ([LevelEvent("exit", self._hit(symbol, book, i)) for i in old_hot if i not in hot] +
+                    [LevelEvent("enter", self._hit(symbol, book, i)) for i in hot if i not in old_hot])
+
+    def tick_many(self, prices: dict[str, float]) -> list[LevelEvent]:
+        out = []
+        with self._lock:
+            for s, p in prices.items():
+                out += self.tick(s, p)
+        return out
+
+    def remove(self, symbol: str) -> None:
+        symbol = symbol.upper()
+        with self._lock:
+            book = self._books.pop(symbol, None)
+            if book is not None:
+                self._buckets[self._bucket(book.near)].discard(symbol)
+
+    def _bucket(self, near: float) -> int:
+        return int(near / STEP) if near < FAR else len(self._buckets) - 1
+
+    def _move(self, symbol: str, old_near: float | None, book: _Book) -> None:
+        book.near = book.nearest()
+        b = self._bucket(book.near)
+        if old_near is not None:
+            ob = self._bucket(old_near)
+            if ob == b:
+                return
+            self._buckets[ob].discard(symbol)
+        self._buckets[b].add(symbol)
+
+    def _candidates(self, band: float) -> list[tuple[float, str]]:
+        """(near, тикер) с near <= band по возрастанию: целые корзины + отбор в последней."""
+        out = []
+        for i in range(min(self._bucket(band), len(self._buckets) - 1) + 1):
+            out += [(self._books[s].near, s) for s in self._buckets[i]]
+        return sorted(c for c in out if c[0] <= band)
+
+    def _diff(self, symbol: str, book: _Book, prev: dict[str, float]) -> list[LevelEvent]:
+        """
+        События после замены уровней: сравнение по имени и значению (индексы сдвинулись).
+        Сначала выходы, потом входы: сдвинутый уровень с тем же именем — exit старого значения, затем
+        enter нового, и потребитель, хранящий состояние по (тикер, уровень), остаётся с новым.
+        """
+        book.hot = hot = book.within(self.band)
+        now = {book.names[i]: (book.values[i], i) for i in hot}
+        out = [LevelEvent("exit", LevelHit(symbol, k, v, book.price, (book.price - v) / book.atr))
+               for k, v in prev.items() if k not in now or now[k][0] != v]
+        out += [LevelEvent("enter", self._hit(symbol, book, i)) for k, (v, i) in now.items() if prev.get(k) != v]
+        return out
+
+    @staticmethod
+    def _hit(symbol: str, book: _Book, i: int) -> LevelHit:
+        v = book.values[i]
+        return LevelHit(symbol, book.names[i], v, book.price, (book.price - v) / book.atr)
+
+    # ---------- запросы ----------
+    def near(self, band: float | None = None, symbols: list[str] | None = None) -> list[LevelHit]:
+        """
+        (тикер, уровень) в пределах band ATR (по умолчанию self.band) от последней цены,
+        по возрастанию расстояния до ближайшего уровня тикера.
+        """
+        band = self.band if band is None else float(band)
+        with self._lock:
+            if symbols is not None:
+                cands = [s.upper() for s in symbols if s.upper() in self._books]
+            else:
+                cands = [s for _, s in self._candidates(band)]
+            out = []
+            for s in cands:
+                book = self._books[s]
+                for i in book.within(band):
+                    out.append(self._hit(s, book, i))
+            return out
+
+    def nearest(self, n: int = 20) -> list[tuple[str, float]]:
+        """n тикеров, ближе всех подошедших к какому-либо своему уровню: [(тикер, расстояние в ATR)]."""
+        with self._lock:
+            out = []
+            for bucket in self._buckets:
+                out += [(self._books[s].near, s) for s in bucket]
+                if len(out) >= n:   # ближе уже не будет: корзины идут по возрастанию
+                    break
+            return [(s, d) for d, s in sorted(out)[:n]]
+
+    def levels(self, symbol: str) -> list[tuple[str, float]]:
+        book = self._books.get(symbol.upper())
+        return list(zip(book.names, book.values)) if book is not None else []
+
+    def to_frame(self, band: float | None = None) -> pd.DataFrame:
+        hits = self.near(band)
+        return pd.DataFrame([h.__dict__ for h in hits],
+                            columns=["symbol","level","value","price","distance_atr"])
+
+    @classmethod
+    def from_frames(cls, frames: dict[str, pd.DataFrame | Bars], horizon: str = "swing",
+                    band: float = 0.25) -> "LevelIndex":
+        """Индекс по загруженным кадрам: сигналы — compute_signals_batch, ATR — last_atr, цена — Close."""
+        idx = cls(band)
+        sigs = {r["symbol"]: r for r in compute_signals_batch(frames, horizon).to_dict("records")}
+        closes = {s: float(np.asarray(f.close if isinstance(f, Bars) else f["Close"])[-1]) for s, f in frames.items()}
+        idx.update_many(sigs, last_atr(frames), closes)
+        return idx
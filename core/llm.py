@@ -1,7 +1,9 @@
 
    # core/llm.py — офлайн NLG без упоминаний "Pivot", R1/R2/S1/S2
 from __future__ import annotations
-import random
+from datetime import date as _date
+import html, json, pathlib, random, zlib
+import numpy as np, pandas as pd
 
 def _verbal_conf(c: float) -> str:
     if c < 0.45: return "низкая"
@@ -21,25 +23,54 @@ def _nearest_levels(sig: dict) -> tuple[list[float], list[float]]:
     dns = sorted([float(x) for x in dn_raw if isinstance(x,(int,float)) and x and x < px], reverse=True)[:2]
     return ups, dns
 
-def _intro(symbol: str, action: str, src: str, horizon_ui: str) -> str:
-    starts = [
-        f"{symbol}: картина спокойная, без лишней суеты. Источник — {src.lower()}, горизонт — {horizon_ui.lower()}.",
-        f"{symbol}: рынок ведёт себя ровно; работаем по {src.lower()}, режим — {horizon_ui.lower()}.",
-        f"{symbol}: тон умеренный, без явных перегибов. Данные — {src.lower()}, горизонт — {horizon_ui.lower()}."
-    ]
-    if action in ("BUY","SHORT"):
-        starts += [
-            f"{symbol}: условия для сделки выглядят рабочими. Источник — {src}, горизонт — {horizon_ui.lower()}.",
-            f"{symbol}: есть сетап под {_dir_word(action)}. Берём котировки {src.lower()}, горизонт — {horizon_ui.lower()}."
-        ]
-    return random.choice(starts)
+# шаблоны собраны один раз на импорт; подстановка — format_map со словарём полей сигнала
+_INTRO_ANY = (
+    "{symbol}: картина спокойная, без лишней суеты. Источник — {src_l}, горизонт — {hz_l}.",
+    "{symbol}: рынок ведёт себя ровно; работаем по {src_l}, режим — {hz_l}.",
+    "{symbol}: тон умеренный, без явных перегибов. Данные — {src_l}, горизонт — {hz_l}.",
+)
+_INTRO_TRADE = _INTRO_ANY + (
+    "{symbol}: условия для сделки выглядят рабочими. Источник — {src}, горизонт — {hz_l}.",
+    "{symbol}: есть сетап под {dir}. Берём котировки {src_l}, горизонт — {hz_l}.",
+)
+_NUANCES = (
+    "Следим за поведением цены в узком коридоре: импульс часто появляется на выходе.",
+    "Риски контролируем через стоп и частичную фиксацию у первой цели.",
+    "Фон рынка учитываем, но решения привязываем к собственным уровням.",
+)
+_PLAN = ("План: вход {entry}, стоп {sl}, цели {tp1} / {tp2}. "
+         "Рабочий коридор {lower_zone}–{upper_zone}, опорная отметка {key_mark}.")
+HORIZON_UI = {"short": "Краткосрок", "swing": "Среднесрок", "position": "Долгосрок"}
+
+class SignalRNG:
+    """Детерминированный выбор формулировок (xorshift32): дешевле, чем random.Random на каждый сигнал."""
+    __slots__ = ("state",)
+
+    def __init__(self, seed: int):
+        self.state = (seed & 0xFFFFFFFF) or 0x9E3779B9
+
+    def choice(self, seq):
+        x = self.state
+        x ^= (x << 13) & 0xFFFFFFFF
+        x ^= x >> 17
+        x ^= (x << 5) & 0xFFFFFFFF
+        self.state = x
+        return seq[x % len(seq)]
+
+def signal_rng(symbol: str, date=None, horizon: str = "", seed: int = 0) -> SignalRNG:
+    """Генератор для одного сигнала: одинаковые тикер/дата/горизонт/seed — одинаковый текст."""
+    return SignalRNG(zlib.crc32(f"{symbol.upper()}|{date or ''}|{horizon}|{seed}".encode()))
+
+def _intro(symbol: str, action: str, src: str, horizon_ui: str, rng=random) -> str:
+    starts = _INTRO_TRADE if action in ("BUY","SHORT") else _INTRO_ANY
+    return rng.choice(starts).format(symbol=symbol, src=src, src_l=src.lower(), hz_l=horizon_ui.lower(),
+                                     dir=_dir_word(action))
 
 def _plan(sig: dict) -> str:
-    return (f"План: вход {sig['entry']}, стоп {sig['sl']}, цели {sig['tp1']} / {sig['tp2']}. "
-            f"Рабочий коридор {sig['lower_zone']}–{sig['upper_zone']}, опорная отметка {sig['key_mark']}.")
+    return _PLAN.format_map(sig)
 
-def _context_levels(sig: dict) -> str:
-    ups, dns = _nearest_levels(sig)
+def _context_levels(sig: dict, levels: tuple[list[float], list[float]] | None = None) -> str:
+    ups, dns = levels or _nearest_levels(sig)
     parts = []
     if ups:
         if len(ups) == 1:
@@ -62,32 +93,97 @@ def _next_steps(action: str) -> str:
         return "Логично зафиксировать результат и посмотреть на следующую расстановку сил."
     return "Наблюдаем за реакцией у ближайших ориентиров; уверенный пробой задаст следующее движение."
 
-def build_rationale(symbol: str, horizon_ui: str, sig: dict, detail: str = "Стандарт") -> str:
+def build_rationale(symbol: str, horizon_ui: str, sig: dict, detail: str = "Стандарт",
+                    rng: SignalRNG | random.Random | None = None, _levels=None) -> str:
     """
     Локальная генерация текста без внешних API и без раскрытия терминов методики.
     detail: 'Коротко' | 'Стандарт' | 'Подробно'
+    rng — источник случайности для выбора формулировок (signal_rng — воспроизводимо);
+    по умолчанию модуль random.
     """
+    rng = rng or random
     action = sig.get("action", "WAIT")
     source = sig.get("source", "market")
     conf_t = _verbal_conf(float(sig.get("confidence", 0.5)))
 
-    intro = _intro(symbol, action, source, horizon_ui)
+    intro = _intro(symbol, action, source, horizon_ui, rng)
     plan  = _plan(sig)
-    lvl   = _context_levels(sig)
+    lvl   = _context_levels(sig, _levels)
     tail  = _next_steps(action)
     conf  = f"Уверенность оценки — {conf_t}."
 
     if detail == "Коротко":
         parts = [f"Сценарий: {_dir_word(action)}.", conf, plan, tail]
     elif detail == "Подробно":
-        nuances = [
-            "Следим за поведением цены в узком коридоре: импульс часто появляется на выходе.",
-            "Риски контролируем через стоп и частичную фиксацию у первой цели.",
-            "Фон рынка учитываем, но решения привязываем к собственным уровням."
-        ]
-        parts = [intro, f"Сценарий: {_dir_word(action)}.", conf, plan, lvl, random.choice(nuances), tail]
+        parts = [intro, f"Сценарий: {_dir_word(action)}.", conf, plan, lvl, rng.choice(_NUANCES), tail]
     else:  # Стандарт
         parts = [intro, f"Сценарий: {_dir_word(action)}.", conf, plan, lvl, tail]
 
     text = " ".join([p for p in parts if p]).replace("  ", " ").strip()
     return text
+
+# ---------- пакетная генерация ----------
+_UP = ("R1", "R2", "R3", "upper_zone", "key_mark")
+_DN = ("S1", "S2", "S3", "lower_zone", "key_mark")
+
+def _levels_batch(rows: list[dict]) -> list[tuple[list[float], list[float]]]:
+    """_nearest_levels для всех сигналов сразу: маска и сортировка по матрице (сигналы × уровни)."""
+    col = lambda k: np.array([r.get(k) for r in rows], dtype=float)
+    px = np.array([r.get("entry", r.get("Close", 0.0)) for r in rows], dtype=float)[:, None]
+    up = np.stack([col(k) for k in _UP], axis=1)
+    dn = np.stack([col(k) for k in _DN], axis=1)
+    up[up == 0], dn[dn == 0] = np.nan, np.nan   # нулевые уровни пропускаются, как в _nearest_levels
+    up = np.sort(np.where(up > px, up, np.inf), axis=1)[:, :2]
+    dn = -np.sort(-np.where(dn < px, dn, -np.inf), axis=1)[:, :2]
+    return [([float(x) for x in u if np.isfinite(x)], [float(x) for x in d if np.isfinite(x)])
+            for u, d in zip(up.tolist(), dn.tolist())]
+
+def _records(signals) -> list[dict]:
+    if isinstance(signals, pd.DataFrame):   # например, результат compute_signals_batch
+        return signals.to_dict("records")
+    return list(signals)
+
+def build_rationales(signals, detail: str = "Стандарт", date=None, seed: int = 0,
+                     horizon_ui: str | None = None) -> list[str]:
+    """
+    Тексты для многих сигналов (список Signal или DataFrame) за один проход. Формулировки выбираются
+    signal_rng(symbol, date, horizon, seed): при тех же данных и дате текст тот же — его можно кэшировать.
+    date — sig["date"], иначе аргумент, иначе сегодняшняя дата. horizon_ui — иначе по sig["horizon"].
+    """
+    rows = _records(signals)
+    day = str(date or _date.today())
+    out = []
+    for sig, lv in zip(rows, _levels_batch(rows) if rows else []):
+        hz = sig.get("horizon", "")
+        rng = signal_rng(sig["symbol"], sig.get("date") or day, hz, seed)
+        out.append(build_rationale(sig["symbol"], horizon_ui or HORIZON_UI.get(hz, hz), sig, detail, rng, lv))
+    return out
+
+def rationale_records(signals, detail: str = "Стандарт", date=None, seed: int = 0) -> list[dict]:
+    """Сигналы + поле text — для export_jsonl/export_html."""
+    rows = _records(signals)
+    return [{**r, "text": t} for r, t in zip(rows, build_rationales(rows, detail, date, seed))]
+
+def export_jsonl(records: list[dict], path) -> pathlib.Path:
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records)
+    return path
+
+_HTML_COLS = ("symbol", "horizon", "action", "confidence", "entry", "tp1", "tp2", "sl", "text")
+
+def export_html(records: list[dict], path, title: str = "Сигналы") -> pathlib.Path:
+    """Статическая страница-таблица для ночных отчётов (без внешних стилей и скриптов)."""
+    esc = lambda v: html.escape("" if v is None else str(v))
+    head = "".join(f"<th>{c}</th>" for c in _HTML_COLS)
+    body = "\n".join("<tr>" + "".join(f"<td>{esc(r.get(c))}</td>" for c in _HTML_COLS) + "</tr>" for r in records)
+    page = (f"<!doctype html><html lang=\"ru\"><head><meta charset=\"utf-8\"><title>{esc(title)}</title>"
+            "<style>body{font:14px sans-serif}table{border-collapse:collapse}td,th{border:1px solid #ddd;"
+            "padding:4px 8px;vertical-align:top}td:last-child{max-width:60em}</style></head><body>"
+            f"<h1>{esc(title)}</h1><table><thead><tr>{head}</tr></thead><tbody>\n{body}\n</tbody></table>"
+            "</body></html>")
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(page, encoding="utf-8")
+    return path
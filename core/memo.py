@@ -0,0 +1,212 @@
+# core/memo.py — LRU-кэш в памяти с лимитом по байтам + мемоизация стадий сигнала
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Hashable
+import sys, threading, time
+import numpy as np, pandas as pd
+
+from core.bars import Bars
+from core.batch import compute_signals_batch
+from core.data_loader import DataLoader, FetchResult
+from core.strategy import enrich, signal_from_enriched, signals_from_enriched, Horizon, Signal
+
+def sizeof(obj: Any) -> int:
+    """Оценка занимаемой памяти: кадры/массивы — по данным, контейнеры — рекурсивно."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, Bars):
+        return obj.nbytes
+    if isinstance(obj, FetchResult):
+        return sizeof(obj.df) + sys.getsizeof(obj.source)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(sizeof(k) + sizeof(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(sizeof(x) for x in obj)
+    return sys.getsizeof(obj)
+
+@dataclass
+class MemoStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    items: int = 0
+    bytes: int = 0
+
+class LRUCache:
+    """
+    Потокобезопасный LRU: вытесняем давно не использованные ключи, пока не уложимся
+    в max_items и max_bytes. Значение крупнее всего лимита не кэшируется.
+    """
+    def __init__(self, max_items: int = 512, max_bytes: int = 256 * 2**20):
+        self.max_items, self.max_bytes = int(max_items), int(max_bytes)
+        self._data: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._stats = MemoStats()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._stats.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats.hits += 1
+            return item[0]
+
+    def put(self, key: Hashable, value: Any, size: int | None = None) -> None:
+        size = sizeof(value) if size is None else int(size)
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._data.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._data[key] = (value, size)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_items or self._bytes > self.max_bytes):
+                _, (_, sz) = self._data.popitem(last=False)
+                self._bytes -= sz
+                self._stats.evictions += 1
+
+    def get_or_set(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Значение из кэша или fn() (вычисляется вне блокировки; гонка даёт лишний расчёт, не ошибку)."""
+        miss = object()
+        val = self.get(key, miss)
+        if val is miss:
+            val = fn()
+            self.put(key, val)
+        return val
+
+    def pop(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return None
+            self._bytes -= item[1]
+            return item[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**asdict(self._stats), "items": len(self._data), "bytes": self._bytes}
+
+def frame_fingerprint(df: pd.DataFrame | Bars) -> tuple:
+    """(время последнего бара в нс, число баров, последнее закрытие) — меняется при новом или обновлённом баре."""
+    if df is None or len(df) == 0:
+        return (None, 0, None)
+    if isinstance(df, Bars):
+        return (int(df.t[-1]), len(df), float(df.close[-1]))
+    last = pd.Timestamp(df["Date"].iloc[-1])
+    return (last.value, len(df), float(df["Close"].iloc[-1]))
+
+class SignalMemo:
+    """
+    Мемоизация конвейера по ключу (symbol, interval, последний бар[, horizon]):
+    загруженный кадр (с ttl), кадр с индикаторами (общий для всех горизонтов), Signal и
+    производные от него значения (например, зоны для текста). Всё в одном LRU с лимитом памяти.
+    """
+    def __init__(self, max_bytes: int = 256 * 2**20, max_items: int = 2048, ttl: float = 900.0):
+        self.lru = LRUCache(max_items=max_items, max_bytes=max_bytes)
+        self.ttl = float(ttl)
+
+    # loader — DataLoader или core.fetch.FetchPipeline (те же history/history_many)
+    def history(self, loader: DataLoader, symbol: str, period: str = "6mo", interval: str = "1d") -> FetchResult:
+        key = ("frame", symbol.upper(), interval, period)
+        hit = self.lru.get(key)
+        if hit is not None and time.time() - hit[0] < self.ttl:
+            return hit[1]
+        res = loader.history(symbol, period, interval)
+        self.put_history(symbol, res, period, interval)
+        return res
+
+    def history_many(self, loader: DataLoader, symbols: list[str], period: str = "6mo",
+                     interval: str = "1d") -> dict[str, FetchResult]:
+        """Свежие кадры — из памяти, остальные — одним DataLoader.history_many."""
+        out, now = {}, time.time()
+        symbols = list(dict.fromkeys(x.strip().upper() for x in symbols if x and x.strip()))
+        for s in symbols:
+            hit = self.lru.get(("frame", s, interval, period))
+            if hit is not None and now - hit[0] < self.ttl:
+                out[s] = hit[1]
+        rest = [s for s in symbols if s not in out]
+        if rest:
+            for s, res in loader.history_many(rest, period=period, interval=interval).items():
+                self.put_history(s, res, period, interval)
+                out[s] = res
+        return out
+
+    def put_history(self, symbol: str, res: FetchResult, period: str = "6mo", interval: str = "1d") -> None:
+        """Положить уже загруженный кадр (например, из history_many)."""
+        self.lru.put(("frame", symbol.upper(), interval, period), (time.time(), res), sizeof(res))
+
+    def enriched(self, symbol: str, interval: str, df: pd.DataFrame) -> pd.DataFrame:
+        key = ("enriched", symbol.upper(), interval, frame_fingerprint(df))
+        return self.lru.get_or_set(key, lambda: enrich(df))
+
+    def signal(self, symbol: str, interval: str, df: pd.DataFrame, horizon: Horizon) -> Signal:
+        """Signal для горизонта; возвращается копия — вызывающий может дописывать поля."""
+        key = ("signal", symbol.upper(), interval, frame_fingerprint(df), horizon)
+        sig = self.lru.get_or_set(key, lambda: signal_from_enriched(self.enriched(symbol, interval, df),
+                                                                    symbol, horizon))
+        return dict(sig)
+
+    def signals(self, symbol: str, interval: str, df: pd.DataFrame,
+                horizons: tuple[Horizon, ...] = ("short","swing","position")) -> dict[str, Signal]:
+        """Signal по нескольким горизонтам; недостающие считаются одним проходом и кладутся по отдельности."""
+        fp, miss = frame_fingerprint(df), object()
+        key = lambda hz: ("signal", symbol.upper(), interval, fp, hz)
+        out = {hz: self.lru.get(key(hz), miss) for hz in horizons}
+        rest = tuple(hz for hz, v in out.items() if v is miss)
+        if rest:
+            for hz, sig in signals_from_enriched(self.enriched(symbol, interval, df), symbol, rest).items():
+                self.lru.put(key(hz), sig)
+                out[hz] = sig
+        return {hz: dict(sig) for hz, sig in out.items()}
+
+    def signals_batch(self, frames: dict[str, pd.DataFrame | Bars], interval: str,
+                      horizon: Horizon) -> dict[str, Signal]:
+        """
+        Signal одного горизонта по многим тикерам: готовые — из памяти, остальные — одним
+        compute_signals_batch (ключи те же, что у signal(), так что кэш общий).
+        """
+        out, need = {}, {}
+        for s, df in frames.items():
+            key = ("signal", s.upper(), interval, frame_fingerprint(df), horizon)
+            hit = self.lru.get(key)
+            if hit is not None:
+                out[s] = dict(hit)
+            else:
+                need[s] = key
+        if need:
+            res = compute_signals_batch({s: frames[s] for s in need}, horizon)
+            for sig in res.to_dict("records"):
+                self.lru.put(need[sig["symbol"]], sig)
+                out[sig["symbol"]] = dict(sig)
+        return out
+
+    def derived(self, name: str, symbol: str, interval: str, df: pd.DataFrame, horizon: Horizon,
+                fn: Callable[[Signal], Any]) -> Any:
+        """Любая функция от Signal (зоны для текста и т.п.), закэшированная рядом с ним."""
+        key = (name, symbol.upper(), interval, frame_fingerprint(df), horizon)
+        return self.lru.get_or_set(key, lambda: fn(self.signal(symbol, interval, df, horizon)))
+
+    def stats(self) -> dict:
+        return self.lru.stats()
+
+    def clear(self) -> None:
+        self.lru.clear()
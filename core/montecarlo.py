@@ -0,0 +1,190 @@
+# core/montecarlo.py — вероятности касания TP1/TP2/SL по симуляции путей цены
+# Путь — последовательность баров, вытянутых из истории тикера целиком: (Close, High, Low) в логах
+# от предыдущего закрытия. Так внутрибарные касания уровней учитываются, а не только закрытия.
+#   method="bootstrap" — бары как были;
+#   method="scaled"    — бары, нормированные на EWMA-волатильность своего времени и умноженные на
+#                        текущую (filtered historical simulation): спокойная история не занижает риск.
+# Пути считаются порциями (chunk_bytes на порцию), наружу — только гистограммы времени касания.
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Literal
+import math, os, zlib
+import numpy as np, pandas as pd
+
+from core.bars import Bars
+from core.resample import _minutes
+
+Method = Literal["bootstrap", "scaled"]
+
+MC_DAYS = {"short": 3, "swing": 15, "position": 60}   # торговых дней на горизонт (как в описании профилей)
+MAX_STEPS = 390        # внутри дня — не больше одной сессии минуток на путь
+TARGETS = ("tp1", "tp2", "sl")
+LOOKBACK = 500         # последних баров в выборке
+EWMA_LAMBDA = 0.94
+CHUNK_BYTES = 32 * 2**20
+
+@dataclass
+class MCResult:
+    symbol: str
+    horizon: str
+    method: str
+    paths: int
+    steps: int                      # баров на путь
+    start: float                    # цена старта (entry)
+    touch: dict[str, float]         # P(касание за steps баров) по tp1/tp2/sl
+    first: dict[str, float]         # tp1/tp2 — P(строго раньше sl); sl — P(не позже tp1): один бар — в пользу sl
+    bars_mean: dict[str, float]     # среднее число баров до касания среди касавшихся путей (nan — нет)
+    bars_median: dict[str, float]
+    se: float                       # наибольшая стандартная ошибка вероятностей
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+def steps_for(horizon: str, interval: str = "1d") -> int:
+    """Баров на горизонт: дни профиля, внутри дня — умножить на баров в сессии (6.5 ч)."""
+    days = MC_DAYS.get(horizon, MC_DAYS["swing"])
+    minutes = _minutes(interval)   # и производные интервалы (4h), которых нет среди спанов Polygon
+    if minutes:
+        return min(MAX_STEPS, days * math.ceil(390 / minutes))
+    if interval in ("1wk", "1w"):
+        return max(1, math.ceil(days / 5))
+    return days
+
+def bar_moves(df: pd.DataFrame | Bars, lookback: int = LOOKBACK) -> np.ndarray:
+    """(n, 3): log(C/Cпред), log(H/Cпред), log(L/Cпред) по последним lookback барам."""
+    if isinstance(df, Bars):
+        h, l, c = df.high, df.low, df.close
+    else:
+        h, l, c = (df[f].to_numpy(dtype="f8") for f in ("High", "Low", "Close"))
+    h, l, c = h[-lookback - 1:], l[-lookback - 1:], c[-lookback - 1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lc = np.log(c)
+        prev = lc[:-1]
+        r = lc[1:] - prev
+        mv = np.column_stack([r, np.fmax(np.log(h[1:]) - prev, r), np.fmin(np.log(l[1:]) - prev, r)])
+    return mv[np.isfinite(mv).all(axis=1)]
+
+def _scaled(mv: np.ndarray, lam: float = EWMA_LAMBDA) -> np.ndarray:
+    """Бары в единицах своей EWMA-волатильности, умноженные на текущую (после последнего бара)."""
+    r2 = mv[:, 0] ** 2
+    var = np.empty(len(r2) + 1)
+    var[0] = r2.mean()
+    for i, x in enumerate(r2):   # короткий ряд (<= LOOKBACK) — цикл дешевле lfilter
+        var[i + 1] = lam * var[i] + (1 - lam) * x
+    sd = np.sqrt(var)
+    return mv / np.where(sd[:-1] > 0, sd[:-1], 1.0)[:, None] * sd[-1]
+
+def simulate_levels(moves: np.ndarray, start: float, levels: dict[str, float], steps: int,
+                    paths: int = 20_000, seed: int | np.random.SeedSequence = 0,
+                    chunk_bytes: int = CHUNK_BYTES) -> tuple[dict[str, np.ndarray], np.ndarray, np.ndarray]:
+    """
+    Время первого касания каждого уровня (1..steps, steps+1 — не коснулся) по paths путям.
+    Уровень выше старта касается по High, ниже — по Low, равный старту — сразу (0).
+    Возвращает гистограммы {уровень: counts[steps+2]}, матрицу «уровень i строго раньше уровня j» (K, K)
+    и матрицу «i и j коснулись на одном баре» (K, K): порядок внутри бара неизвестен, сторону выбирает вызывающий.
+    """
+    names = [k for k, v in levels.items() if v is not None and v > 0 and math.isfinite(v)]
+    K, S = len(names), int(steps)
+    hist = {k: np.zeros(S + 2, dtype=np.int64) for k in names}
+    before = np.zeros((K, K), dtype=np.int64)
+    ties = np.zeros((K, K), dtype=np.int64)
+    if not K or not len(moves) or start <= 0:
+        return hist, before, ties
+    x = np.log(np.array([levels[k] for k in names]) / start)
+    up, dn = x > 0, x < 0
+    rng = np.random.default_rng(seed)
+    m = max(64, int(chunk_bytes // (S * 8 * 8)))   # ходы (m, S, 3) + пути и временные — ~8 чисел на шаг
+    for lo in range(0, int(paths), m):
+        n = min(m, int(paths) - lo)
+        mv = moves[rng.integers(0, len(moves), size=(n, S))]
+        c = np.cumsum(mv[..., 0], axis=1)
+        prev = c - mv[..., 0]
+        hi = np.maximum.accumulate(prev + mv[..., 1], axis=1)   # максимум пути к концу каждого бара
+        lw = np.minimum.accumulate(prev + mv[..., 2], axis=1)
+        t = np.zeros((n, K), dtype=np.int64)   # число баров до касания = баров, где ещё не коснулся
+        if up.any():
+            t[:, up] = (hi[..., None] < x[up]).sum(axis=1) + 1
+        if dn.any():
+            t[:, dn] = (lw[..., None] > x[dn]).sum(axis=1) + 1
+        for j, k in enumerate(names):
+            hist[k] += np.bincount(t[:, j], minlength=S + 2)
+        hit = t <= S
+        # i раньше j: коснулся i, а j позже или никогда; один бар — отдельно
+        before += ((t[:, :, None] < t[:, None, :]) & hit[:, :, None]).sum(axis=0)
+        ties += ((t[:, :, None] == t[:, None, :]) & hit[:, :, None]).sum(axis=0)
+    return hist, before, ties
+
+def _summary(counts: np.ndarray, steps: int) -> tuple[float, float, float]:
+    """(P касания, среднее и медиана баров до касания) по гистограмме."""
+    total, hit = counts.sum(), counts[:steps + 1]
+    n = hit.sum()
+    if not n:
+        return 0.0, math.nan, math.nan
+    t = np.arange(steps + 1)
+    med = int(np.searchsorted(np.cumsum(hit), (n + 1) / 2))
+    return float(n / total), float((t * hit).sum() / n), float(med)
+
+def simulate_signal(df: pd.DataFrame | Bars | None, sig: dict, horizon: str | None = None, interval: str = "1d",
+                    method: Method = "scaled", paths: int = 20_000, seed: int = 0,
+                    moves: np.ndarray | None = None, steps: int | None = None) -> MCResult:
+    """Вероятности касания tp1/tp2/sl для одного Signal; старт — entry."""
+    horizon = horizon or sig.get("horizon", "swing")
+    steps = int(steps or steps_for(horizon, interval))
+    mv = bar_moves(df) if moves is None else moves
+    if method == "scaled" and len(mv) > 1:
+        mv = _scaled(mv)
+    symbol = str(sig.get("symbol", ""))
+    ss = np.random.SeedSequence([int(seed), zlib.crc32(f"{symbol.upper()}|{horizon}".encode())])
+    levels = {k: float(sig[k]) for k in TARGETS}
+    hist, before, ties = simulate_levels(mv, float(sig["entry"]), levels, steps, paths, ss)
+    names = list(hist)
+    pos = {k: i for i, k in enumerate(names)}
+    touch, mean, med, first = {}, {}, {}, {}
+    for k in TARGETS:
+        if k in hist:
+            touch[k], mean[k], med[k] = _summary(hist[k], steps)
+        else:
+            touch[k], mean[k], med[k] = math.nan, math.nan, math.nan
+    # бар, задевший и цель, и стоп, — в пользу стопа (как в бэктесте): tp строго раньше, sl — не позже tp1
+    for k, other, tie in (("tp1", "sl", 0), ("tp2", "sl", 0), ("sl", "tp1", 1)):
+        if k in pos and other in pos and paths:
+            i, j = pos[k], pos[other]
+            first[k] = float((before[i, j] + tie * ties[i, j]) / paths)
+        else:
+            first[k] = math.nan
+    ps = [p for p in (*touch.values(), *first.values()) if p == p]
+    se = max((math.sqrt(p * (1 - p) / paths) for p in ps), default=math.nan) if paths else math.nan
+    return MCResult(symbol, horizon, method, int(paths), steps, float(sig["entry"]),
+                    touch, first, mean, med, se)
+
+def attach(sig: dict, res: MCResult) -> dict:
+    """Результат в Signal под ключом "mc" (словарь — сериализуется вместе с сигналом)."""
+    sig["mc"] = res.as_dict()
+    return sig
+
+# ---------- вселенная ----------
+def _simulate_item(item: tuple) -> tuple[str, MCResult | str]:
+    sym, mv, sig, horizon, interval, method, paths, seed = item
+    try:
+        return sym, simulate_signal(None, sig, horizon, interval, method, paths, seed, moves=mv)
+    except Exception as e:
+        return sym, f"{type(e).__name__}: {e}"
+
+def simulate_universe(frames: dict[str, pd.DataFrame | Bars], signals: dict[str, dict],
+                      horizon: str | None = None, interval: str = "1d", method: Method = "scaled",
+                      paths: int = 20_000, seed: int = 0, max_workers: int | None = None) -> dict[str, MCResult]:
+    """
+    MCResult по всем тикерам с сигналом: в пул процессов уходят только выборки баров (n, 3) и Signal,
+    не кадры. Генератор каждого тикера зависит от (seed, тикер, горизонт), а не от раскладки по
+    процессам — результат одинаков при любом max_workers. Ошибочные тикеры пропускаются.
+    """
+    items = [(s, bar_moves(frames[s]), signals[s], horizon, interval, method, paths, seed)
+             for s in signals if s in frames]
+    workers = max_workers or os.cpu_count() or 1
+    if workers <= 1 or len(items) < 2:
+        res = map(_simulate_item, items)
+        return {s: r for s, r in res if isinstance(r, MCResult)}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        res = pool.map(_simulate_item, items, chunksize=max(1, len(items) // (4 * workers)))
+        return {s: r for s, r in res if isinstance(r, MCResult)}
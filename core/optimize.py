@@ -0,0 +1,241 @@
+# core/optimize.py — перебор параметров профилей горизонтов на истории (сетка / случайная выборка)
+# Индикаторы считаются один раз на тикер для всех значений спанов EMA из пространства поиска и
+# кладутся в один блок shared_memory; процессы пула читают его без копий и гоняют только правила
+# (evaluate_rules) и симуляцию сделок (simulate_trades) — на конфигурацию это дешёвая часть.
+# Байесовского/адаптивного поиска нет намеренно: сетка — около 6 тыс. сочетаний дискретных значений,
+# полный перебор в пуле укладывается в минуты, а отбор по малому числу сделок легко переобучить.
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from multiprocessing import shared_memory
+from typing import Iterator
+import argparse, math, os
+import numpy as np, pandas as pd
+
+from core.strategy import HORIZON_PROFILES, Horizon, _ema, _rsi, _macd_hist
+from core.backtest import HOLD_BARS, _atr_growing, signal_arrays, simulate_trades, summarize
+from core.batch import _wall_ns
+from core.kernels import sign_runs
+from core.pivots import PivotIndex, SCOPES
+
+# параметры правил (ключи профиля) и спаны EMA (только для исследования: enrich считает 20/50/200)
+PROFILE_KEYS = ("pivot_scope", "need_hist", "k_tp1", "k_tp2", "k_sl", "trend_weight", "rsi_lo", "rsi_hi")
+EMA_KEYS = ("ema_fast", "ema_mid", "ema_slow")
+DEFAULT_SPACE: dict[str, list] = {
+    "need_hist": [2, 3, 4],
+    "k_tp1": [0.6, 0.8, 1.0], "k_tp2": [1.2, 1.6, 2.2], "k_sl": [0.9, 1.0, 1.4],
+    "trend_weight": [0.6, 0.7],
+    "ema_fast": [10, 20], "ema_mid": [50], "ema_slow": [100, 200],
+    "rsi_lo": [28, 32, 36], "rsi_hi": [64, 68, 72],
+}
+_BASE_ROWS = ("Open", "High", "Low", "Close", "atr", "rsi", "hist_run", "key_mark")
+_PIV = ("P", "R1", "R2", "R3", "S1", "S2", "S3")
+
+# ---------- пространство поиска ----------
+def _valid(cfg: dict) -> bool:
+    ef, em, es = (cfg.get(k, d) for k, d in zip(EMA_KEYS, (20, 50, 200)))
+    return (ef < em < es and cfg.get("k_tp1", 0) < cfg.get("k_tp2", math.inf)
+            and cfg.get("rsi_lo", 32) < cfg.get("rsi_hi", 68))
+
+def grid(space: dict[str, list] | None = None) -> Iterator[dict]:
+    """Все сочетания значений (невозможные — fast >= mid, tp1 >= tp2 и т.п. — пропускаются)."""
+    space = space or DEFAULT_SPACE
+    keys = list(space)
+    for vals in product(*(space[k] for k in keys)):
+        cfg = dict(zip(keys, vals))
+        if _valid(cfg):
+            yield cfg
+
+def random_configs(space: dict[str, list] | None = None, n: int = 200, seed: int = 0) -> list[dict]:
+    """n различных сочетаний сетки без её построения: номер сочетания -> значения (смешанная система счисления)."""
+    space = space or DEFAULT_SPACE
+    keys, sizes = list(space), [len(v) for v in space.values()]
+    total = math.prod(sizes)
+    rng = np.random.default_rng(seed)
+    out, seen = [], set()
+    for _ in range(50 * n):   # с запасом на отбракованные сочетания
+        if len(out) >= n or len(seen) >= total:
+            break
+        idx = int(rng.integers(total))
+        if idx in seen:
+            continue
+        seen.add(idx)
+        cfg = {}
+        for k, size in zip(reversed(keys), reversed(sizes)):
+            idx, j = divmod(idx, size)
+            cfg[k] = space[k][j]
+        cfg = {k: cfg[k] for k in keys}
+        if _valid(cfg):
+            out.append(cfg)
+    return out
+
+# ---------- общие индикаторы ----------
+class Panel:
+    """
+    Индикаторы всех тикеров в одной матрице (строка = поле, столбцы = бары подряд по тикерам).
+    bounds[i]:bounds[i+1] — бары тикера symbols[i]. Матрица может лежать в shared_memory.
+    """
+    def __init__(self, data: np.ndarray, fields: list[str], symbols: list[str], bounds: np.ndarray):
+        self.data, self.fields, self.symbols, self.bounds = data, fields, symbols, bounds
+        self.row = {f: i for i, f in enumerate(fields)}
+
+    @classmethod
+    def build(cls, frames: dict[str, pd.DataFrame], ema_spans=(20, 50, 200)) -> "Panel":
+        spans = sorted({int(s) for s in ema_spans})
+        fields = [*_BASE_ROWS, *(f"{p}_{sc}" for sc in SCOPES for p in _PIV), *(f"ema_{s}" for s in spans)]
+        symbols = [s for s, df in frames.items() if df is not None and len(df)]
+        bounds = np.r_[0, np.cumsum([len(frames[s]) for s in symbols])].astype(np.int64)
+        data = np.empty((len(fields), int(bounds[-1])))
+        for i, s in enumerate(symbols):
+            lo, hi = bounds[i], bounds[i + 1]
+            for f, v in _indicator_rows(frames[s], spans).items():
+                data[fields.index(f), lo:hi] = v
+        return cls(data, fields, symbols, bounds)
+
+    def ind(self, i: int, cfg: dict) -> dict:
+        """Словарь индикаторов тикера i в формате backtest.indicator_arrays — срезы матрицы без копий."""
+        lo, hi = self.bounds[i], self.bounds[i + 1]
+        get = lambda f: self.data[self.row[f], lo:hi]
+        ef, em, es = (int(cfg.get(k, d)) for k, d in zip(EMA_KEYS, (20, 50, 200)))
+        ema_m = get(f"ema_{em}")
+        lag = np.full(hi - lo, np.nan)
+        lag[4:] = ema_m[:-4]
+        ind = {f: get(f) for f in _BASE_ROWS}
+        ind.update(ema_f=get(f"ema_{ef}"), ema_m=ema_m, ema_s=get(f"ema_{es}"), ema_m_lag=lag,
+                   pivots=_PivotRows(self, lo, hi))
+        return ind
+
+class _PivotRows:
+    """Заменитель PivotIndex для signal_arrays: уровни уже посчитаны в матрице."""
+    def __init__(self, panel: Panel, lo: int, hi: int):
+        self.panel, self.lo, self.hi = panel, lo, hi
+
+    def arrays(self, scope: str) -> tuple[np.ndarray, ...]:
+        return tuple(self.panel.data[self.panel.row[f"{p}_{scope}"], self.lo:self.hi] for p in _PIV)
+
+def _indicator_rows(df: pd.DataFrame, spans: list[int]) -> dict[str, np.ndarray]:
+    close = df["Close"].astype(float).reset_index(drop=True)
+    h, l, c = (df[f].to_numpy(dtype="f8") for f in ("High", "Low", "Close"))
+    h1, l1, c1 = (np.r_[np.nan, x[:-1]] for x in (h, l, c))
+    piv = PivotIndex(_wall_ns(df["Date"].reset_index(drop=True)), h, l, c)
+    rows = {"Open": df["Open"].to_numpy(dtype="f8"), "High": h, "Low": l, "Close": c,
+            "atr": _atr_growing(h, l, c), "rsi": _rsi(close, 14).to_numpy(),
+            "hist_run": sign_runs(_macd_hist(close).to_numpy()).astype("f8"), "key_mark": (h1 + l1 + c1)/3.0}
+    for sc in SCOPES:
+        rows.update({f"{p}_{sc}": v for p, v in zip(_PIV, piv.arrays(sc))})
+    rows.update({f"ema_{s}": _ema(close, s).to_numpy() for s in spans})
+    return rows
+
+# ---------- оценка ----------
+def evaluate(panel: Panel, tasks: list[tuple[Horizon, int, dict]], groups: dict[str, list[int]],
+             max_hold: dict[str, int] | None = None) -> list[dict]:
+    """Статистика сделок по (горизонт, конфигурация, группа): сделки тикеров группы объединяются."""
+    hold = {**HOLD_BARS, **(max_hold or {})}
+    rows = []
+    for hz, no, cfg in tasks:
+        prof = {**HORIZON_PROFILES.get(hz, HORIZON_PROFILES["swing"]),
+                **{k: v for k, v in cfg.items() if k in PROFILE_KEYS}}
+        per_sym = {}
+        for i in sorted({i for idx in groups.values() for i in idx}):
+            ind = panel.ind(i, cfg)
+            sig = signal_arrays(ind, hz, prof)
+            per_sym[i] = (simulate_trades(ind, sig, hold.get(hz, HOLD_BARS["swing"])), int((sig["action"] != 0).sum()))
+        for g, idx in groups.items():
+            parts = [per_sym[i][0] for i in idx if len(per_sym[i][0])]
+            trades = pd.concat(parts, ignore_index=True) if parts else per_sym[idx[0]][0]
+            rows.append({"group": g, "horizon": hz, "config": no, **cfg,
+                         **summarize(trades, sum(per_sym[i][1] for i in idx))})
+    return rows
+
+_PANEL: Panel | None = None
+_SHM: shared_memory.SharedMemory | None = None
+
+def _attach(name: str, shape: tuple, fields: list[str], symbols: list[str], bounds: np.ndarray) -> None:
+    """Инициализатор процесса пула: матрица индикаторов — view на общий блок памяти."""
+    global _PANEL, _SHM
+    _SHM = shared_memory.SharedMemory(name=name)   # удаляет блок родитель (unlink в optimize)
+    _PANEL = Panel(np.ndarray(shape, dtype=np.float64, buffer=_SHM.buf), fields, symbols, bounds)
+
+def _evaluate_shared(args: tuple) -> list[dict]:
+    return evaluate(_PANEL, *args)
+
+def optimize(frames: dict[str, pd.DataFrame], configs: list[dict] | None = None,
+             horizons: tuple[Horizon, ...] = ("short", "swing", "position"),
+             groups: dict[str, list[str]] | None = None, max_hold: dict[str, int] | None = None,
+             max_workers: int | None = None) -> pd.DataFrame:
+    """
+    Прогон конфигураций по истории: строка отчёта на (группа, горизонт, конфигурация) со статистикой
+    summarize(). configs — из grid()/random_configs() (по умолчанию — вся DEFAULT_SPACE).
+    groups — имя -> тикеры (по умолчанию одна группа "all"). max_workers — процессов
+    (по умолчанию все ядра; 1 — в текущем процессе, без пула).
+    """
+    configs = list(grid()) if configs is None else list(configs)
+    spans = {20, 50, 200} | {int(c[k]) for c in configs for k in EMA_KEYS if k in c}
+    panel = Panel.build(frames, spans)
+    if not panel.symbols or not configs:
+        return pd.DataFrame()
+    pos = {s: i for i, s in enumerate(panel.symbols)}
+    groups = groups or {"all": panel.symbols}
+    gidx = {g: [pos[s] for s in syms if s in pos] for g, syms in groups.items()}
+    gidx = {g: idx for g, idx in gidx.items() if idx}
+    tasks = [(hz, no, cfg) for no, cfg in enumerate(configs) for hz in horizons]
+
+    workers = max_workers or os.cpu_count() or 1
+    if workers <= 1 or len(tasks) < 2:
+        return pd.DataFrame(evaluate(panel, tasks, gidx, max_hold))
+    # мелкие порции — чтобы ядра не простаивали в конце, но без лишних пересылок
+    size = max(1, len(tasks) // (4 * workers))
+    chunks = [(tasks[i:i + size], gidx, max_hold) for i in range(0, len(tasks), size)]
+    shm = shared_memory.SharedMemory(create=True, size=max(panel.data.nbytes, 1))
+    try:
+        np.ndarray(panel.data.shape, dtype=np.float64, buffer=shm.buf)[:] = panel.data
+        init = (shm.name, panel.data.shape, panel.fields, panel.symbols, panel.bounds)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=init) as pool:
+            rows = [r for part in pool.map(_evaluate_shared, chunks) for r in part]
+    finally:
+        shm.close()
+        shm.unlink()
+    return pd.DataFrame(rows)
+
+def best(report: pd.DataFrame, by: str = "expectancy_r", top: int = 1, min_trades: int = 30) -> pd.DataFrame:
+    """Лучшие конфигурации по каждой паре (группа, горизонт); мало сделок — не в зачёт."""
+    if report.empty:
+        return report
+    ok = report[report["trades"] >= min_trades]
+    return (ok.sort_values(by, ascending=False, kind="stable")
+              .groupby(["group", "horizon"], sort=True).head(top)
+              .sort_values(["group", "horizon", by], ascending=[True, True, False]).reset_index(drop=True))
+
+# ---------- CLI ----------
+def _group(s: str) -> tuple[str, list[str]]:
+    name, _, syms = s.partition("=")
+    return name, [x.strip().upper() for x in syms.split(",") if x.strip()]
+
+def main(argv: list[str] | None = None) -> None:
+    from core.data_loader import DataLoader
+    ap = argparse.ArgumentParser(description="Перебор параметров профилей горизонтов на истории")
+    ap.add_argument("symbols", nargs="+")
+    ap.add_argument("--period", default="5y")
+    ap.add_argument("--horizons", default="short,swing,position")
+    ap.add_argument("--search", choices=("grid", "random"), default="random")
+    ap.add_argument("--n", type=int, default=200, help="конфигураций для random")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--group", type=_group, action="append", default=[], help="NAME=SYM,SYM (можно повторять)")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--by", default="expectancy_r")
+    ap.add_argument("--top", type=int, default=3)
+    ap.add_argument("--min-trades", type=int, default=30)
+    ap.add_argument("--out", default=None, help="полный отчёт в CSV")
+    args = ap.parse_args(argv)
+
+    frames = {s: r.df for s, r in DataLoader().history_many([s.upper() for s in args.symbols], period=args.period).items()}
+    configs = list(grid()) if args.search == "grid" else random_configs(n=args.n, seed=args.seed)
+    report = optimize(frames, configs, tuple(args.horizons.split(",")), dict(args.group) or None,
+                      max_workers=args.workers)
+    if args.out:
+        report.to_csv(args.out, index=False)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(best(report, args.by, args.top, args.min_trades).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
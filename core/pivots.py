@@ -0,0 +1,131 @@
+# core/pivots.py — индекс пивотов: бар -> H/L/C предыдущего дня/недели/месяца без resample
+from __future__ import annotations
+import numpy as np, pandas as pd
+
+SCOPES = ("daily","weekly","monthly")
+_NS_PER_DAY = 86_400 * 10**9
+
+def period_keys(t_ns: np.ndarray, scope: str) -> np.ndarray:
+    """Целочисленный ключ периода для времени в нс (настенное время, без tz)."""
+    t_ns = np.asarray(t_ns, dtype=np.int64)
+    days = np.floor_divide(t_ns, _NS_PER_DAY)
+    if scope == "weekly":   # недели, закрывающиеся в пятницу (W-FRI); 1970-01-02 — пятница
+        return np.floor_divide(days - 2, 7)
+    if scope == "monthly":
+        return t_ns.astype("datetime64[ns]").astype("datetime64[M]").astype(np.int64)
+    return days
+
+def floor_pivots(H, L, C) -> tuple:
+    """_floor_pivots для скаляров и массивов (те же операции в том же порядке)."""
+    P  = (H + L + C) / 3.0
+    R1 = 2*P - L
+    S1 = 2*P - H
+    R2 = P + (H - L)
+    S2 = P - (H - L)
+    R3 = H + 2*(P - L)
+    S3 = L - 2*(H - P)
+    return P, R1, R2, R3, S1, S2, S3
+
+class _Buf:
+    """Растущий numpy-буфер: амортизированно O(1) на append, срез без копии."""
+    __slots__ = ("data", "n")
+
+    def __init__(self, values: np.ndarray):
+        self.data = np.array(values)
+        self.n = len(self.data)
+
+    def append(self, v) -> None:
+        if self.n == len(self.data):
+            grown = np.empty(max(16, 2*self.n), dtype=self.data.dtype)
+            grown[:self.n] = self.data[:self.n]
+            self.data = grown
+        self.data[self.n] = v
+        self.n += 1
+
+    @property
+    def view(self) -> np.ndarray:
+        return self.data[:self.n]
+
+class PivotIndex:
+    """
+    Строится один раз на ряд: для каждого масштаба — номер периода у каждого бара и H/L/C
+    по периодам. Пивоты любого бара — O(1): период бара минус один. append() дописывает бар
+    (обновляет текущий период или открывает новый), не пересчитывая историю.
+    Ряд должен идти по возрастанию времени (from_frame сортирует сам).
+    """
+    def __init__(self, t_ns, high, low, close, scopes: tuple[str, ...] = SCOPES):
+        t = np.asarray(t_ns, dtype=np.int64)
+        h, l, c = (np.asarray(x, dtype=np.float64) for x in (high, low, close))
+        self.scopes = tuple(scopes)
+        self._t, self._c = _Buf(t), _Buf(c)
+        self._pid, self._key, self._ph, self._pl, self._pc = {}, {}, {}, {}, {}
+        n = len(c)
+        for sc in self.scopes:
+            keys = period_keys(t, sc)
+            new = np.ones(n, dtype=bool)
+            new[1:] = keys[1:] != keys[:-1]
+            starts = np.flatnonzero(new)
+            self._pid[sc] = _Buf(np.cumsum(new, dtype=np.int64) - 1)
+            self._key[sc] = _Buf(keys[starts] if n else np.empty(0, dtype=np.int64))
+            # fmax/fmin пропускают NaN, как max/min в resample
+            self._ph[sc] = _Buf(np.fmax.reduceat(h, starts) if n else np.empty(0))
+            self._pl[sc] = _Buf(np.fmin.reduceat(l, starts) if n else np.empty(0))
+            self._pc[sc] = _Buf(c[np.append(starts[1:], n) - 1] if n else np.empty(0))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, scopes: tuple[str, ...] = SCOPES) -> "PivotIndex":
+        dates = pd.to_datetime(df["Date"])
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)   # периоды — по локальным датам, как resample
+        t = dates.to_numpy(dtype="datetime64[ns]").view("i8")
+        h, l, c = (df[f].to_numpy(dtype="f8") for f in ("High","Low","Close"))
+        if len(t) > 1 and (np.diff(t) < 0).any():
+            order = np.argsort(t, kind="stable")
+            t, h, l, c = t[order], h[order], l[order], c[order]
+        return cls(t, h, l, c, scopes)
+
+    def __len__(self) -> int:
+        return self._c.n
+
+    def append(self, t_ns: int, high: float, low: float, close: float) -> None:
+        """Новый бар в конец ряда (время не меньше последнего)."""
+        self._t.append(t_ns); self._c.append(close)
+        for sc in self.scopes:
+            key = int(period_keys(np.array([t_ns]), sc)[0])
+            keys = self._key[sc]
+            if keys.n and keys.data[keys.n - 1] == key:
+                i = keys.n - 1
+                self._ph[sc].data[i] = np.fmax(self._ph[sc].data[i], high)
+                self._pl[sc].data[i] = np.fmin(self._pl[sc].data[i], low)
+                self._pc[sc].data[i] = close
+            else:
+                keys.append(key)
+                self._ph[sc].append(high); self._pl[sc].append(low); self._pc[sc].append(close)
+            self._pid[sc].append(keys.n - 1)
+
+    def prev_hlc(self, i: int, scope: str) -> tuple[float, float, float] | None:
+        """H/L/C предыдущего периода для бара i (отрицательные индексы — с конца)."""
+        p = int(self._pid[scope].view[i]) - 1
+        if p < 0:
+            return None
+        return float(self._ph[scope].data[p]), float(self._pl[scope].data[p]), float(self._pc[scope].data[p])
+
+    def at(self, i: int = -1, scope: str = "weekly") -> dict[str, float]:
+        """Пивоты бара i; без предыдущего периода — все уровни равны закрытию бара."""
+        hlc = self.prev_hlc(i, scope)
+        if hlc is None:
+            px = float(self._c.view[i])
+            return {"P":px,"R1":px,"R2":px,"R3":px,"S1":px,"S2":px,"S3":px}
+        P,R1,R2,R3,S1,S2,S3 = (float(v) for v in floor_pivots(*hlc))
+        return {"P":P,"R1":R1,"R2":R2,"R3":R3,"S1":S1,"S2":S2,"S3":S3}
+
+    def arrays(self, scope: str) -> tuple[np.ndarray, ...]:
+        """(P, R1, R2, R3, S1, S2, S3) для всех баров сразу."""
+        pid = self._pid[scope].view
+        prev = np.maximum(pid - 1, 0)
+        ph, pl, pc = (b.view for b in (self._ph[scope], self._pl[scope], self._pc[scope]))
+        if not len(ph):
+            return tuple(np.empty(0) for _ in range(7))
+        ok = pid >= 1
+        c = self._c.view
+        return tuple(np.where(ok, v, c) for v in floor_pivots(ph[prev], pl[prev], pc[prev]))
@@ -0,0 +1,125 @@
+# core/resample.py — свёртка младших баров в старшие таймфреймы: векторно, кусками, за один проход
+# Ключ периода — целое число от «настенного» времени (как в core/pivots), свёртка — reduceat по
+# границам ключей. Aggregator принимает ряд кусками и переносит незакрытый период между ними.
+from __future__ import annotations
+import re
+import numpy as np, pandas as pd
+
+from core.bars import Bars
+from core.pivots import period_keys
+
+_NS_PER_MIN = 60 * 10**9
+_SCOPES = {"1d": "daily", "1w": "weekly", "1wk": "weekly", "1M": "monthly", "1mo": "monthly"}
+# интервалы, которых нет у источников, — собираются из базового
+DERIVED = {"3m": "1m", "10m": "5m", "20m": "5m", "45m": "15m", "2h": "1h", "3h": "1h", "4h": "1h"}
+
+def _minutes(rule: str) -> int | None:
+    m = re.fullmatch(r"(\d+)\s*(m|min|h)", rule)
+    if not m:
+        return None
+    return int(m.group(1)) * (60 if m.group(2) == "h" else 1)
+
+def bucket_keys(t_wall_ns: np.ndarray, rule: str) -> np.ndarray:
+    """Номер корзины для каждого бара: минуты/часы от полуночи эпохи, дни, недели W-FRI, месяцы."""
+    t = np.asarray(t_wall_ns, dtype=np.int64)
+    if rule in _SCOPES:
+        return period_keys(t, _SCOPES[rule])
+    mins = _minutes(rule)
+    if mins is None:
+        raise ValueError(f"unknown rule: {rule}")
+    return np.floor_divide(t, mins * _NS_PER_MIN)
+
+def _reduce(t, o, h, l, c, v, keys) -> tuple[np.ndarray, ...]:
+    """OHLCV по подряд идущим одинаковым ключам; время корзины — время её первого бара."""
+    n = len(keys)
+    new = np.ones(n, dtype=bool)
+    new[1:] = keys[1:] != keys[:-1]
+    starts = np.flatnonzero(new)
+    last = np.r_[starts[1:], n] - 1
+    return (keys[starts], t[starts], o[starts], np.fmax.reduceat(h, starts), np.fmin.reduceat(l, starts),
+            c[last], np.add.reduceat(np.nan_to_num(v), starts))
+
+def aggregate(t_wall_ns, open, high, low, close, volume, rule: str) -> dict[str, np.ndarray]:
+    """Свёртка целого ряда (время по возрастанию) в таймфрейм rule."""
+    arrs = [np.asarray(x) for x in (t_wall_ns, open, high, low, close, volume)]
+    if not len(arrs[0]):
+        return {"key": np.empty(0, np.int64), "t": np.empty(0, np.int64),
+                **{k: np.empty(0) for k in ("open","high","low","close","volume")}}
+    k, t, o, h, l, c, v = _reduce(*arrs, bucket_keys(arrs[0], rule))
+    return {"key": k, "t": t, "open": o, "high": h, "low": l, "close": c, "volume": v}
+
+class Aggregator:
+    """
+    Потоковая свёртка сразу в несколько таймфреймов. update() принимает очередной кусок
+    (или один бар) и возвращает закрывшиеся корзины по каждому правилу; незакрытая корзина
+    переносится в следующий кусок. flush() отдаёт незакрытые корзины.
+    """
+    def __init__(self, rules: tuple[str, ...] = ("1d", "1w", "1M")):
+        self.rules = tuple(rules)
+        self._open: dict[str, tuple | None] = dict.fromkeys(self.rules)
+
+    def update(self, t_wall_ns, open, high, low, close, volume=None) -> dict[str, dict[str, np.ndarray]]:
+        t = np.atleast_1d(np.asarray(t_wall_ns, dtype=np.int64))
+        o, h, l, c = (np.atleast_1d(np.asarray(x, dtype=np.float64)) for x in (open, high, low, close))
+        v = np.zeros(len(t)) if volume is None else np.atleast_1d(np.asarray(volume, dtype=np.float64))
+        out = {}
+        for rule in self.rules:
+            keys = bucket_keys(t, rule)
+            pend = self._open[rule]
+            if pend is not None:   # незакрытая корзина — как один бар перед куском
+                pk, pt, po, ph, pl, pc, pv = pend
+                keys = np.r_[pk, keys]
+                tt, oo, hh, ll, cc, vv = (np.r_[a, b] for a, b in ((pt, t), (po, o), (ph, h), (pl, l), (pc, c), (pv, v)))
+            else:
+                tt, oo, hh, ll, cc, vv = t, o, h, l, c, v
+            if not len(keys):
+                out[rule] = _empty()
+                continue
+            res = _reduce(tt, oo, hh, ll, cc, vv, keys)
+            self._open[rule] = tuple(x[-1] for x in res)
+            out[rule] = _as_dict(tuple(x[:-1] for x in res))
+        return out
+
+    def flush(self) -> dict[str, dict[str, np.ndarray]]:
+        out = {}
+        for rule in self.rules:
+            pend, self._open[rule] = self._open[rule], None
+            out[rule] = _as_dict(tuple(np.atleast_1d(x) for x in pend)) if pend is not None else _empty()
+        return out
+
+def _as_dict(res: tuple) -> dict[str, np.ndarray]:
+    return dict(zip(("key","t","open","high","low","close","volume"), res))
+
+def _empty() -> dict[str, np.ndarray]:
+    return _as_dict((np.empty(0, np.int64), np.empty(0, np.int64), *(np.empty(0) for _ in range(5))))
+
+def multi_timeframe(bars: Bars, rules: tuple[str, ...] = ("1d", "1w", "1M"),
+                    chunk: int = 1_000_000) -> dict[str, Bars]:
+    """
+    Все таймфреймы за один проход по ряду кусками по chunk баров (память — O(chunk)).
+    Время старших баров — «настенное» время первого бара корзины.
+    """
+    agg = Aggregator(rules)
+    parts: dict[str, list[dict]] = {r: [] for r in rules}
+    t_wall = bars.wall_ns()
+    for i in range(0, len(bars), chunk):
+        sl = slice(i, i + chunk)
+        done = agg.update(t_wall[sl], bars.open[sl], bars.high[sl], bars.low[sl], bars.close[sl], bars.volume[sl])
+        for r in rules:
+            parts[r].append(done[r])
+    for r, d in agg.flush().items():
+        parts[r].append(d)
+    out = {}
+    for r in rules:
+        cols = {k: np.concatenate([p[k] for p in parts[r]]) for k in ("t","open","high","low","close","volume")}
+        out[r] = Bars(cols["t"], cols["open"], cols["high"], cols["low"], cols["close"], cols["volume"])
+        if bars.tz:   # обратно в UTC + tz, как у исходного ряда
+            out[r] = Bars(pd.DatetimeIndex(cols["t"]).tz_localize(bars.tz).tz_convert("UTC").tz_localize(None).asi8,
+                          cols["open"], cols["high"], cols["low"], cols["close"], cols["volume"], tz=bars.tz)
+    return out
+
+def resample_frame(df: pd.DataFrame, rule: str, chunk: int = 1_000_000) -> pd.DataFrame:
+    """DataFrame формата DataLoader -> тот же формат в таймфрейме rule."""
+    if df is None or df.empty:
+        return df
+    return multi_timeframe(Bars.from_frame(df), (rule,), chunk)[rule].to_pandas()
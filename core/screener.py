@@ -0,0 +1,98 @@
+# core/screener.py — скринер: загрузка и оценка всего списка тикеров порциями
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterator, Literal
+import math
+import pandas as pd
+
+from core.data_loader import DataLoader, FetchResult
+from core.strategy import compute_signal, Horizon
+from core.batch import compute_signals_batch
+from core.telemetry import span
+
+Engine = Literal["batch", "process"]
+
+COLUMNS = ["symbol","action","confidence","entry","key_mark","dist_key_pct","rr_tp1","tp1","sl","source","bars","error"]
+
+def screen_row(sig: dict, source: str = "", bars: int = 0) -> dict:
+    """Строка таблицы из сигнала: отклонение от ключевой отметки (%) и R/R до TP1 против стопа."""
+    entry, km = float(sig["entry"]), float(sig["key_mark"])
+    risk, reward = abs(entry - float(sig["sl"])), abs(float(sig["tp1"]) - entry)
+    return {
+        "symbol": sig["symbol"], "action": sig["action"], "confidence": float(sig["confidence"]),
+        "entry": entry, "key_mark": km,
+        "dist_key_pct": round((entry - km) / km * 100, 2) if km else math.nan,
+        "rr_tp1": round(reward / risk, 2) if risk > 0 else math.nan,
+        "tp1": float(sig["tp1"]), "sl": float(sig["sl"]), "source": source, "bars": int(bars), "error": "",
+    }
+
+def _error_row(symbol: str, err: str, source: str = "") -> dict:
+    row = dict.fromkeys(COLUMNS, math.nan)
+    row.update(symbol=symbol, action="—", source=source, bars=0, error=err)
+    return row
+
+def _score_one(item: tuple[str, pd.DataFrame, str, str]) -> dict:
+    sym, df, source, horizon = item
+    try:
+        return screen_row(compute_signal(df, sym, horizon), source, len(df))
+    except Exception as e:
+        return _error_row(sym, str(e), source)
+
+def _score_chunk(frames: dict[str, FetchResult], horizon: Horizon, engine: Engine,
+                 pool: ProcessPoolExecutor | None) -> list[dict]:
+    if engine == "batch":
+        try:
+            sigs = compute_signals_batch({s: r.df for s, r in frames.items()}, horizon)
+            return [screen_row(sig, frames[sig["symbol"]].source, len(frames[sig["symbol"]].df))
+                    for sig in sigs.to_dict("records")]
+        except Exception:
+            pass  # кривой кадр в порции — считаем по одному, чтобы ошибка осталась в своей строке
+    items = [(s, r.df, r.source, horizon) for s, r in frames.items()]
+    if pool is not None:
+        return list(pool.map(_score_one, items, chunksize=max(1, len(items) // 16)))
+    return [_score_one(it) for it in items]
+
+def screen(symbols: list[str], horizon: Horizon = "swing", loader: DataLoader | None = None,
+           period: str = "6mo", interval: str = "1d", chunk_size: int = 200,
+           engine: Engine = "batch", max_workers: int | None = None) -> Iterator[list[dict]]:
+    """
+    Отдаёт строки порциями по мере готовности. Порция грузится через DataLoader.history_many
+    (пул потоков), пока предыдущая оценивается: engine="batch" — compute_signals_batch одним
+    проходом по матрицам, "process" — compute_signal в пуле процессов.
+    Тикеры без данных попадают в таблицу строкой с ошибкой.
+    """
+    loader = loader or DataLoader()
+    symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+    chunks = [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+    if not chunks:
+        return
+    procs = ProcessPoolExecutor(max_workers=max_workers) if engine == "process" else None
+    try:
+        with ThreadPoolExecutor(max_workers=1) as prefetch:
+            load = lambda c: loader.history_many(c, period=period, interval=interval)
+            nxt = prefetch.submit(load, chunks[0])
+            for i, chunk in enumerate(chunks):
+                try:
+                    frames = nxt.result()
+                except Exception as e:
+                    frames, err = {}, str(e)
+                else:
+                    err = "нет данных"
+                if i + 1 < len(chunks):
+                    nxt = prefetch.submit(load, chunks[i + 1])
+                with span("screener.score", engine=engine):
+                    rows = _score_chunk(frames, horizon, engine, procs) if frames else []
+                rows += [_error_row(s, err) for s in chunk if s not in frames]
+                yield rows
+    finally:
+        if procs is not None:
+            procs.shutdown(cancel_futures=True)
+
+def screen_frame(rows: list[dict], sort_by: str = "confidence", ascending: bool = False) -> pd.DataFrame:
+    """Накопленные строки -> таблица для показа (ошибки — в конце)."""
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    if df.empty:
+        return df
+    df["_err"] = df["error"].fillna("").astype(bool)
+    df = df.sort_values(["_err", sort_by], ascending=[True, ascending], na_position="last", kind="stable")
+    return df.drop(columns="_err").reset_index(drop=True)
@@ -0,0 +1,305 @@
+# core/service.py — локальный сервис сигналов: один загрузчик и один кэш на все дашборды и боты
+#   python -m core.service --port 8765            (или --unix /tmp/signals.sock)
+#   GET /signal?symbol=AAPL&horizon=swing[&period=1y&interval=1d]
+#   GET /signals?symbols=AAPL,MSFT&horizon=swing  (или POST /signals {"symbols": [...], "horizon": ...})
+#   GET /metrics — очередь, склейка, пакеты, перцентили задержек;  GET /health
+# Одинаковые одновременные запросы (symbol, horizon, period, interval) ждут один расчёт; разные тикеры
+# собираются за batch_window в пакет и считаются одним compute_signals_batch на (period, interval, horizon).
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from urllib.parse import parse_qs, urlsplit
+import argparse, asyncio, json, os, threading, time
+import pandas as pd
+
+from core.data_loader import DataLoader
+from core.memo import SignalMemo
+from core.strategy import HORIZON_PROFILES
+from core.telemetry import Histogram, span
+
+Key = tuple[str, str, str, str]   # (symbol, horizon, period, interval)
+
+class ServiceError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+@dataclass
+class ServiceStats:
+    requests: int = 0       # HTTP-запросов
+    keys: int = 0           # запрошенных (symbol, horizon, ...), в /signals — по тикеру
+    coalesced: int = 0      # из них присоединились к уже идущему расчёту
+    batches: int = 0
+    batched_keys: int = 0   # ключей прошло через пакеты (среднее = batched_keys / batches)
+    max_batch: int = 0
+    rejected: int = 0       # очередь переполнена (503)
+    timeouts: int = 0       # не дождались расчёта (504)
+    errors: int = 0         # нет данных / ошибка расчёта
+    max_queue: int = 0
+
+class SignalService:
+    """
+    Очередь ключей -> пакеты: первый ключ открывает окно batch_window секунд, пакет закрывается
+    по окну или по max_batch. Пакеты считаются в своём пуле потоков (не больше concurrency сразу):
+    загрузка — SignalMemo.history_many (кадры с ttl), сигналы — SignalMemo.signals_batch.
+    """
+    def __init__(self, loader: DataLoader | None = None, memo: SignalMemo | None = None,
+                 batch_window: float | None = None, max_batch: int = 256, max_queue: int = 10_000,
+                 concurrency: int = 2, timeout: float | None = None):
+        self.loader = loader if loader is not None else DataLoader()
+        self.memo = memo if memo is not None else SignalMemo(ttl=float(os.getenv("SIGNAL_TTL", "60")))
+        self.batch_window = float(batch_window if batch_window is not None
+                                  else float(os.getenv("SIGNAL_BATCH_MS", "5")) / 1000)
+        self.max_batch, self.max_queue = int(max_batch), int(max_queue)
+        self.timeout = float(timeout if timeout is not None else os.getenv("SIGNAL_TIMEOUT", "30"))
+        self.stats = ServiceStats()
+        self.latency: dict[str, Histogram] = {}   # по маршруту, мс от чтения запроса до ответа
+        self.queue_wait, self.batch_ms = Histogram(), Histogram()
+        self._concurrency = max(1, int(concurrency))
+        self._pool = ThreadPoolExecutor(max_workers=self._concurrency, thread_name_prefix="signal")
+        self._inflight: dict[Key, asyncio.Future] = {}
+        self._queue: asyncio.Queue | None = None
+        self._running = 0   # ключей в считающихся пакетах
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._server: asyncio.Server | None = None
+        self._thread: threading.Thread | None = None
+        self.address = ""
+
+    # ---------- склейка и пакеты ----------
+    @property
+    def queue_depth(self) -> int:
+        return (self._queue.qsize() if self._queue is not None else 0) + self._running
+
+    async def get(self, symbol: str, horizon: str = "swing", period: str = "1y", interval: str = "1d") -> dict:
+        """Signal (+ source, asof) для ключа; одинаковые одновременные запросы — один расчёт."""
+        symbol = symbol.strip().upper()
+        if not symbol:
+            raise ServiceError(400, "symbol is required")
+        if horizon not in HORIZON_PROFILES:
+            raise ServiceError(400, f"unknown horizon {horizon!r} ({', '.join(HORIZON_PROFILES)})")
+        key = (symbol, horizon, period, interval)
+        self.stats.keys += 1
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.stats.coalesced += 1
+        else:
+            if self.queue_depth >= self.max_queue:
+                self.stats.rejected += 1
+                raise ServiceError(503, "queue is full")
+            fut = self._inflight[key] = asyncio.get_running_loop().create_future()
+            fut.add_done_callback(lambda f, k=key: self._release(k, f))
+            self._queue.put_nowait((key, time.perf_counter()))
+            self.stats.max_queue = max(self.stats.max_queue, self.queue_depth)
+        try:   # shield: таймаут одного клиента не отменяет расчёт для остальных
+            return dict(await asyncio.wait_for(asyncio.shield(fut), self.timeout))
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            raise ServiceError(504, f"{symbol}: no result in {self.timeout:g}s") from None
+
+    def _release(self, key: Key, fut: asyncio.Future) -> None:
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
+        if not fut.cancelled():
+            fut.exception()   # ошибку уже получили клиенты; если все ушли по таймауту — без предупреждения в лог
+
+    async def _batcher(self) -> None:
+        loop, sem = asyncio.get_running_loop(), asyncio.Semaphore(self._concurrency)
+        while True:
+            batch = [await self._queue.get()]
+            end = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                left = end - loop.time()
+                if left <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), left))
+                except asyncio.TimeoutError:
+                    break
+            groups: dict[tuple, list] = {}
+            for (sym, hz, period, interval), t in batch:
+                groups.setdefault((period, interval, hz), []).append((sym, t))
+            for g, items in groups.items():
+                await sem.acquire()
+                self._running += len(items)
+                asyncio.ensure_future(self._run_batch(g, items)).add_done_callback(lambda _: sem.release())
+
+    async def _run_batch(self, group: tuple[str, str, str], items: list[tuple[str, float]]) -> None:
+        period, interval, hz = group
+        t0 = time.perf_counter()
+        for _, t in items:
+            self.queue_wait.observe((t0 - t) * 1000)
+        try:
+            res = await asyncio.get_running_loop().run_in_executor(
+                self._pool, self._compute, [s for s, _ in items], period, interval, hz)
+        except Exception as e:
+            res = {s: e for s, _ in items}
+        finally:
+            self._running -= len(items)
+        self.batch_ms.observe((time.perf_counter() - t0) * 1000)
+        self.stats.batches += 1
+        self.stats.batched_keys += len(items)
+        self.stats.max_batch = max(self.stats.max_batch, len(items))
+        for s, _ in items:
+            fut = self._inflight.get((s, hz, period, interval))
+            if fut is None or fut.done():
+                continue
+            out = res.get(s)
+            if isinstance(out, dict):
+                fut.set_result(out)
+            else:
+                self.stats.errors += 1
+                fut.set_exception(out if isinstance(out, Exception) else ServiceError(404, f"{s}: no data"))
+
+    def _compute(self, symbols: list[str], period: str, interval: str, horizon: str) -> dict:
+        """В потоке пула: кадры (из памяти или одной пакетной загрузкой) -> сигналы одним проходом."""
+        with span("service.batch", horizon=horizon):
+            fetched = self.memo.history_many(self.loader, symbols, period, interval)
+            sigs = self.memo.signals_batch({s: r.df for s, r in fetched.items()}, interval, horizon)
+        return {s: {**sig, "source": fetched[s].source,
+                    "asof": str(pd.Timestamp(fetched[s].df["Date"].iloc[-1]))} for s, sig in sigs.items()}
+
+    # ---------- метрики ----------
+    def metrics(self) -> dict:
+        q = lambda h: {"count": h.count, "mean_ms": h.sum / h.count if h.count else 0.0,
+                       "p50_ms": h.quantile(0.5), "p95_ms": h.quantile(0.95), "p99_ms": h.quantile(0.99),
+                       "max_ms": h.max}
+        st = self.stats
+        return {"queue_depth": self.queue_depth, "inflight": len(self._inflight), **asdict(st),
+                "mean_batch": st.batched_keys / st.batches if st.batches else 0.0,
+                "latency": {r: q(h) for r, h in sorted(self.latency.items())},
+                "queue_wait": q(self.queue_wait), "batch": q(self.batch_ms), "memo": self.memo.stats()}
+
+    # ---------- HTTP ----------
+    async def _route(self, method: str, target: str, body: bytes) -> tuple[int, object]:
+        url = urlsplit(target)
+        qs = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if method == "POST" and body:
+            try:
+                qs.update(json.loads(body))
+            except (ValueError, TypeError):
+                raise ServiceError(400, "body must be a JSON object") from None
+        opts = {k: str(qs[k]) for k in ("horizon", "period", "interval") if k in qs}
+        if url.path == "/signal":
+            return 200, await self.get(str(qs.get("symbol", "")), **opts)
+        if url.path == "/signals":
+            syms = qs.get("symbols", "")
+            syms = syms.split(",") if isinstance(syms, str) else list(syms)
+            syms = list(dict.fromkeys(s.strip().upper() for s in syms if s and s.strip()))
+            if not syms:
+                raise ServiceError(400, "symbols is required")
+            res = await asyncio.gather(*(self.get(s, **opts) for s in syms), return_exceptions=True)
+            return 200, {"signals": [r for r in res if isinstance(r, dict)],
+                         "errors": {s: str(r) for s, r in zip(syms, res) if not isinstance(r, dict)}}
+        if url.path == "/metrics":
+            return 200, self.metrics()
+        if url.path == "/health":
+            return 200, {"ok": True}
+        raise ServiceError(404, f"no route {url.path}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """HTTP/1.1 с keep-alive; запросы в соединении — по очереди."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                t0 = time.perf_counter()
+                method, target, version = line.decode("latin-1").split()
+                headers = {}
+                while (h := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                body = await reader.readexactly(int(headers.get("content-length") or 0))
+                self.stats.requests += 1
+                route = urlsplit(target).path
+                try:
+                    status, payload = await self._route(method, target, body)
+                except ServiceError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                data = json.dumps(payload, ensure_ascii=False, default=str).encode()
+                keep = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write((f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                              f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                              f"Connection: {'keep-alive' if keep else 'close'}\r\n\r\n").encode() + data)
+                await writer.drain()
+                self.latency.setdefault(route, Histogram()).observe((time.perf_counter() - t0) * 1000,
+                                                                     status >= 500)
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    # ---------- запуск ----------
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, unix: str | None = None,
+                    ready: threading.Event | None = None) -> None:
+        self._loop, self._queue = asyncio.get_running_loop(), asyncio.Queue()
+        batcher = asyncio.ensure_future(self._batcher())
+        if unix:
+            self._server = await asyncio.start_unix_server(self._handle, path=unix)
+            self.address = f"unix:{unix}"
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+            h, p = self._server.sockets[0].getsockname()[:2]
+            self.address = f"http://{h}:{p}"
+        if ready is not None:
+            ready.set()
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            batcher.cancel()
+
+    def start(self, host: str = "127.0.0.1", port: int = 0, unix: str | None = None) -> "SignalService":
+        """В фоновом потоке (для встраивания и нагрузочных тестов); адрес — в self.address."""
+        ready = threading.Event()
+        self._thread = threading.Thread(target=asyncio.run, args=(self.serve(host, port, unix, ready),),
+                                        daemon=True, name="signal-service")
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            if self._thread is not None:
+                self._thread.join(timeout=5)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> "SignalService":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Локальный сервис сигналов (HTTP)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--unix", default=None, help="путь Unix-сокета вместо TCP")
+    ap.add_argument("--window-ms", type=float, default=None, help="окно сбора пакета (по умолчанию SIGNAL_BATCH_MS=5)")
+    ap.add_argument("--max-batch", type=int, default=256)
+    ap.add_argument("--concurrency", type=int, default=2, help="пакетов одновременно")
+    ap.add_argument("--offline", action="store_true", help="без сети: кэш, локальное хранилище, demo CSV")
+    args = ap.parse_args(argv)
+    svc = SignalService(DataLoader(offline=True if args.offline else None),
+                        batch_window=None if args.window_ms is None else args.window_ms / 1000,
+                        max_batch=args.max_batch, concurrency=args.concurrency)
+    print(f"signal service on {f'unix:{args.unix}' if args.unix else f'http://{args.host}:{args.port}'}", flush=True)
+    try:
+        asyncio.run(svc.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
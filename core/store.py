@@ -0,0 +1,282 @@
+# core/store.py — локальное хранилище истории: файл записей на тикер (memory-mapped) + индекс
+#   <root>/<interval>/<SYMBOL>.bin   — записи BAR_DTYPE подряд, только дописываются в конец
+#   <root>/<interval>/index.json     — symbol -> rows / first / last / tz / диапазоны строк по годам
+# Чтение — np.memmap без разбора: срез по датам — двоичный поиск по колонке t, данные не копируются.
+from __future__ import annotations
+from contextlib import contextmanager
+import json, os, pathlib, re, threading
+import numpy as np, pandas as pd
+
+from core.bars import Bars
+from core.cache import BAR_DTYPE, frame_to_records, records_to_frame
+
+_NS_PER_DAY = 86_400 * 10**9
+
+def _to_ns(x) -> int:
+    ts = pd.Timestamp(x)
+    return (ts.tz_localize(None) if ts.tzinfo else ts).value
+
+class MarketStore:
+    """
+    Append-only хранилище баров. Время — «настенное» (как в BarCache), tz хранится в индексе.
+    Запись: append() дописывает только бары новее последнего (replace=True — перезапись с
+    объединением). Индекс обновляется после данных, поэтому недописанный хвост читатели не видят.
+    """
+    def __init__(self, root: str | os.PathLike | None = None):
+        default = pathlib.Path.home() / ".cache" / "ai_trading" / "store"
+        self.root = pathlib.Path(root or os.getenv("MARKET_STORE_DIR") or default)
+        self._index: dict[str, dict] = {}
+        self._mtime: dict[str, float] = {}
+        self._deferred = 0
+        self._dirty: set[str] = set()
+        self._lock = threading.RLock()
+
+    # ---------- индекс ----------
+    def _dir(self, interval: str) -> pathlib.Path:
+        return self.root / re.sub(r"[^A-Za-z0-9._-]", "_", interval)
+
+    def _path(self, symbol: str, interval: str) -> pathlib.Path:
+        return self._dir(interval) / (re.sub(r"[^A-Za-z0-9._-]", "_", symbol.upper()) + ".bin")
+
+    def index(self, interval: str = "1d") -> dict:
+        """Индекс интервала (перечитывается, если файл изменил другой процесс)."""
+        p = self._dir(interval) / "index.json"
+        with self._lock:
+            try:
+                mtime = p.stat().st_mtime
+            except OSError:
+                return self._index.setdefault(interval, {})
+            if interval not in self._index or (self._mtime.get(interval) != mtime and interval not in self._dirty):
+                try:
+                    self._index[interval] = json.loads(p.read_text())
+                    self._mtime[interval] = mtime
+                except (OSError, ValueError):
+                    self._index.setdefault(interval, {})
+            return self._index[interval]
+
+    def _write_index(self, interval: str) -> None:
+        p = self._dir(interval) / "index.json"
+        tmp = p.with_name(f"index.json.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self._index.get(interval, {})))
+        os.replace(tmp, p)
+        self._mtime[interval] = p.stat().st_mtime
+        self._dirty.discard(interval)
+
+    @contextmanager
+    def batch(self):
+        """Массовая запись: индекс сохраняется один раз в конце блока."""
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._deferred -= 1
+                if not self._deferred:
+                    for interval in list(self._dirty):
+                        self._write_index(interval)
+
+    def symbols(self, interval: str = "1d") -> list[str]:
+        return sorted(self.index(interval))
+
+    def info(self, symbol: str, interval: str = "1d") -> dict | None:
+        return self.index(interval).get(symbol.upper())
+
+    # ---------- чтение ----------
+    def records(self, symbol: str, interval: str = "1d") -> np.ndarray | None:
+        """Все записи тикера как memmap (только чтение); None — тикера нет."""
+        meta = self.info(symbol, interval)
+        if not meta or not meta.get("rows"):
+            return None
+        try:
+            return np.memmap(self._path(symbol, interval), dtype=BAR_DTYPE, mode="r", shape=(int(meta["rows"]),))
+        except (OSError, ValueError):
+            return None
+
+    def slice(self, symbol: str, interval: str = "1d", start=None, end=None) -> np.ndarray | None:
+        """Записи в [start, end] (даты включительно) — view на memmap, без копии."""
+        rec = self.records(symbol, interval)
+        if rec is None:
+            return None
+        t = rec["t"]
+        lo = int(np.searchsorted(t, _to_ns(start), "left")) if start is not None else 0
+        if end is None:
+            hi = len(rec)
+        else:
+            e = pd.Timestamp(end)
+            # дата без времени — весь день включительно
+            e_ns = _to_ns(e) + (_NS_PER_DAY - 1 if e == e.normalize() else 0)
+            hi = int(np.searchsorted(t, e_ns, "right"))
+        return rec[lo:hi]
+
+    def bars(self, symbol: str, interval: str = "1d", start=None, end=None) -> Bars | None:
+        rec = self.slice(symbol, interval, start, end)
+        if rec is None or not len(rec):
+            return None
+        return Bars.from_records(rec, (self.info(symbol, interval) or {}).get("tz"))
+
+    def frame(self, symbol: str, interval: str = "1d", start=None, end=None) -> pd.DataFrame | None:
+        rec = self.slice(symbol, interval, start, end)
+        if rec is None or not len(rec):
+            return None
+        return records_to_frame(rec, (self.info(symbol, interval) or {}).get("tz"))
+
+    def last_days(self, symbol: str, days: int, interval: str = "1d") -> pd.DataFrame | None:
+        """Последние days календарных дней относительно последнего бара в хранилище."""
+        meta = self.info(symbol, interval)
+        if not meta:
+            return None
+        return self.frame(symbol, interval, start=pd.Timestamp(int(meta["last"])) - pd.Timedelta(days=days))
+
+    # ---------- запись ----------
+    @staticmethod
+    def _as_records(data) -> tuple[np.ndarray, str | None]:
+        if isinstance(data, np.ndarray) and data.dtype == BAR_DTYPE:
+            return data, None
+        if isinstance(data, Bars):
+            rec = np.empty(len(data), dtype=BAR_DTYPE)
+            rec["t"] = data.wall_ns()
+            for f, a in (("o","open"), ("h","high"), ("l","low"), ("c","close"), ("v","volume")):
+                rec[f] = getattr(data, a)
+            return rec, data.tz
+        return frame_to_records(data)
+
+    def append(self, symbol: str, data, interval: str = "1d", tz: str | None = None,
+               replace: bool = False) -> int:
+        """
+        Дописывает бары (DataFrame / Bars / записи BAR_DTYPE). Без replace — только новее последнего
+        (повторы и старые бары пропускаются); replace=True — объединение с перезаписью файла.
+        Возвращает число добавленных строк.
+        """
+        rec, rec_tz = self._as_records(data)
+        rec = rec[np.argsort(rec["t"], kind="stable")]
+        if len(rec) > 1:   # дубликаты времени — оставляем последний
+            keep = np.r_[rec["t"][1:] != rec["t"][:-1], True]
+            rec = rec[keep]
+        sym = symbol.upper()
+        path = self._path(sym, interval)
+        with self._lock:
+            idx = self.index(interval)
+            meta = idx.get(sym)
+            old_tz = (meta or {}).get("tz")   # replace обнуляет meta — зона тикера не должна теряться
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if meta and replace:
+                old = np.array(self.records(sym, interval))
+                rec = np.concatenate([old[~np.isin(old["t"], rec["t"])], rec])
+                rec = rec[np.argsort(rec["t"], kind="stable")]
+                tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                rec.tofile(tmp)
+                os.replace(tmp, path)
+                meta, added, base = None, len(rec) - int(idx[sym]["rows"]), 0
+            else:
+                if meta:
+                    rec = rec[rec["t"] > int(meta["last"])]
+                if not len(rec):
+                    return 0
+                base = int(meta["rows"]) if meta else 0
+                with open(path, "r+b" if meta else "wb") as fh:
+                    fh.seek(base * BAR_DTYPE.itemsize)   # хвост после сбоя (вне индекса) перезаписывается
+                    rec.tofile(fh)
+                    fh.truncate()
+                added = len(rec)
+            idx[sym] = self._meta(meta, rec, base, tz or rec_tz or old_tz)
+            self._dirty.add(interval)
+            if not self._deferred:
+                self._write_index(interval)
+        return added
+
+    @staticmethod
+    def _meta(meta: dict | None, rec: np.ndarray, base: int, tz: str | None) -> dict:
+        """rows/first/last + диапазоны строк [начало, конец) по годам — для быстрых выборок по периодам."""
+        years = dict((meta or {}).get("years", {}))
+        y = rec["t"].astype("datetime64[ns]").astype("datetime64[Y]").astype(np.int64) + 1970
+        uy, first = np.unique(y, return_index=True)
+        ends = np.r_[first[1:], len(y)]
+        for yr, a, b in zip(uy.tolist(), first.tolist(), ends.tolist()):
+            lo, hi = years.get(str(yr), (base + a, base + a))
+            years[str(yr)] = [min(lo, base + a), base + b]
+        return {"rows": base + len(rec), "first": int((meta or {}).get("first", rec["t"][0])),
+                "last": int(rec["t"][-1]), "tz": tz, "years": years}
+
+    def remove(self, symbol: str, interval: str = "1d") -> None:
+        with self._lock:
+            self.index(interval).pop(symbol.upper(), None)
+            self._dirty.add(interval)
+            if not self._deferred:
+                self._write_index(interval)
+            try:
+                self._path(symbol, interval).unlink()
+            except OSError:
+                pass
+
+# ---------- импорт ----------
+_CSV_COLS = {"date": "Date", "datetime": "Date", "timestamp": "Date", "time": "Date", "open": "Open",
+             "high": "High", "low": "Low", "close": "Close", "volume": "Volume", "symbol": "Symbol", "ticker": "Symbol"}
+
+def _symbol_from_path(p: pathlib.Path) -> str:
+    return re.split(r"[_\-.]", p.stem)[0].upper()   # qqq_demo.csv -> QQQ
+
+def import_csv(store: MarketStore, paths, interval: str = "1d", symbol: str | None = None,
+               chunksize: int = 1_000_000) -> dict[str, int]:
+    """
+    CSV формата data/qqq_demo.csv (тикер — из имени файла или аргумента) либо длинный CSV
+    с колонкой Symbol/ticker. Полигоновские flat files (window_start в нс) тоже подходят.
+    """
+    added: dict[str, int] = {}
+    with store.batch():
+        for p in map(pathlib.Path, [paths] if isinstance(paths, (str, os.PathLike)) else paths):
+            for chunk in pd.read_csv(p, chunksize=chunksize):
+                chunk = chunk.rename(columns=lambda c: _CSV_COLS.get(str(c).strip().lower(), c))
+                if "window_start" in chunk.columns:
+                    chunk["Date"] = pd.to_datetime(chunk.pop("window_start"), unit="ns")
+                if "Date" not in chunk.columns or chunk.empty:
+                    continue
+                chunk["Date"] = pd.to_datetime(chunk["Date"], utc=False)
+                if "Volume" not in chunk.columns:
+                    chunk["Volume"] = 0.0
+                if "Symbol" in chunk.columns:
+                    groups = chunk.groupby("Symbol", sort=False)
+                else:
+                    groups = [(symbol or _symbol_from_path(p), chunk)]
+                for sym, part in groups:
+                    n = store.append(str(sym), part, interval)
+                    added[str(sym).upper()] = added.get(str(sym).upper(), 0) + n
+    return added
+
+def import_polygon(store: MarketStore, paths, interval: str = "1d") -> dict[str, int]:
+    """JSON-ответы /v2/aggs (поле ticker + results), сохранённые в файлы."""
+    added: dict[str, int] = {}
+    with store.batch():
+        for p in map(pathlib.Path, [paths] if isinstance(paths, (str, os.PathLike)) else paths):
+            js = json.loads(p.read_text())
+            for item in js if isinstance(js, list) else [js]:
+                res = item.get("results") or []
+                if not res:
+                    continue
+                sym = str(item.get("ticker") or _symbol_from_path(p)).upper()
+                added[sym] = added.get(sym, 0) + store.append(sym, Bars.from_polygon(res), interval)
+    return added
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Локальное хранилище истории: импорт и просмотр")
+    ap.add_argument("--root", default=None, help="каталог (по умолчанию MARKET_STORE_DIR или ~/.cache/ai_trading/store)")
+    ap.add_argument("--interval", default="1d")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_csv = sub.add_parser("import-csv", help="импорт CSV")
+    p_csv.add_argument("paths", nargs="+")
+    p_csv.add_argument("--symbol", default=None)
+    p_pg = sub.add_parser("import-polygon", help="импорт JSON-ответов Polygon aggs")
+    p_pg.add_argument("paths", nargs="+")
+    sub.add_parser("info", help="тикеры и диапазоны дат")
+    args = ap.parse_args()
+
+    store = MarketStore(args.root)
+    if args.cmd == "import-csv":
+        res = import_csv(store, args.paths, args.interval, args.symbol)
+    elif args.cmd == "import-polygon":
+        res = import_polygon(store, args.paths, args.interval)
+    else:
+        res = {s: {"rows": m["rows"], "first": str(pd.Timestamp(m["first"])), "last": str(pd.Timestamp(m["last"]))}
+               for s, m in store.index(args.interval).items()}
+    print(json.dumps(res, indent=2, ensure_ascii=False))
@@ -2,6 +2,11 @@ from __future__ import annotations
 import pandas as pd, numpy as np
 from typing import Literal, TypedDict
 
+from core.bars import Bars
+from core.pivots import PivotIndex
+from core.kernels import last_sign_run
+from core.telemetry import timed
+
 Horizon = Literal["short","swing","position"]
 Action  = Literal["BUY","SHORT","WAIT"]
 
@@ -14,10 +19,23 @@ class Signal(TypedDict):
     key_mark: float; upper_zone: float; lower_zone: float
     pivot_P: float; R1: float; R2: float; R3: float; S1: float; S2: float; S3: float
 
+# профиль по горизонту: таймфрейм пивотов + пороги (неизвестный горизонт -> swing)
+# rsi_lo/rsi_hi — мягкий фильтр RSI: BUY при RSI <= rsi_hi, SHORT при RSI >= rsi_lo
+HORIZON_PROFILES: dict[str, dict] = {
+    "short":    {"pivot_scope": "daily",   "need_hist": 2,   # внутри 1–3 дней
+                 "k_tp1": 0.6, "k_tp2": 1.2, "k_sl": 0.9, "trend_weight": 0.6, "rsi_lo": 32, "rsi_hi": 68},
+    "swing":    {"pivot_scope": "weekly",  "need_hist": 3,   # 1–3 недели
+                 "k_tp1": 0.8, "k_tp2": 1.6, "k_sl": 1.0, "trend_weight": 0.65, "rsi_lo": 32, "rsi_hi": 68},
+    "position": {"pivot_scope": "monthly", "need_hist": 3,   # месяцы
+                 "k_tp1": 1.0, "k_tp2": 2.2, "k_sl": 1.4, "trend_weight": 0.7, "rsi_lo": 32, "rsi_hi": 68},
+}
+
 # ---------- helpers ----------
+@timed("strategy.ema")
 def _ema(s: pd.Series, span: int) -> pd.Series:
     return s.ewm(span=span, adjust=False).mean()
 
+@timed("strategy.rsi")
 def _rsi(close: pd.Series, period: int = 14) -> pd.Series:
     d = close.diff()
     up, dn = d.clip(lower=0), (-d).clip(lower=0)
@@ -27,6 +45,7 @@ def _rsi(close: pd.Series, period: int = 14) -> pd.Series:
     rsi = 100 - 100/(1+rs)
     return rsi.fillna(50)
 
+@timed("strategy.atr")
 def _atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
     h,l,c = df["High"], df["Low"], df["Close"]
     pc = c.shift(1)
@@ -34,6 +53,7 @@ def _atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
     w = min(period, max(5, len(df)//2))
     return tr.rolling(w).mean().fillna(tr.ewm(span=w, adjust=False).mean())
 
+@timed("strategy.macd_hist")
 def _macd_hist(close: pd.Series, fast=12, slow=26, sig=9) -> pd.Series:
     ema_fast = _ema(close, fast)
     ema_slow = _ema(close, slow)
@@ -41,20 +61,13 @@ def _macd_hist(close: pd.Series, fast=12, slow=26, sig=9) -> pd.Series:
     signal = macd.ewm(span=sig, adjust=False).mean()
     return macd - signal
 
+@timed("strategy.consecutive_sign")
 def _consecutive_sign(series: pd.Series) -> int:
-    s = series.dropna()
-    if s.empty: return 0
-    last = s.iloc[-1]
-    if abs(last) == 0: return 0
-    sign = 1 if last > 0 else -1
-    cnt = 0
-    for x in reversed(s.values):
-        if (x > 0 and sign > 0) or (x < 0 and sign < 0):
-            cnt += 1
-        else:
-            break
-    return sign * cnt
+    s = series.to_numpy(dtype=float)
+    s = s[~np.isnan(s)]  # как dropna(): пропуски серию не обрывают
+    return last_sign_run(s)
 
+@timed("strategy.landmarks")
 def _landmarks(df: pd.DataFrame) -> pd.DataFrame:
     h1, l1, c1 = df["High"].shift(1), df["Low"].shift(1), df["Close"].shift(1)
     key_mark   = (h1 + l1 + c1)/3.0
@@ -72,66 +85,73 @@ def _floor_pivots(H: float, L: float, C: float):
     S3 = L - 2*(H - P)
     return float(P), float(R1), float(R2), float(R3), float(S1), float(S2), float(S3)
 
+@timed("strategy.pivots_by_scope")
 def _pivots_by_scope(df: pd.DataFrame, scope: str) -> dict[str, float]:
     """
     scope: 'daily' (по предыдущей дневной свече),
            'weekly' (по предыдущей неделе),
            'monthly' (по предыдущем месяце).
+    Периоды берутся из PivotIndex (целочисленные ключи дат) — без копии фрейма и resample.
     """
-    d = df.copy()
-    d["Date"] = pd.to_datetime(d["Date"])
-    d = d.set_index("Date").sort_index()
-
-    if scope == "weekly":
-        agg = d[["High","Low","Close"]].resample("W-FRI").agg({"High":"max","Low":"min","Close":"last"}).dropna()
-    elif scope == "monthly":
-        agg = d[["High","Low","Close"]].resample("M").agg({"High":"max","Low":"min","Close":"last"}).dropna()
-    else:  # daily
-        if len(d) < 2:
-            px = float(d["Close"].iloc[-1])
-            return {"P":px,"R1":px,"R2":px,"R3":px,"S1":px,"S2":px,"S3":px}
-        prev = d.iloc[-2]
-        P,R1,R2,R3,S1,S2,S3 = _floor_pivots(prev["High"], prev["Low"], prev["Close"])
-        return {"P":P,"R1":R1,"R2":R2,"R3":R3,"S1":S1,"S2":S2,"S3":S3}
-
-    if len(agg) < 2:
-        px = float(d["Close"].iloc[-1])
-        return {"P":px,"R1":px,"R2":px,"R3":px,"S1":px,"S2":px,"S3":px}
-    prev = agg.iloc[-2]
-    P,R1,R2,R3,S1,S2,S3 = _floor_pivots(prev.High, prev.Low, prev.Close)
-    return {"P":P,"R1":R1,"R2":R2,"R3":R3,"S1":S1,"S2":S2,"S3":S3}
+    return PivotIndex.from_frame(df, scopes=(scope,)).at(-1, scope)
 
 # ---------- main ----------
-def compute_signal(df: pd.DataFrame, symbol: str, horizon: Horizon) -> Signal:
-    if df is None or df.empty:
+@timed("strategy.enrich")
+def enrich(df: pd.DataFrame | Bars) -> pd.DataFrame:
+    """
+    Индикаторы, не зависящие от горизонта (копия df + колонки EMA/RSI/ATR/MACD и зоны).
+    Bars превращается в кадр один раз и дополняется на месте — без второй копии.
+    """
+    if df is None or len(df) == 0:
         raise ValueError("empty dataframe")
 
-    df = df.copy()
-    # индикаторы
+    df = df.to_pandas() if isinstance(df, Bars) else df.copy()
     df["EMA_fast"] = _ema(df["Close"], 20)
     df["EMA_mid"]  = _ema(df["Close"], 50)
     df["EMA_slow"] = _ema(df["Close"], 200)
     df["RSI14"]    = _rsi(df["Close"], 14)
     df["ATR14"]    = _atr(df, 14)
     df["MACD_H"]   = _macd_hist(df["Close"])
-    df = pd.concat([df, _landmarks(df)], axis=1)
+    return pd.concat([df, _landmarks(df)], axis=1)
+
+@timed("strategy.compute_signal")
+def compute_signal(df: pd.DataFrame | Bars, symbol: str, horizon: Horizon) -> Signal:
+    return signal_from_enriched(enrich(df), symbol, horizon)
+
+@timed("strategy.compute_signals")
+def compute_signals(df: pd.DataFrame | Bars, symbol: str,
+                    horizons: tuple[Horizon, ...] = ("short","swing","position")) -> dict[str, Signal]:
+    """Сигналы нескольких горизонтов по одному расчёту индикаторов: {horizon: Signal}."""
+    return signals_from_enriched(enrich(df), symbol, horizons)
+
+def signals_from_enriched(df: pd.DataFrame, symbol: str,
+                          horizons: tuple[Horizon, ...] = ("short","swing","position")) -> dict[str, Signal]:
+    """
+    Правила всех горизонтов поверх одного enrich(): пивоты всех нужных масштабов — одним
+    PivotIndex, серия MACD — один раз. Каждый Signal совпадает с compute_signal(df, symbol, horizon).
+    """
+    if df is None or df.empty:
+        raise ValueError("empty dataframe")
+    scopes = tuple(dict.fromkeys(HORIZON_PROFILES.get(hz, HORIZON_PROFILES["swing"])["pivot_scope"]
+                                 for hz in horizons))
+    idx = PivotIndex.from_frame(df, scopes=scopes)
+    hist_seq = _consecutive_sign(df["MACD_H"])
+    return {hz: signal_from_enriched(df, symbol, hz, _piv=idx, _hist_seq=hist_seq) for hz in horizons}
+
+def signal_from_enriched(df: pd.DataFrame, symbol: str, horizon: Horizon,
+                         _piv: PivotIndex | None = None, _hist_seq: int | None = None) -> Signal:
+    """
+    Правила горизонта поверх результата enrich() — без пересчёта индикаторов.
+    _piv/_hist_seq — уже посчитанные PivotIndex и серия MACD (из signals_from_enriched).
+    """
+    if df is None or df.empty:
+        raise ValueError("empty dataframe")
 
     # профиль по горизонту: таймфрейм пивотов + пороги
-    if horizon == "short":       # внутри 1–3 дней
-        pivot_scope = "daily"
-        need_hist = 2
-        k_tp1, k_tp2, k_sl = 0.6, 1.2, 0.9
-        trend_weight = 0.6
-    elif horizon == "position":  # месяцы
-        pivot_scope = "monthly"
-        need_hist = 3
-        k_tp1, k_tp2, k_sl = 1.0, 2.2, 1.4
-        trend_weight = 0.7
-    else:                        # swing 1–3 недели
-        pivot_scope = "weekly"
-        need_hist = 3
-        k_tp1, k_tp2, k_sl = 0.8, 1.6, 1.0
-        trend_weight = 0.65
+    prof = HORIZON_PROFILES.get(horizon, HORIZON_PROFILES["swing"])
+    pivot_scope, need_hist = prof["pivot_scope"], prof["need_hist"]
+    k_tp1, k_tp2, k_sl = prof["k_tp1"], prof["k_tp2"], prof["k_sl"]
+    trend_weight = prof["trend_weight"]
 
     # текущие значения
     x  = df.iloc[-1]
@@ -142,16 +162,18 @@ def compute_signal(df: pd.DataFrame, symbol: str, horizon: Horizon) -> Signal:
     lz = float(x["lower_zone"]) if pd.notna(x["lower_zone"]) else px
 
     # пивоты по выбранному масштабу
-    piv = _pivots_by_scope(df, pivot_scope)
+    piv = _pivots_by_scope(df, pivot_scope) if _piv is None else _piv.at(-1, pivot_scope)
     P,R1,R2,R3,S1,S2,S3 = piv["P"], piv["R1"], piv["R2"], piv["R3"], piv["S1"], piv["S2"], piv["S3"]
 
     # тренд + MACD + мягкий RSI
-    trend_pos = (x["EMA_fast"] > x["EMA_mid"] > x["EMA_slow"]) and (df["EMA_mid"].iloc[-1] > df["EMA_mid"].iloc[-5])
-    trend_neg = (x["EMA_fast"] < x["EMA_mid"] < x["EMA_slow"]) and (df["EMA_mid"].iloc[-1] < df["EMA_mid"].iloc[-5])
-    hist_seq  = _consecutive_sign(df["MACD_H"])
+    # короче 5 баров сравнивать не с чем — тренда нет (как NaN в compute_signals_batch)
+    mid_lag = df["EMA_mid"].iloc[-5] if len(df) >= 5 else np.nan
+    trend_pos = (x["EMA_fast"] > x["EMA_mid"] > x["EMA_slow"]) and (df["EMA_mid"].iloc[-1] > mid_lag)
+    trend_neg = (x["EMA_fast"] < x["EMA_mid"] < x["EMA_slow"]) and (df["EMA_mid"].iloc[-1] < mid_lag)
+    hist_seq  = _consecutive_sign(df["MACD_H"]) if _hist_seq is None else _hist_seq
     macd_ok_buy, macd_ok_short = (hist_seq >= need_hist), (hist_seq <= -need_hist)
     rsi = float(x["RSI14"]) if pd.notna(x["RSI14"]) else 50.0
-    rsi_bias_up, rsi_bias_down = (rsi <= 68), (rsi >= 32)
+    rsi_bias_up, rsi_bias_down = (rsi <= prof["rsi_hi"]), (rsi >= prof["rsi_lo"])
 
     pos_vs_key = px - km
     buy_bias   = trend_pos and macd_ok_buy   and (pos_vs_key >= 0) and rsi_bias_up
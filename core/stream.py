@@ -0,0 +1,286 @@
+# core/stream.py — потоковый режим: бары из источника -> пересчёт сигнала -> подписчики
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable
+import asyncio, csv, inspect, pathlib, time
+import numpy as np, pandas as pd
+
+from core.batch import _OUT_COLS, action_names
+from core.data_loader import DataLoader
+from core.indicators import IndicatorState
+from core.kernels import evaluate_rules
+from core.pivots import PivotIndex
+from core.strategy import HORIZON_PROFILES, Horizon
+
+_COLS = ("Date","Open","High","Low","Close","Volume")
+
+# ---------- источники баров ----------
+class CsvReplaySource:
+    """
+    Проигрывание CSV (формат data/qqq_demo.csv) как живой ленты.
+    files: путь или {symbol: путь}; несколько тикеров сливаются по дате.
+    bars_per_second: темп выдачи (0 — без пауз).
+    """
+    def __init__(self, files: str | pathlib.Path | dict[str, str | pathlib.Path],
+                 bars_per_second: float = 0.0, symbol: str | None = None):
+        if not isinstance(files, dict):
+            p = pathlib.Path(files)
+            files = {symbol or p.stem.split("_")[0].upper(): p}
+        self.files = {s.upper(): pathlib.Path(p) for s, p in files.items()}
+        self.bars_per_second = float(bars_per_second)
+
+    def _rows(self) -> list[dict]:
+        rows = []
+        for sym, path in self.files.items():
+            with open(path, newline="") as fh:
+                for r in csv.DictReader(fh):
+                    if not r.get("Date"):
+                        continue
+                    bar = {"symbol": sym, "Date": r["Date"]}
+                    for k in _COLS[1:]:
+                        bar[k] = float(r.get(k) or 0.0)
+                    rows.append(bar)
+        rows.sort(key=lambda b: b["Date"])  # ISO-даты сортируются как строки
+        return rows
+
+    async def __aiter__(self) -> AsyncIterator[dict]:
+        pause = 1.0 / self.bars_per_second if self.bars_per_second > 0 else 0.0
+        for bar in self._rows():
+            if pause:
+                await asyncio.sleep(pause)
+            yield bar
+
+class IteratorSource:
+    """
+    Обёртка над любым async-итератором сообщений (например, websocket-клиентом).
+    parse: сообщение -> бар {symbol, Date, Open, High, Low, Close, Volume} или None (пропустить,
+    например, незакрытый бар).
+    """
+    def __init__(self, messages: AsyncIterator[Any], parse: Callable[[Any], dict | None] | None = None):
+        self.messages = messages
+        self.parse = parse or (lambda m: m)
+
+    async def __aiter__(self) -> AsyncIterator[dict]:
+        async for msg in self.messages:
+            bar = self.parse(msg)
+            if bar is not None:
+                yield bar
+
+# ---------- события ----------
+@dataclass
+class SignalEvent:
+    symbol: str
+    prev_action: str | None
+    action: str
+    signal: dict
+    bar_date: Any
+    latency_ms: float   # от получения бара до публикации
+
+@dataclass
+class StreamStats:
+    bars: int = 0
+    evaluations: int = 0
+    errors: int = 0
+    events: int = 0
+    latencies_ms: deque = field(default_factory=lambda: deque(maxlen=10_000))
+
+    def summary(self) -> dict:
+        lat = np.asarray(self.latencies_ms, dtype=float)
+        pct = {f"p{q}": float(np.percentile(lat, q)) if len(lat) else 0.0 for q in (50, 95, 99)}
+        return {"bars": self.bars, "evaluations": self.evaluations, "errors": self.errors,
+                "events": self.events, **pct, "max": float(lat.max()) if len(lat) else 0.0}
+
+Subscriber = Callable[[SignalEvent], Awaitable[None] | None]
+
+def signal_from_state(snap: dict, piv: dict[str, float], symbol: str, horizon: Horizon) -> dict:
+    """Signal по IndicatorState.snapshot() и пивотам последнего бара — те же правила, что в compute_signal."""
+    prof = HORIZON_PROFILES.get(horizon, HORIZON_PROFILES["swing"])
+    px = np.array([snap["Close"]])
+    km, uz, lz = (snap[k] if snap[k] == snap[k] else snap["Close"] for k in ("key_mark","upper_zone","lower_zone"))
+    P, R1, R2, R3, S1, S2, S3 = (np.array([piv[k]]) for k in ("P","R1","R2","R3","S1","S2","S3"))
+    with np.errstate(invalid="ignore"):
+        r = evaluate_rules(px, np.array([snap["ATR14"]]), np.array([snap["key_mark"]]),
+                           np.array([snap["EMA_fast"]]), np.array([snap["EMA_mid"]]), np.array([snap["EMA_slow"]]),
+                           np.array([snap["EMA_mid_lag"]]), np.array([snap["hist_seq"]]), np.array([snap["RSI14"]]),
+                           (P, R1, R2, R3, S1, S2, S3), prof)
+    levels = {"entry": r["entry"][0], "tp1": r["tp1"][0], "tp2": r["tp2"][0], "sl": r["sl"][0],
+              "key_mark": km, "upper_zone": uz, "lower_zone": lz, "pivot_P": piv["P"],
+              **{k: piv[k] for k in ("R1","R2","R3","S1","S2","S3")}}
+    # round() как в compute_signal (numpy.round на половинках может расходиться)
+    return {"symbol": symbol, "horizon": horizon, "action": str(action_names(r["action"])[0]),
+            "confidence": round(float(r["confidence"][0]), 2),
+            **{k: round(float(levels[k]), 2) for k in _OUT_COLS}}
+
+class SignalStream:
+    """
+    Держит по каждому тикеру потоковые индикаторы (IndicatorState) и индекс пивотов (PivotIndex):
+    закрытый бар обновляет их за O(1), сигнал — правила compute_signal над последним баром, без
+    пересчёта истории в pandas. Подписчикам рассылается смена действия (WAIT -> BUY и т.п.).
+    Повтор того же бара (обновление) откатывает индикаторы к снимку перед этим баром и применяет
+    новую версию — EMA не теряют историю. Скользящее окно из window баров нужно для пересборки:
+    пивоты при повторе и раз в window баров (чтобы индекс не рос), а бар не по порядку пересобирает
+    из окна всё — тогда EMA50/EMA200 начинаются заново с window баров и расходятся с расчётом по
+    всей истории, пока не забудут начало (сотни баров).
+    Как и IndicatorState, на первых 2*14 барах ATR считается с полным окном (compute_signal его сужает).
+    """
+    def __init__(self, horizon: Horizon = "swing", loader: DataLoader | None = None,
+                 window: int = 300, min_bars: int = 5, publish_all: bool = False):
+        self.horizon = horizon
+        self.loader = loader
+        self.window, self.min_bars = int(window), int(min_bars)
+        self.publish_all = publish_all   # True — публиковать каждый пересчёт, а не только смену действия
+        self.frames: dict[str, deque] = {}
+        self.state: dict[str, tuple[IndicatorState, PivotIndex]] = {}
+        self._undo: dict[str, IndicatorState] = {}   # индикаторы перед последним баром
+        self._scope = HORIZON_PROFILES.get(horizon, HORIZON_PROFILES["swing"])["pivot_scope"]
+        self.signals: dict[str, dict] = {}
+        self.stats = StreamStats()
+        self._subs: list[Subscriber] = []
+
+    def subscribe(self, fn: Subscriber) -> Callable[[], None]:
+        self._subs.append(fn)
+        return lambda: self._subs.remove(fn) if fn in self._subs else None
+
+    async def seed(self, symbols: list[str], period: str = "6mo", interval: str = "1d") -> None:
+        """Начальная история из DataLoader (в потоке, чтобы не держать цикл событий)."""
+        if self.loader is None or not symbols:
+            return
+        frames = await asyncio.to_thread(self.loader.history_many, symbols, period, interval)
+        for sym, res in frames.items():
+            df = res.df[list(_COLS)].copy()
+            dates = pd.to_datetime(df["Date"])
+            df["Date"] = dates.dt.tz_localize(None) if dates.dt.tz is not None else dates
+            buf = self.frames.setdefault(sym, deque(maxlen=self.window))
+            buf.extend(df.itertuples(index=False, name=None))
+            self._rebuild(sym, df)   # индикаторы — по всей загруженной истории, не только по окну
+            if len(buf) >= self.min_bars:
+                self.signals[sym] = self._evaluate(sym)
+
+    def _rebuild(self, sym: str, df: pd.DataFrame | None = None) -> None:
+        """Состояние тикера заново: по df или по окну баров."""
+        if df is None:
+            df = pd.DataFrame(list(self.frames[sym]), columns=list(_COLS))
+        st = IndicatorState()
+        st.update_many(df.iloc[:-1])
+        self._undo[sym] = st.copy()
+        st.update(df.iloc[-1])
+        self.state[sym] = (st, self._pivots(df.tail(self.window)))
+
+    def _pivots(self, df: pd.DataFrame | None = None, sym: str | None = None) -> PivotIndex:
+        """Индекс пивотов по df или по окну баров тикера (без промежуточного кадра)."""
+        if df is not None:
+            return PivotIndex.from_frame(df, scopes=(self._scope,))
+        rows = self.frames[sym]
+        t = np.fromiter((r[0].value for r in rows), dtype=np.int64, count=len(rows))
+        h, l, c = (np.fromiter((r[k] for r in rows), dtype=np.float64, count=len(rows)) for k in (2, 3, 4))
+        if len(t) > 1 and (np.diff(t) < 0).any():   # в окне мог остаться бар не по порядку
+            order = np.argsort(t, kind="stable")
+            t, h, l, c = t[order], h[order], l[order], c[order]
+        return PivotIndex(t, h, l, c, scopes=(self._scope,))
+
+    def _redo(self, sym: str, row: tuple) -> None:
+        """Новая версия последнего бара: индикаторы — от снимка перед ним, пивоты — из окна."""
+        st = self._undo[sym].copy()
+        st.update({"High": row[2], "Low": row[3], "Close": row[4]})
+        self.state[sym] = (st, self._pivots(sym=sym))
+
+    def _advance(self, sym: str, row: tuple) -> None:
+        """Новый бар в конец ряда: O(1) для индикаторов и пивотов."""
+        st, piv = self.state[sym]
+        self._undo[sym] = st.copy()
+        st.update({"High": row[2], "Low": row[3], "Close": row[4]})
+        if len(piv) >= 2 * self.window:   # окно уже содержит этот бар
+            self.state[sym] = (st, self._pivots(sym=sym))
+        else:
+            piv.append(row[0].value, row[2], row[3], row[4])
+
+    def _evaluate(self, sym: str) -> dict:
+        st, piv = self.state[sym]
+        return signal_from_state(st.snapshot(), piv.at(-1, self._scope), sym, self.horizon)
+
+    async def on_bar(self, bar: dict) -> SignalEvent | None:
+        t0 = time.perf_counter()
+        sym = str(bar["symbol"]).upper()
+        self.stats.bars += 1
+        buf = self.frames.setdefault(sym, deque(maxlen=self.window))
+        try:
+            ts = pd.Timestamp(bar["Date"])   # битый бар — ошибка этого бара, а не конец ленты
+            row = (ts.tz_localize(None) if ts.tzinfo else ts, *(float(bar.get(k, 0.0)) for k in _COLS[1:]))
+        except Exception:
+            self.stats.errors += 1
+            return None
+        # повтор того же бара (обновление) заменяет его; бар не по порядку — пересборка из окна
+        repeat = bool(buf) and buf[-1][0] == row[0]
+        rebuild = sym not in self.state or (not repeat and bool(buf) and buf[-1][0] > row[0])
+        if repeat:
+            buf[-1] = row
+        else:
+            buf.append(row)
+        try:
+            if rebuild:
+                self._rebuild(sym)
+            elif repeat:
+                self._redo(sym, row)
+            else:
+                self._advance(sym, row)
+            if len(buf) < self.min_bars:
+                return None
+            sig = self._evaluate(sym)
+        except Exception:
+            self.state.pop(sym, None)   # состояние могло обновиться наполовину — следующий бар пересоберёт
+            self._undo.pop(sym, None)
+            self.stats.errors += 1
+            return None
+        self.stats.evaluations += 1
+        prev = self.signals.get(sym)
+        self.signals[sym] = sig
+        prev_action = prev["action"] if prev else None
+        if prev_action == sig["action"] and not self.publish_all:
+            self.stats.latencies_ms.append((time.perf_counter() - t0) * 1000)
+            return None
+        ev = SignalEvent(sym, prev_action, sig["action"], sig, row[0], 0.0)
+        await self._publish(ev, t0)
+        return ev
+
+    async def _publish(self, ev: SignalEvent, t0: float) -> None:
+        ev.latency_ms = (time.perf_counter() - t0) * 1000
+        self.stats.latencies_ms.append(ev.latency_ms)
+        self.stats.events += 1
+        for fn in list(self._subs):
+            try:   # упавший подписчик не должен лишать остальных события
+                res = fn(ev)
+                if inspect.isawaitable(res):
+                    await res
+            except Exception:
+                self.stats.errors += 1
+
+    async def warmup(self) -> None:
+        """Первый вызов ядра правил грузит numba (сотни мс) — в потоке, а не на первом баре."""
+        one = np.ones(1)
+        prof = HORIZON_PROFILES.get(self.horizon, HORIZON_PROFILES["swing"])
+        await asyncio.to_thread(evaluate_rules, *(one,) * 9, (one,) * 7, prof)
+
+    async def run(self, source, seed_symbols: list[str] | None = None) -> dict:
+        """Читает источник до конца; возвращает сводку по задержкам."""
+        await self.warmup()
+        if seed_symbols:
+            await self.seed(seed_symbols)
+        async for bar in source:
+            await self.on_bar(bar)
+        return self.stats.summary()
+
+if __name__ == "__main__":
+    import argparse, json
+    ap = argparse.ArgumentParser(description="Проигрывание CSV через потоковый режим сигналов")
+    ap.add_argument("csv", nargs="+", help="файлы вида data/qqq_demo.csv")
+    ap.add_argument("--horizon", default="swing", choices=["short","swing","position"])
+    ap.add_argument("--speed", type=float, default=0.0, help="баров в секунду (0 — без пауз)")
+    args = ap.parse_args()
+
+    src = CsvReplaySource({pathlib.Path(p).stem.split("_")[0].upper(): p for p in args.csv},
+                          bars_per_second=args.speed)
+    stream = SignalStream(horizon=args.horizon)
+    stream.subscribe(lambda ev: print(f"{ev.bar_date} {ev.symbol}: {ev.prev_action} -> {ev.action} "
+                                      f"({ev.latency_ms:.2f} ms)"))
+    print(json.dumps(asyncio.run(stream.run(src)), indent=2))
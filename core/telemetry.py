@@ -0,0 +1,173 @@
+# core/telemetry.py — лёгкие спаны и гистограммы задержек по стадиям конвейера
+# Выключено по умолчанию: span() отдаёт общий пустой объект, timed() — одна проверка флага.
+# Включение: enable() или переменная окружения TRADING_TELEMETRY=1.
+from __future__ import annotations
+from bisect import bisect_left
+from functools import wraps
+import json, math, os, threading, time
+
+# границы корзин, мс (как у Prometheus: последняя — +Inf)
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_enabled = os.getenv("TRADING_TELEMETRY", "").lower() in ("1", "true", "yes", "on")
+
+def enabled() -> bool:
+    return _enabled
+
+def enable(on: bool = True) -> None:
+    global _enabled
+    _enabled = bool(on)
+
+def disable() -> None:
+    enable(False)
+
+class Histogram:
+    """Корзины + count/sum/min/max; квантили оцениваются линейно внутри корзины."""
+    __slots__ = ("counts", "count", "sum", "min", "max", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count, self.sum, self.errors = 0, 0.0, 0
+        self.min, self.max = math.inf, 0.0
+
+    def observe(self, ms: float, error: bool = False) -> None:
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum += ms
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+        self.errors += error
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank, acc = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            if c and acc + c >= rank:
+                lo = BUCKETS_MS[i-1] if i else 0.0
+                hi = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+                lo, hi = max(lo, self.min), min(hi, self.max)
+                return lo + (hi - lo) * (rank - acc) / c
+            acc += c
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "errors": self.errors, "sum_ms": self.sum,
+                "mean_ms": self.sum / self.count if self.count else 0.0,
+                "min_ms": self.min if self.count else 0.0, "max_ms": self.max,
+                "p50_ms": self.quantile(0.5), "p95_ms": self.quantile(0.95), "p99_ms": self.quantile(0.99),
+                "buckets": dict(zip([*map(str, BUCKETS_MS), "+Inf"], self.counts))}
+
+_lock = threading.Lock()
+_hists: dict[tuple[str, tuple], Histogram] = {}
+
+def observe(name: str, ms: float, error: bool = False, **labels) -> None:
+    """Записать готовую длительность (для мест, где спан неудобен)."""
+    key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    with _lock:
+        h = _hists.get(key)
+        if h is None:
+            h = _hists[key] = Histogram()
+        h.observe(ms, error)
+
+class _Span:
+    __slots__ = ("name", "labels", "t0")
+
+    def __init__(self, name: str, labels: dict):
+        self.name, self.labels = name, labels
+
+    def set(self, **labels) -> None:
+        """Уточнить метки по ходу (например, outcome="empty")."""
+        self.labels.update(labels)
+
+    def __enter__(self) -> "_Span":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        ms = (time.perf_counter() - self.t0) * 1000
+        if exc_type is not None:
+            self.labels.setdefault("outcome", "error")
+        observe(self.name, ms, self.labels.get("outcome") == "error", **self.labels)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **labels) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+_NULL = _NullSpan()
+
+def span(name: str, **labels):
+    """with span("loader.source", source="polygon") as sp: ...; sp.set(outcome="empty")"""
+    return _Span(name, labels) if _enabled else _NULL
+
+def timed(name: str | None = None):
+    """Декоратор: длительность каждого вызова в гистограмму name (по умолчанию module.func)."""
+    def deco(fn):
+        stage = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__.lstrip('_')}"
+
+        @wraps(fn)
+        def wrapper(*args, **kw):
+            if not _enabled:
+                return fn(*args, **kw)
+            t0 = time.perf_counter()
+            err = True
+            try:
+                res = fn(*args, **kw)
+                err = False
+                return res
+            finally:
+                observe(stage, (time.perf_counter() - t0) * 1000, err)
+        return wrapper
+    return deco
+
+# ---------- выгрузка ----------
+def reset() -> None:
+    with _lock:
+        _hists.clear()
+
+def snapshot() -> list[dict]:
+    """Список {stage, labels, count, p50_ms, ...}, отсортированный по суммарному времени."""
+    with _lock:
+        items = [(name, dict(labels), h.to_dict()) for (name, labels), h in _hists.items()]
+    rows = [{"stage": name, "labels": labels, **d} for name, labels, d in items]
+    return sorted(rows, key=lambda r: -r["sum_ms"])
+
+def to_json(indent: int | None = 2) -> str:
+    return json.dumps({"enabled": _enabled, "stages": snapshot()}, indent=indent, ensure_ascii=False)
+
+def _prom_labels(labels: dict, **extra) -> str:
+    items = {**labels, **extra}
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items.items()) + "}"
+
+def to_prometheus(prefix: str = "ai_trading") -> str:
+    """Текстовый формат Prometheus: одна гистограмма (секунды) на стадию, stage — меткой."""
+    metric = f"{prefix}_stage_duration_seconds"
+    lines = [f"# HELP {metric} Pipeline stage latency.", f"# TYPE {metric} histogram"]
+    errors = []
+    with _lock:
+        items = sorted(_hists.items())
+        for (name, labels), h in items:
+            lab = {"stage": name, **dict(labels)}
+            acc = 0
+            for le, c in zip([*BUCKETS_MS, math.inf], h.counts):
+                acc += c
+                le_s = "+Inf" if le == math.inf else repr(le / 1000)
+                lines.append(f"{metric}_bucket{_prom_labels(lab, le=le_s)} {acc}")
+            lines.append(f"{metric}_sum{_prom_labels(lab)} {h.sum / 1000!r}")
+            lines.append(f"{metric}_count{_prom_labels(lab)} {h.count}")
+            errors.append(f"{prefix}_stage_errors_total{_prom_labels(lab)} {h.errors}")
+    lines += [f"# HELP {prefix}_stage_errors_total Stage calls that raised.",
+              f"# TYPE {prefix}_stage_errors_total counter", *errors]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,4 @@
+# tests/conftest.py — корень репозитория в sys.path (pytest запускают и из каталога tests)
+import pathlib, sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
@@ -0,0 +1,52 @@
+# tests/test_kernels.py — бэкенды core.kernels: друг с другом и с эталоном core.strategy
+import numpy as np, pandas as pd
+import pytest
+
+from bench.synthetic import ohlcv_frame
+from core import kernels
+from core.batch import compute_signals_batch
+from core.kernels import cross_check, last_sign_run, sign_runs
+from core.strategy import _consecutive_sign, compute_signal
+
+needs_numba = pytest.mark.skipif("numba" not in kernels.available_backends(), reason="numba is not installed")
+
+@pytest.fixture
+def backend():
+    """Переключает бэкенд на время теста и возвращает прежний."""
+    prev = kernels._backend
+    yield kernels.set_backend
+    kernels._backend = prev
+
+@needs_numba
+def test_cross_check_has_no_diffs():
+    diff = cross_check()
+    assert not any(diff.values()), diff
+
+@pytest.mark.parametrize("be", kernels.available_backends())
+def test_sign_runs_match_consecutive_sign_with_nans(be):
+    """NaN пропускается (как dropna() в compute_signal), ноль обрывает серию."""
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        n = int(rng.integers(1, 30))
+        h = rng.choice([-1.0, 0.0, 1.0, np.nan], size=n, p=[.35, .1, .35, .2]) * rng.uniform(.5, 2, n)
+        runs = sign_runs(h, be)
+        for i in range(n):
+            ref = _consecutive_sign(pd.Series(h[:i + 1]))
+            assert runs[i] == ref, (h[:i + 1], be)
+            assert last_sign_run(h[:i + 1], be) == ref, (h[:i + 1], be)
+
+def test_sign_runs_nan_examples():
+    nan = np.nan
+    h = np.array([nan, 1.0, nan, 2.0, 0.0, -1.0, nan, -3.0])
+    assert sign_runs(h, "numpy").tolist() == [0, 1, 1, 2, 0, -1, -1, -2]
+    assert last_sign_run(h, "numpy") == -2
+
+@pytest.mark.parametrize("be", kernels.available_backends())
+@pytest.mark.parametrize("horizon", ["short", "swing", "position"])
+def test_batch_signals_match_compute_signal(backend, be, horizon):
+    backend(be)
+    frames = {f"S{i}": ohlcv_frame(n, seed=i, start="2021-01-04")
+              for i, n in enumerate((1, 2, 4, 5, 12, 40, 120, 260, 400))}
+    got = {r["symbol"]: r for r in compute_signals_batch(frames, horizon).to_dict("records")}
+    for s, df in frames.items():
+        assert got[s] == compute_signal(df, s, horizon), (s, be)